@@ -0,0 +1,98 @@
+"""Compare the memory kept by a PathMap vs a CompactPathMap, and their lookup cost.
+
+Usage: python -m benchmarks.bench_pathmap_memory [--sizes N ...] [--shape {shared,suite}]
+
+Each map is built over synthetic paths, and the memory it keeps once built (and the peak while
+building it) is measured with tracemalloc. Both maps are checked to give the same container
+paths. The "shared" paths are files deep under a few common folders, as a large template set
+(or output tree) would be, and the "suite" ones are the benchmark suite's, which share little
+beyond their first couple of folders.
+"""
+
+import argparse
+import gc
+import random
+import timeit
+import tracemalloc
+
+from benchmarks.suite import synthetic_paths
+from docker_cookiecutter import pathmap
+
+ROOTS = ["/home/dev/projects", "c:\\Users\\dev\\src", "../../shared", "build/out"]
+
+
+def shared_paths(size: int, seed: int = 0) -> "list[str]":
+    rng = random.Random(seed)
+    paths = []
+    for i in range(size):
+        root = rng.choice(ROOTS)
+        sep = "\\" if "\\" in root else "/"
+        folders = [
+            "team" + str(rng.randrange(10)),
+            "repo" + str(rng.randrange(50)),
+            "src",
+            "pkg" + str(rng.randrange(200)),
+        ]
+        paths.append(sep.join([root] + folders + ["file" + str(i) + ".txt"]))
+    return paths
+
+
+SHAPES = {"shared": shared_paths, "suite": synthetic_paths}
+
+
+def measure(path_map_type, paths: "list[str]"):
+    """Returns (the map, bytes it keeps, peak bytes while building it)."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    path_map = path_map_type(paths)
+    gc.collect()
+    kept, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return path_map, kept - before, peak - before
+
+
+def lookup_us(path_map, paths: "list[str]") -> float:
+    def lookup():
+        # a fresh memo each round, so every lookup is (re)built from the map itself
+        path_map.lookups.clear()
+        for path in paths:
+            path_map.get_container_path(path)
+
+    return min(timeit.repeat(lookup, number=1, repeat=5)) / len(paths) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 200000]
+    )
+    parser.add_argument("--shape", choices=sorted(SHAPES), default="shared")
+    opts = parser.parse_args()
+
+    print(
+        "{:>8}  {:>14}  {:>10}  {:>10}  {:>9}".format(
+            "paths", "map", "kept MB", "peak MB", "lookup us"
+        )
+    )
+    for size in opts.sizes:
+        paths = SHAPES[opts.shape](size)
+        results = []
+        for path_map_type in (pathmap.PathMap, pathmap.CompactPathMap):
+            path_map, kept, peak = measure(path_map_type, paths)
+            results.append([path_map.get_container_path(p) for p in paths])
+            print(
+                "{:>8}  {:>14}  {:10.2f}  {:10.2f}  {:9.2f}".format(
+                    size,
+                    path_map_type.__name__,
+                    kept / 2**20,
+                    peak / 2**20,
+                    lookup_us(path_map, paths),
+                )
+            )
+        if results[0] != results[1]:
+            print("{:>8}  DIFFERENT container paths".format(size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Measure generating many remote templates one after another, with and without prefetching.
+
+Usage: python -m benchmarks.bench_prefetch [--templates N] [--files N] [--prefetch N ...]
+                                           [--remote URI ...]
+
+By default, N synthetic templates (of a few files each) are each put in a local bare git
+repository, and generated from their file:// urls, which fetches with git much as from a real
+remote, just without the network latency that prefetching mostly hides. Give --remote (any number
+of times) to generate real remote templates instead.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import tempfile
+import time
+
+from docker_cookiecutter.cookiecutters import cookiecutters
+from docker_cookiecutter.templates import TemplateSourceInfo, encode_template_sources
+
+SOME_FILE = """{{ cookiecutter.project }}
+{% for i in range(50) %}line {{ i }} of {{ cookiecutter.project | upper }}
+{% endfor %}"""
+
+
+def git(*args, cwd=None):
+    subprocess.run(("git",) + args, cwd=cwd, check=True, stdout=subprocess.PIPE)
+
+
+def make_remote(root: str, index: int, files: int) -> str:
+    work = os.path.join(root, "t" + str(index))
+    project = os.path.join(work, "{{cookiecutter.project}}")
+    os.makedirs(project)
+    for i in range(files):
+        with open(os.path.join(project, "t{}_f{}.txt".format(index, i)), "w") as f:
+            f.write(SOME_FILE)
+    with open(os.path.join(work, "cookiecutter.json"), "w") as f:
+        json.dump({"project": "proj"}, f)
+    git("init", "--quiet", work)
+    git("add", "-A", cwd=work)
+    git(
+        "-c",
+        "user.email=bench@example.com",
+        "-c",
+        "user.name=bench",
+        "commit",
+        "--quiet",
+        "-m",
+        "template",
+        cwd=work,
+    )
+    bare = work + ".git"
+    git("clone", "--quiet", "--bare", work, bare)
+    return "file://" + bare
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--templates", type=int, default=20)
+    parser.add_argument("--files", type=int, default=100)
+    parser.add_argument("--prefetch", type=int, nargs="+", default=[0, 1, 2, 4])
+    parser.add_argument("--remote", action="append", default=[])
+    opts = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        remotes = opts.remote or [
+            make_remote(root, i, opts.files) for i in range(opts.templates)
+        ]
+        templates = encode_template_sources(
+            [TemplateSourceInfo(r, None, None) for r in remotes]
+        )
+        for prefetch in opts.prefetch:
+            out = os.path.join(root, "out" + str(prefetch))
+            start = time.perf_counter()
+            # no template cache, so every run fetches every template
+            cookiecutters(
+                templates,
+                prefetch=prefetch,
+                no_input=True,
+                default_config=True,
+                overwrite_if_exists=True,
+                output_dir=out,
+            )
+            seconds = time.perf_counter() - start
+            print(
+                "prefetch {:>3}  {:7.2f}s  {:6.1f} templates/s".format(
+                    prefetch, seconds, len(remotes) / seconds
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
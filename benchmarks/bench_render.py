@@ -0,0 +1,80 @@
+"""Measure generating one large template serially vs with its files rendered concurrently.
+
+Usage: python -m benchmarks.bench_render [--files N] [--render-jobs N ...]
+
+A synthetic template of N files (spread over folders, each with a little templating) is
+generated once per render-jobs value, and the output of each run is checked against the
+serial one.
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from docker_cookiecutter.cookiecutters import cookiecutters
+
+SOME_FILE = """{{ cookiecutter.project }} - {{ cookiecutter.description }}
+{% for i in range(20) %}line {{ i }} of {{ cookiecutter.project | upper }}
+{% endfor %}"""
+
+
+def make_template(root: str, files: int) -> str:
+    template = os.path.join(root, "template")
+    project = os.path.join(template, "{{cookiecutter.project}}")
+    for i in range(files):
+        folder = os.path.join(project, "pkg" + str(i % 50))
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, "f" + str(i) + ".txt"), "w") as f:
+            f.write(SOME_FILE)
+    with open(os.path.join(template, "cookiecutter.json"), "w") as f:
+        json.dump({"project": "proj", "description": "benchmark"}, f)
+    return template
+
+
+def read_tree(root: str) -> dict:
+    tree = {}
+    for folder, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(folder, name)
+            with open(path, "rb") as f:
+                tree[os.path.relpath(path, root)] = f.read()
+    return tree
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=6000)
+    parser.add_argument("--render-jobs", type=int, nargs="+", default=[1, 2, 4, 8])
+    opts = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        template = make_template(root, opts.files)
+        serial = None
+        for render_jobs in opts.render_jobs:
+            out = os.path.join(root, "out" + str(render_jobs))
+            start = time.perf_counter()
+            (project,) = cookiecutters(
+                template,
+                render_jobs=render_jobs,
+                no_input=True,
+                default_config=True,
+                output_dir=out,
+            )
+            seconds = time.perf_counter() - start
+
+            tree = read_tree(project)
+            serial = serial or tree
+            print(
+                "render-jobs {:>3}  {:7.2f}s  {:8.0f} files/s  {}".format(
+                    render_jobs,
+                    seconds,
+                    opts.files / seconds,
+                    "identical" if tree == serial else "DIFFERENT",
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Measure per-request suggest latency through the server vs in-process.
+
+Usage: python -m benchmarks.bench_server [--socket PATH] [--requests N]
+
+Without --socket, a server is started in this process on a temporary socket. Pass the socket
+of a `docker_cookiecutter serve` process to measure a separate server instead.
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from docker_cookiecutter import server
+from docker_cookiecutter.suggest import cookiecutter_to_docker_args
+
+SOME_ARGS = (
+    "docker run some:image cookiecutter -o ../out -f /some/template,,gh:some/template"
+).split()
+
+
+def time_calls(fn, requests: int) -> "list[float]":
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        fn(SOME_ARGS)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(name: str, timings: "list[float]") -> None:
+    timings = sorted(timings)
+    print(
+        "{:<12} mean {:8.1f}us  p50 {:8.1f}us  p99 {:8.1f}us".format(
+            name,
+            statistics.mean(timings) * 1e6,
+            timings[len(timings) // 2] * 1e6,
+            timings[int(len(timings) * 0.99)] * 1e6,
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--socket")
+    parser.add_argument("--requests", type=int, default=2000)
+    opts = parser.parse_args()
+
+    local_server = None
+    socket_path = opts.socket
+    if socket_path is None:
+        socket_path = os.path.join(tempfile.mkdtemp(), "bench.sock")
+        local_server = server.SuggestServer(socket_path)
+        threading.Thread(target=local_server.serve_forever, daemon=True).start()
+
+    try:
+        report("in-process", time_calls(cookiecutter_to_docker_args, opts.requests))
+        with server.SuggestClient(socket_path) as client:
+            report("server", time_calls(client.suggest, opts.requests))
+    finally:
+        if local_server is not None:
+            local_server.shutdown()
+            local_server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""Benchmark the hot paths over synthetic inputs, and gate on regressions against baselines.
+
+Usage: python -m benchmarks.suite [--baseline PATH] [--threshold FRACTION] [--save]
+                                  [--max-size N] [--filter TEXT]
+
+Every scenario is timed at each input size from 10 up to 100k paths (or templates), interleaved
+with a fixed reference workload, and its best per-call time relative to the reference's is
+compared against the baseline JSON ({"scenario/size": {"seconds": ..., "relative": ...}}). The
+relative time mostly cancels out the speed of the machine (and of noisy neighbours on it), so
+baselines travel reasonably well, but re-record them (make bench.baseline) after moving to a
+very different machine or python. The run fails (exit status 1) when any scenario is slower
+than its baseline by more than the threshold. --save records the results as the new baseline.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import timeit
+
+from docker_cookiecutter import pathmap, templates
+from docker_cookiecutter.suggest import cookiecutter_to_docker_args
+
+SIZES = (10, 100, 1000, 10000, 100000)
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baselines.json")
+DEFAULT_THRESHOLD = 0.25
+# keep timing each scenario for at least this long and this many batches, for a stable minimum
+MIN_TIME_S = 0.2
+MIN_ROUNDS = 5
+
+
+def synthetic_paths(size: int, seed: int = 0) -> "list[str]":
+    """A deterministic mix of absolute, relative, parent-relative and windows style paths."""
+    rng = random.Random(seed)
+    words = ["src", "templates", "out", "project", "a", "b", "c", "data", "ci", "docs"]
+    paths = []
+    for _ in range(size):
+        parts = [
+            rng.choice(words) + str(rng.randrange(20)) for _ in range(rng.randint(1, 6))
+        ]
+        kind = rng.randrange(4)
+        if kind == 0:
+            paths.append("/" + "/".join(parts))
+        elif kind == 1:
+            paths.append("/".join(parts))
+        elif kind == 2:
+            paths.append("../" * rng.randint(1, 3) + "/".join(parts))
+        else:
+            paths.append("c:\\" + "\\".join(parts))
+    return paths
+
+
+def synthetic_sources(size: int) -> "list[templates.TemplateSourceInfo]":
+    sources = []
+    for i, path in enumerate(synthetic_paths(size, seed=1)):
+        if i % 3 == 0:
+            sources.append(
+                templates.TemplateSourceInfo("gh:org/t" + str(i), "v1", "sub")
+            )
+        else:
+            sources.append(templates.TemplateSourceInfo(path.replace("\\", "/")))
+    return sources
+
+
+def scenario_reduce_mounts(size: int):
+    paths = [pathmap.normalize_path(p) for p in synthetic_paths(size)]
+    return lambda: pathmap.reduce_mounts(paths)
+
+
+def scenario_pathmap_build(size: int):
+    paths = synthetic_paths(size)
+    return lambda: pathmap.PathMap(paths)
+
+
+def scenario_pathmap_lookup(size: int):
+    paths = synthetic_paths(size)
+    path_map = pathmap.PathMap(paths)
+
+    def lookup():
+        for path in paths:
+            path_map.get_container_path(path)
+
+    return lookup
+
+
+def scenario_normalize_path(size: int):
+    paths = synthetic_paths(size)
+
+    def normalize():
+        for path in paths:
+            pathmap.transform_to_nix_path(pathmap.normalize_path(path))
+
+    return normalize
+
+
+def scenario_normalize_paths(size: int):
+    # as a build sees them, with the same paths coming up more than once
+    paths = synthetic_paths(size) * 2
+    return lambda: pathmap.normalize_paths(paths)
+
+
+def scenario_encode_templates(size: int):
+    sources = synthetic_sources(size)
+    return lambda: templates.encode_template_sources(sources)
+
+
+def scenario_decode_templates(size: int):
+    encoded = templates.encode_template_sources(synthetic_sources(size))
+    return lambda: templates.decode_template_sources(encoded)
+
+
+def scenario_suggest(size: int):
+    encoded = templates.encode_template_sources(
+        templates.TemplateSourceInfo(p.replace("\\", "/"))
+        for p in synthetic_paths(size)
+    )
+    args = [
+        "docker",
+        "run",
+        "some:image",
+        "cookiecutter",
+        "-o",
+        "../out",
+        "-f",
+        encoded,
+    ]
+    return lambda: cookiecutter_to_docker_args(args)
+
+
+SCENARIOS = (
+    ("reduce_mounts", scenario_reduce_mounts),
+    ("pathmap_build", scenario_pathmap_build),
+    ("pathmap_lookup", scenario_pathmap_lookup),
+    ("normalize_path", scenario_normalize_path),
+    ("normalize_paths", scenario_normalize_paths),
+    ("encode_templates", scenario_encode_templates),
+    ("decode_templates", scenario_decode_templates),
+    ("suggest", scenario_suggest),
+)
+
+
+REFERENCE_WORDS = [str(i) * (i % 7 + 1) for i in range(200)]
+
+
+def reference():
+    """Fixed pure-python work (string, list and dict handling) to measure scenarios against."""
+    counts = {}
+    for word in sorted(REFERENCE_WORDS, key=lambda w: w[::-1]):
+        key = word.replace("1", "/").strip("/")
+        counts[key] = counts.get(key, 0) + len(key.split("/"))
+    return counts
+
+
+def batch_size(fn) -> int:
+    """How many calls make a batch that takes a few milliseconds."""
+    number = 1
+    while number < 1 << 20 and timeit.timeit(fn, number=number) < 0.005:
+        number *= 10
+    return number
+
+
+def time_per_call(fn):
+    """
+    Best seconds per call of fn, and of the reference workload timed in between its batches.
+    """
+    number = batch_size(fn)
+    reference_number = batch_size(reference)
+    best = best_reference = float("inf")
+    deadline = time.perf_counter() + MIN_TIME_S
+    rounds = 0
+    while rounds < MIN_ROUNDS or time.perf_counter() < deadline:
+        rounds += 1
+        best_reference = min(
+            best_reference,
+            timeit.timeit(reference, number=reference_number) / reference_number,
+        )
+        best = min(best, timeit.timeit(fn, number=number) / number)
+    return best, best_reference
+
+
+def run(max_size: int, name_filter: str = None) -> dict:
+    results = {}
+    for name, scenario in SCENARIOS:
+        if name_filter and name_filter not in name:
+            continue
+        for size in SIZES:
+            if size > max_size:
+                continue
+            key = "{}/{}".format(name, size)
+            seconds, reference_seconds = time_per_call(scenario(size))
+            results[key] = {
+                "seconds": seconds,
+                "relative": seconds / reference_seconds,
+            }
+            print(
+                "{:<24} {:>14.1f}us {:>12.1f}x reference".format(
+                    key, seconds * 1e6, results[key]["relative"]
+                ),
+                flush=True,
+            )
+    return results
+
+
+def regressions(results: dict, baseline: dict, threshold: float) -> "list[str]":
+    """The scenarios slower than their baseline by more than threshold (a fraction)."""
+    regressed = []
+    for key, result in results.items():
+        expected = baseline.get(key)
+        if expected is None:
+            continue
+        slowdown = result["relative"] / expected["relative"] - 1
+        if slowdown > threshold:
+            regressed.append(
+                "{}: {:.1f}x reference vs baseline {:.1f}x (+{:.0%})".format(
+                    key, result["relative"], expected["relative"], slowdown
+                )
+            )
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=float(os.environ.get("BENCH_THRESHOLD", DEFAULT_THRESHOLD)),
+        help="allowed slowdown vs the baseline, as a fraction (default: %(default)s)",
+    )
+    parser.add_argument("--save", action="store_true", help="record a new baseline")
+    parser.add_argument("--max-size", type=int, default=SIZES[-1])
+    parser.add_argument("--filter", help="only run scenarios whose name contains this")
+    opts = parser.parse_args()
+
+    results = run(opts.max_size, opts.filter)
+
+    if opts.save:
+        baseline = {}
+        if os.path.exists(opts.baseline):
+            with open(opts.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(opts.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print("saved baseline to " + opts.baseline)
+        return 0
+
+    try:
+        with open(opts.baseline) as f:
+            baseline = json.load(f)
+    except OSError:
+        print("no baseline at {} (record one with --save)".format(opts.baseline))
+        return 0
+
+    regressed = regressions(results, baseline, opts.threshold)
+    for line in regressed:
+        print("REGRESSION " + line, file=sys.stderr)
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""Suggest docker commandlines for a stream of command lines in a single process."""
+
+import json
+import shlex
+import sys
+
+
+# Work around python's lack of consts
+class CONST(object):
+    __slots__ = ()
+    FORMAT_LINES = "lines"
+    FORMAT_NULL = "null"
+    FORMAT_JSONL = "jsonl"
+    READ_CHUNK_SIZE = 64 * 1024
+
+
+CONST = CONST()
+
+
+def read_records(stream, delimiter: str):
+    """
+    Lazily yield the delimiter-separated records from a text stream, without reading the
+    whole stream up front. A trailing empty record (ie. final delimiter) is not yielded.
+    """
+    if delimiter == "\n":
+        # line iteration hands each record over as soon as it arrives (eg. from a pipe)
+        for line in stream:
+            yield line.rstrip("\r\n")
+        return
+
+    pending = ""
+    while True:
+        chunk = stream.read(CONST.READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        pending += chunk
+        *records, pending = pending.split(delimiter)
+        yield from records
+
+    if len(pending) > 0:
+        yield pending
+
+
+def parse_record(record: str, fmt: str = CONST.FORMAT_LINES) -> "list[str]":
+    """
+    Convert one input record to an argv list according to the given format:
+
+    lines / null - a shell-quoted command line
+    jsonl - a JSON array of arguments
+    """
+    if fmt == CONST.FORMAT_JSONL:
+        return json.loads(record) if record.strip() else []
+    return shlex.split(record)
+
+
+def format_result(result: "list[str]", fmt: str) -> str:
+    if fmt == CONST.FORMAT_JSONL:
+        return json.dumps(result)
+    return " ".join(result)
+
+
+def suggest_batch(
+    in_stream=None,
+    out_stream=None,
+    err_stream=None,
+    fmt: str = CONST.FORMAT_LINES,
+    **suggest_options
+) -> int:
+    """
+    Stream one cookiecutter_to_docker_args suggestion per input record. A record that can't
+    be converted is reported on err_stream and produces an empty output record, so that output
+    stays aligned with input. Any suggest_options are passed to cookiecutter_to_docker_args.
+
+    Returns:
+        0 if every record was converted, otherwise 1
+    """
+    # deferred so that the format constants stay cheap to import for the CLI
+    from docker_cookiecutter.suggest import cookiecutter_to_docker_args
+
+    in_stream = in_stream or sys.stdin
+    out_stream = out_stream or sys.stdout
+    err_stream = err_stream or sys.stderr
+    delimiter = "\0" if fmt == CONST.FORMAT_NULL else "\n"
+    exit_code = 0
+
+    for record_number, record in enumerate(read_records(in_stream, delimiter), 1):
+        try:
+            args = parse_record(record, fmt)
+            output = format_result(
+                cookiecutter_to_docker_args(args, **suggest_options), fmt
+            )
+        except (Exception, SystemExit) as e:
+            # argparse reports bad option values with SystemExit; that must not end the batch
+            err_stream.write("record {}: {!r}\n".format(record_number, e))
+            output = ""
+            exit_code = 1
+
+        out_stream.write(output + delimiter)
+        out_stream.flush()
+
+    return exit_code
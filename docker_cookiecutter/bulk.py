@@ -0,0 +1,382 @@
+"""Generate one template many times over, once for each row of a contexts file.
+
+The template is fetched, its cookiecutter.json parsed and the user config read just once, and
+every row is rendered with the same jinja environment, so each template file is only compiled
+once (per worker process, when rows are generated concurrently). Each row's values are
+extra context for that row's generation, which never prompts.
+"""
+
+import copy
+import csv
+import json
+import logging
+import os
+import shutil
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from docker_cookiecutter.bytecode import BytecodeCache, caching_bytecode
+from docker_cookiecutter.cache import TemplateCache
+from docker_cookiecutter.cookiecutters import fetch_shared, resolve_template
+from docker_cookiecutter.templates import decode_template_sources, is_cacheable
+
+
+# Work around python's lack of consts
+class CONST(object):
+    __slots__ = ()
+    FORMAT_CSV = "csv"
+    FORMAT_JSONL = "jsonl"
+    FORMATS = (FORMAT_CSV, FORMAT_JSONL)
+    # each row is generated into this folder (formatted with its values and its index) within
+    # the output folder
+    DEFAULT_ROW_DIR = "{index}"
+
+
+CONST = CONST()
+
+logger = logging.getLogger(__name__)
+
+
+class BulkGenerationError(Exception):
+    """
+    One or more rows failed to generate.
+
+    failures - list of (row number, error message) in row order
+    """
+
+    def __init__(self, failures) -> None:
+        self.failures = failures
+        super().__init__(
+            "\n".join("row {}: {}".format(index, error) for index, error in failures)
+        )
+
+
+def contexts_format(path: str, fmt: str = None) -> str:
+    if fmt is not None:
+        return fmt
+    return CONST.FORMAT_CSV if path.lower().endswith(".csv") else CONST.FORMAT_JSONL
+
+
+def read_contexts(stream, fmt: str):
+    """
+    Lazily yield each row of a contexts stream as an OrderedDict: the columns of each CSV row
+    (by header), or each line of JSONL. A JSONL line that isn't an object is yielded as is, to
+    fail that row alone.
+    """
+    if fmt == CONST.FORMAT_CSV:
+        yield from csv.DictReader(stream)
+        return
+
+    for line in stream:
+        if line.strip():
+            try:
+                yield json.loads(line, object_pairs_hook=OrderedDict)
+            except ValueError as e:
+                yield e
+
+
+class ReusableEnvironment:
+    """
+    Mixed into cookiecutter's StrictEnvironment, so that the FileSystemLoader(".") that each
+    generate_files call sets doesn't replace the first one: jinja keys its compiled templates
+    by loader, and "." is the same template folder for every row.
+    """
+
+    @property
+    def loader(self):
+        return self.__dict__.get("_reused_loader")
+
+    @loader.setter
+    def loader(self, loader):
+        if self.__dict__.get("_reused_loader") is None:
+            self.__dict__["_reused_loader"] = loader
+
+
+@contextmanager
+def reusing_environment(environments: dict = None):
+    """
+    While active, cookiecutter.generate.generate_files (and prompt_for_config) reuse one jinja
+    environment, and the templates it has compiled, across calls for the same jinja
+    extensions. The environments are kept in environments, when given, so that they are also
+    reused across activations.
+    """
+    # deferred with the rest of cookiecutter, see cookiecutters.cookiecutter
+    import cookiecutter.generate
+    import cookiecutter.prompt
+
+    originals = [
+        (module, module.StrictEnvironment)
+        for module in (cookiecutter.generate, cookiecutter.prompt)
+    ]
+    strict_environment = cookiecutter.generate.StrictEnvironment
+    environment_class = type(
+        "ReusableStrictEnvironment", (ReusableEnvironment, strict_environment), {}
+    )
+    if environments is None:
+        environments = {}
+
+    def reused_environment(context=None, **kwargs):
+        extensions = (context or {}).get("cookiecutter", {}).get("_extensions", [])
+        key = (tuple(str(e) for e in extensions), tuple(sorted(kwargs.items())))
+        if key not in environments:
+            # the template's files are all compiled once, so keep them all
+            environments[key] = environment_class(
+                context=context, cache_size=-1, **kwargs
+            )
+        return environments[key]
+
+    for module, _ in originals:
+        module.StrictEnvironment = reused_environment
+    try:
+        yield
+    finally:
+        for module, original in originals:
+            module.StrictEnvironment = original
+
+
+class LoadedTemplate:
+    """A local template folder, with its context and the user's config loaded once."""
+
+    def __init__(
+        self,
+        repo_dir: str,
+        template: str = None,
+        config_file: str = None,
+        default_config: bool = False,
+        extra_context: dict = None,
+    ) -> None:
+        from cookiecutter.config import get_user_config
+        from cookiecutter.generate import apply_overwrites_to_context
+
+        self.repo_dir = repo_dir
+        self.template = template or repo_dir
+        config = get_user_config(config_file=config_file, default_config=default_config)
+        with open(os.path.join(repo_dir, "cookiecutter.json")) as f:
+            self.context = json.load(f, object_pairs_hook=OrderedDict)
+        apply_overwrites_to_context(self.context, config["default_context"])
+        if extra_context:
+            apply_overwrites_to_context(self.context, extra_context)
+
+    def row_context(self, row: dict) -> OrderedDict:
+        """The full context for a row, as cookiecutter would have it with no_input."""
+        from cookiecutter.generate import apply_overwrites_to_context
+        from cookiecutter.prompt import prompt_for_config
+
+        if not isinstance(row, dict):
+            raise ValueError(
+                "a row must be an object of context values, got: " + str(row)
+            )
+
+        values = copy.deepcopy(self.context)
+        apply_overwrites_to_context(values, row)
+        context = OrderedDict([("cookiecutter", values)])
+        context["cookiecutter"] = prompt_for_config(context, no_input=True)
+        context["cookiecutter"]["_template"] = self.template
+        return context
+
+    def generate(self, row: dict, output_dir: str, **options) -> str:
+        """
+        Generate the row into output_dir (options are generate_files' overwrite_if_exists and
+        skip_if_file_exists). Call within reusing_environment to compile templates once.
+
+        Returns:
+            the project folder
+        """
+        from cookiecutter.generate import generate_files
+
+        return generate_files(
+            repo_dir=self.repo_dir,
+            context=self.row_context(row),
+            output_dir=output_dir,
+            **options
+        )
+
+
+def row_output_dir(output_dir: str, row_dir: str, index: int, row) -> str:
+    values = row if isinstance(row, dict) else {}
+    return os.path.join(output_dir, row_dir.format(index=index, **values))
+
+
+# The template loaded by each worker process, the bytecode cache it compiles through, and the
+# jinja environments (and so compiled template files) its rows reuse, see load_worker_template
+worker_template = None
+worker_bytecode_cache = None
+worker_environments = None
+
+
+def load_worker_template(template_args: dict, bytecode_cache: BytecodeCache) -> None:
+    global worker_template, worker_bytecode_cache, worker_environments
+    worker_template = LoadedTemplate(**template_args)
+    worker_bytecode_cache = bytecode_cache
+    worker_environments = {}
+
+
+def generate_row(
+    template: LoadedTemplate, index: int, row, output_dir: str, row_dir: str, options
+):
+    """
+    Returns:
+        (index, project folder, None) or (index, None, error message) if the row failed
+    """
+    try:
+        if isinstance(row, Exception):
+            raise row
+        project = template.generate(
+            row, row_output_dir(output_dir, row_dir, index, row), **options
+        )
+        return index, project, None
+    except Exception as e:
+        # not every cookiecutter exception survives pickling back to the parent
+        return index, None, "{}: {}".format(type(e).__name__, e)
+
+
+def generate_worker_row(args):
+    with caching_bytecode(worker_bytecode_cache), reusing_environment(
+        worker_environments
+    ):
+        return generate_row(worker_template, *args)
+
+
+def generate_rows(
+    template_args: dict,
+    rows,
+    output_dir: str = ".",
+    row_dir: str = CONST.DEFAULT_ROW_DIR,
+    jobs: int = 1,
+    overwrite_if_exists: bool = False,
+    skip_if_file_exists: bool = False,
+    bytecode_cache: BytecodeCache = None,
+) -> "list[str]":
+    """
+    Generate the template (a LoadedTemplate of template_args) once per row, each into its own
+    folder (row_dir, formatted with the row's values and its 1-based index, within
+    output_dir), across jobs worker processes. Each row's outcome is logged as it completes.
+    Template files are compiled through bytecode_cache, when given.
+
+    Returns:
+        the project folders, in row order
+
+    Raises:
+        BulkGenerationError: with every failed row, once all rows are done
+    """
+    options = {
+        "overwrite_if_exists": overwrite_if_exists,
+        "skip_if_file_exists": skip_if_file_exists,
+    }
+    row_args = (
+        (index, row, output_dir, row_dir, options) for index, row in enumerate(rows, 1)
+    )
+
+    if jobs > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        executor = ProcessPoolExecutor(
+            max_workers=jobs,
+            initializer=load_worker_template,
+            initargs=(template_args, bytecode_cache),
+        )
+        with executor:
+            results = report_progress(executor.map(generate_worker_row, row_args))
+    else:
+        template = LoadedTemplate(**template_args)
+        with caching_bytecode(bytecode_cache), reusing_environment():
+            results = report_progress(
+                generate_row(template, *args) for args in row_args
+            )
+
+    projects = [project for _, project, _ in results]
+    failures = [(index, error) for index, _, error in results if error is not None]
+    logger.info(
+        "Generated %d of %d rows (%d failed)",
+        len(results) - len(failures),
+        len(results),
+        len(failures),
+    )
+    if failures:
+        raise BulkGenerationError(failures)
+    return projects
+
+
+def report_progress(results) -> list:
+    reported = []
+    for index, project, error in results:
+        if error is None:
+            logger.info("row %d: generated %s", index, project)
+        else:
+            logger.error("row %d: failed: %s", index, error)
+        reported.append((index, project, error))
+    return reported
+
+
+def bulk_cookiecutters(
+    templates: str,
+    contexts: str,
+    contexts_fmt: str = None,
+    row_dir: str = CONST.DEFAULT_ROW_DIR,
+    jobs: int = 1,
+    template_cache: TemplateCache = None,
+    bytecode_cache: BytecodeCache = None,
+    output_dir: str = ".",
+    extra_context: dict = None,
+    config_file: str = None,
+    default_config: bool = False,
+    overwrite_if_exists: bool = False,
+    skip_if_file_exists: bool = False,
+    **options
+) -> "list[str]":
+    """
+    Generate a single template source once per row of the contexts file (see read_contexts),
+    fetching it (through the template cache, if given) just once. extra_context applies to
+    every row, and each row's values override it.
+
+    Returns:
+        the project folders, in row order
+
+    Raises:
+        BulkGenerationError: with every failed row, once all rows are done
+    """
+    from cookiecutter.config import get_user_config
+    from cookiecutter.repository import determine_repo_dir
+
+    sources = decode_template_sources(templates)
+    if len(sources) != 1:
+        raise ValueError("bulk generation takes a single template, not " + templates)
+    source = sources[0]
+
+    fetched = None
+    if template_cache is not None and is_cacheable(source.template):
+        fetched = fetch_shared(sources, options, template_cache)[0]
+    template, kwargs = resolve_template(source, options, fetched)
+
+    config = get_user_config(config_file=config_file, default_config=default_config)
+    repo_dir, cleanup = determine_repo_dir(
+        template=template,
+        abbreviations=config["abbreviations"],
+        clone_to_dir=config["cookiecutters_dir"],
+        checkout=kwargs.get("checkout"),
+        no_input=True,
+        password=kwargs.get("password"),
+        directory=kwargs.get("directory"),
+    )
+    template_args = {
+        "repo_dir": repo_dir,
+        "template": source.template,
+        "config_file": config_file,
+        "default_config": default_config,
+        "extra_context": extra_context,
+    }
+    try:
+        with open(contexts) as f:
+            return generate_rows(
+                template_args,
+                read_contexts(f, contexts_format(contexts, contexts_fmt)),
+                output_dir=output_dir,
+                row_dir=row_dir,
+                jobs=jobs,
+                overwrite_if_exists=overwrite_if_exists,
+                skip_if_file_exists=skip_if_file_exists,
+                bytecode_cache=bytecode_cache,
+            )
+    finally:
+        if cleanup:
+            shutil.rmtree(repo_dir, ignore_errors=True)
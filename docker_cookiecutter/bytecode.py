@@ -0,0 +1,192 @@
+"""Persistent cache of the bytecode jinja compiles template files into.
+
+Kept alongside the template cache (in its bytecode/ folder), so that it lasts on the same
+mounted volume, and so that a new container doesn't recompile every file of a template it has
+rendered before. Entries are keyed on a hash of the template file's content and name, and of
+the jinja settings that affect compilation, so an edited template (or a new jinja) simply misses
+the cache rather than needing it invalidated. Stale entries are evicted least recently used
+first once the cache is over its size cap (or not used for its max age).
+"""
+
+import hashlib
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+
+# Work around python's lack of consts
+class CONST(object):
+    __slots__ = ()
+    BYTECODE_DIR = "bytecode"
+    SUFFIX = ".jinja"
+    DEFAULT_MAX_MB = 64
+    # the environment settings that change what a template compiles to
+    COMPILE_SETTINGS = (
+        "block_start_string",
+        "block_end_string",
+        "variable_start_string",
+        "variable_end_string",
+        "comment_start_string",
+        "comment_end_string",
+        "line_statement_prefix",
+        "line_comment_prefix",
+        "trim_blocks",
+        "lstrip_blocks",
+        "newline_sequence",
+        "keep_trailing_newline",
+        "optimized",
+        "autoescape",
+    )
+
+
+CONST = CONST()
+
+
+def environment_fingerprint(environment) -> str:
+    import jinja2
+
+    settings = [jinja2.__version__] + sorted(environment.extensions)
+    for name in CONST.COMPILE_SETTINGS:
+        value = getattr(environment, name, None)
+        settings.append(
+            getattr(value, "__qualname__", None) if callable(value) else value
+        )
+    return repr(settings)
+
+
+class BytecodeCache:
+    """
+    A jinja bytecode cache (see jinja2.BytecodeCache) in a folder, usually
+    bytecode_dir(template cache root). Cheap to pickle, so it can be handed to worker processes.
+    """
+
+    def __init__(self, root: str, max_bytes: int = None, max_age: float = None) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key + CONST.SUFFIX)
+
+    def get_bucket(self, environment, name: str, filename: str, source: str):
+        from jinja2.bccache import Bucket
+
+        key = hashlib.sha256(
+            "\0".join(
+                [environment_fingerprint(environment), name, filename or "", source]
+            ).encode()
+        ).hexdigest()
+        # the key already covers the source, so there's no need for a separate checksum
+        bucket = Bucket(environment, key, key)
+        try:
+            with open(self.path(key), "rb") as f:
+                bucket.load_bytecode(f)
+        except OSError:
+            pass
+        if bucket.code is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            try:
+                # the mtime tracks when the entry was last used, for eviction
+                os.utime(self.path(key))
+            except OSError:
+                pass
+        return bucket
+
+    def set_bucket(self, bucket) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                bucket.write_bytecode(f)
+            os.replace(tmp_path, self.path(bucket.key))
+        except OSError:
+            # a cache that can't be written to only costs the compile
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def entries(self):
+        """(path, size, last used) of each entry."""
+        result = []
+        for name in os.listdir(self.root):
+            if name.endswith(CONST.SUFFIX):
+                path = os.path.join(self.root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                result.append((path, stat.st_size, stat.st_mtime))
+        return result
+
+    def evict(self, now: float = None) -> int:
+        """
+        Remove entries not used for max_age, then least recently used entries until the cache
+        fits in max_bytes. Returns the number of entries removed.
+        """
+        now = time.time() if now is None else now
+        entries = sorted(self.entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+
+        for path, size, last_used in entries:
+            too_old = self.max_age is not None and now - last_used > self.max_age
+            too_big = self.max_bytes is not None and total > self.max_bytes
+            if not too_old and not too_big:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        return evicted
+
+    def clear(self) -> None:
+        for path, _, _ in self.entries():
+            os.remove(path)
+
+    def stats(self) -> dict:
+        """This run's hits / misses, plus the current entries and size."""
+        entries = self.entries()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(entries),
+            "size": sum(size for _, size, _ in entries),
+        }
+
+
+def bytecode_dir(template_cache_root: str) -> str:
+    return os.path.join(template_cache_root, CONST.BYTECODE_DIR)
+
+
+@contextmanager
+def caching_bytecode(cache: BytecodeCache = None):
+    """
+    While active, the jinja environments cookiecutter renders templates with load and store
+    their compiled templates through cache (when given).
+    """
+    if cache is None:
+        yield
+        return
+
+    # deferred with the rest of cookiecutter, see cookiecutters.cookiecutter
+    import cookiecutter.generate
+
+    strict_environment = cookiecutter.generate.StrictEnvironment
+
+    class CachingStrictEnvironment(strict_environment):
+        def __init__(self, **kwargs):
+            super().__init__(**kwargs)
+            self.bytecode_cache = cache
+
+    # only template files are loaded (and so cached), the rest is rendered from strings
+    cookiecutter.generate.StrictEnvironment = CachingStrictEnvironment
+    try:
+        yield
+    finally:
+        cookiecutter.generate.StrictEnvironment = strict_environment
@@ -0,0 +1,354 @@
+"""Persistent, content-addressed cache of fetched remote templates.
+
+Entries are keyed on (normalized template URI, resolved commit, directories), so a cache can
+be shared by every run (eg. on a docker volume) and a moving ref such as a branch is revalidated
+against the remote head rather than trusted. Only the requested revision is fetched (shallow and
+without blobs up front), and when directories are requested only those subtrees are checked out.
+Layout under the cache root:
+
+    entries/<key>/       the template files at that commit (just the directories, if given)
+    entries/<key>.json   the entry's metadata (uri, ref, directories, commit, size, created,
+                         last_used)
+    stats.json           cumulative hit / miss / eviction counts
+    bytecode/            compiled jinja templates (see bytecode.py)
+    tmp/                 in-progress fetches
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+
+from docker_cookiecutter.templates import expand_template_uri, normalize_template_uri
+
+
+# Work around python's lack of consts
+class CONST(object):
+    __slots__ = ()
+    CACHE_ENV_VAR = "DOCKER_COOKIECUTTER_TEMPLATE_CACHE"
+    ENTRIES = "entries"
+    TMP = "tmp"
+    STATS_FILE = "stats.json"
+
+
+CONST = CONST()
+
+COMMIT_REGEX = re.compile(r"^[0-9a-f]{40}$")
+
+
+class TemplateCacheError(Exception):
+    """A template could not be fetched into the cache."""
+
+
+def entry_key(uri: str, commit: str, directories: "list[str]" = None) -> str:
+    key = uri + "\0" + commit
+    if directories:
+        key += "\0" + "\0".join(directories)
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+
+def normalize_directories(directories):
+    """
+    Sorted, de-duplicated directories within the repository, or None for the whole repository
+    (including when one of the directories is the repository root).
+    """
+    if not directories:
+        return None
+    normalized = set()
+    for directory in directories:
+        directory = directory.replace("\\", "/").strip("/")
+        if not directory:
+            return None
+        normalized.add(directory)
+    return sorted(normalized)
+
+
+def key_of(entry: dict) -> str:
+    return entry_key(entry["uri"], entry["commit"], entry.get("directories"))
+
+
+def run_git(*args, cwd=None) -> str:
+    try:
+        completed = subprocess.run(
+            ("git",) + args,
+            cwd=cwd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+            check=True,
+        )
+    except subprocess.CalledProcessError as e:
+        raise TemplateCacheError(
+            "git {} failed: {}".format(args[0], e.stderr.strip())
+        ) from None
+    return completed.stdout
+
+
+def resolve_remote_commit(url: str, ref: str = None):
+    """
+    Ask the remote which commit ref (default: HEAD) currently points at. Returns None when the
+    remote has no such ref name (eg. ref is an abbreviated commit).
+    """
+    if ref is not None and COMMIT_REGEX.match(ref):
+        return ref
+
+    wanted = ["HEAD"] if ref is None else [ref, "refs/heads/" + ref, "refs/tags/" + ref]
+    refs = {}
+    for line in run_git("ls-remote", url).splitlines():
+        commit, _, name = line.partition("\t")
+        refs[name] = commit
+
+    for name in wanted:
+        # prefer the commit an annotated tag points at over the tag object itself
+        commit = refs.get(name + "^{}") or refs.get(name)
+        if commit is not None:
+            return commit
+
+    return None
+
+
+def shallow_fetch(
+    url: str, repo_dir: str, checkout: str = None, directories: "list[str]" = None
+) -> str:
+    """
+    Fetch just the checkout revision (default: the remote HEAD) into a new repo_dir, as a
+    shallow partial clone that only downloads the blobs being checked out, and with only the
+    directories checked out (sparse) when given. Returns the commit checked out.
+    """
+    run_git("init", "--quiet", repo_dir)
+    run_git("remote", "add", "origin", url, cwd=repo_dir)
+    if directories:
+        run_git("config", "core.sparseCheckout", "true", cwd=repo_dir)
+        with open(os.path.join(repo_dir, ".git", "info", "sparse-checkout"), "w") as f:
+            f.writelines("/" + directory + "/\n" for directory in directories)
+
+    fetch = ("fetch", "--quiet", "--filter=blob:none")
+    try:
+        run_git(*fetch, "--depth", "1", "origin", checkout or "HEAD", cwd=repo_dir)
+        revision = "FETCH_HEAD"
+    except TemplateCacheError:
+        if checkout is None:
+            # the remote's HEAD can't be fetched, and there's nothing else to look for
+            raise
+        # eg. an abbreviated commit, which can only be found amongst the full history
+        run_git(*fetch, "--tags", "origin", cwd=repo_dir)
+        revision = checkout
+        if not COMMIT_REGEX.match(checkout):
+            revision = run_git(
+                "rev-parse", "--verify", "--quiet", checkout + "^{commit}", cwd=repo_dir
+            ).strip()
+
+    run_git("checkout", "--quiet", "--detach", revision, cwd=repo_dir)
+    return run_git("rev-parse", "HEAD", cwd=repo_dir).strip()
+
+
+def folder_size(path: str) -> int:
+    size = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            size += os.lstat(os.path.join(root, name)).st_size
+    return size
+
+
+def write_json_atomic(path: str, data) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+class TemplateCache:
+    """
+    Fetches remote templates through the cache, returning a local folder for cookiecutter.
+    Cheap to pickle, so it can be handed to worker processes.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        max_bytes: int = None,
+        max_age: float = None,
+        revalidate: bool = True,
+    ) -> None:
+        """
+        Args:
+            root: the cache folder (eg. a mounted volume)
+            max_bytes: evict least recently used entries beyond this total size
+            max_age: evict entries not used for this many seconds
+            revalidate: check moving refs against the remote; when False, the most recently
+                fetched entry for the same uri and ref is used without contacting the remote
+        """
+        # absolute, as templates may be fetched while cookiecutter works in another folder
+        # (see pipeline.py)
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.revalidate = revalidate
+        self.entries_dir = os.path.join(self.root, CONST.ENTRIES)
+        self.tmp_dir = os.path.join(self.root, CONST.TMP)
+        os.makedirs(self.entries_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def fetch(
+        self, template: str, checkout: str = None, directories: "list[str]" = None
+    ) -> str:
+        """
+        Return a local folder holding template at checkout (default: remote HEAD). When
+        directories within the repository are given, only those subtrees are fetched, and they
+        keep their place within the returned folder.
+        """
+        url = expand_template_uri(template)
+        uri = normalize_template_uri(template)
+        directories = normalize_directories(directories)
+
+        entry = None
+        if not self.revalidate:
+            entry = self.find_latest(uri, checkout, directories)
+        if entry is None:
+            try:
+                commit = resolve_remote_commit(url, checkout)
+            except TemplateCacheError:
+                # offline: fall back to whatever we last fetched for this ref
+                entry = self.find_latest(uri, checkout, directories)
+                if entry is None:
+                    raise
+            else:
+                if commit is None:
+                    # not a ref name, so an (immutable) abbreviated commit
+                    entry = self.find_latest(uri, checkout, directories)
+                else:
+                    entry = self.read_meta(entry_key(uri, commit, directories))
+
+        if entry is not None and os.path.isdir(self.entry_path(entry)):
+            self.touch(entry)
+            self.update_stats(hits=1)
+            return self.entry_path(entry)
+
+        self.update_stats(misses=1)
+        return self.add(url, uri, checkout, directories)
+
+    def add(
+        self, url: str, uri: str, checkout: str = None, directories: "list[str]" = None
+    ) -> str:
+        work_dir = tempfile.mkdtemp(dir=self.tmp_dir)
+        try:
+            repo_dir = os.path.join(work_dir, "repo")
+            commit = shallow_fetch(url, repo_dir, checkout, directories)
+            shutil.rmtree(os.path.join(repo_dir, ".git"))
+
+            entry = {"uri": uri, "ref": checkout, "directories": directories}
+            entry["commit"] = commit
+            path = self.entry_path(entry)
+            try:
+                os.replace(repo_dir, path)
+            except OSError:
+                # someone else cached the same commit in the meantime, theirs is as good
+                if not os.path.isdir(path):
+                    raise
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        now = time.time()
+        entry.update(size=folder_size(path), created=now, last_used=now)
+        self.write_meta(entry)
+        return path
+
+    def entry_path(self, entry: dict) -> str:
+        return os.path.join(self.entries_dir, key_of(entry))
+
+    def meta_path(self, key: str) -> str:
+        return os.path.join(self.entries_dir, key + ".json")
+
+    def read_meta(self, key: str):
+        try:
+            with open(self.meta_path(key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def write_meta(self, entry: dict) -> None:
+        write_json_atomic(self.meta_path(key_of(entry)), entry)
+
+    def touch(self, entry: dict) -> None:
+        entry["last_used"] = time.time()
+        self.write_meta(entry)
+
+    def entries(self) -> "list[dict]":
+        result = []
+        for name in os.listdir(self.entries_dir):
+            if name.endswith(".json"):
+                entry = self.read_meta(name[: -len(".json")])
+                if entry is not None:
+                    result.append(entry)
+        return result
+
+    def find_latest(self, uri: str, ref: str = None, directories: "list[str]" = None):
+        candidates = [
+            e
+            for e in self.entries()
+            if e["uri"] == uri
+            and e["ref"] == ref
+            and e.get("directories") == directories
+        ]
+        return max(candidates, key=lambda e: e["created"], default=None)
+
+    def evict(self, now: float = None) -> int:
+        """
+        Remove entries older than max_age, then least recently used entries until the cache
+        fits in max_bytes. Returns the number of entries removed.
+        """
+        now = time.time() if now is None else now
+        entries = sorted(self.entries(), key=lambda e: e["last_used"])
+        total = sum(e["size"] for e in entries)
+        evicted = 0
+
+        for entry in entries:
+            too_old = (
+                self.max_age is not None and now - entry["last_used"] > self.max_age
+            )
+            too_big = self.max_bytes is not None and total > self.max_bytes
+            if not too_old and not too_big:
+                continue
+
+            key = key_of(entry)
+            try:
+                os.remove(self.meta_path(key))
+                evicted += 1
+            except FileNotFoundError:
+                # a concurrent run sharing the cache evicted it first
+                pass
+            shutil.rmtree(os.path.join(self.entries_dir, key), ignore_errors=True)
+            total -= entry["size"]
+
+        if evicted > 0:
+            self.update_stats(evictions=evicted)
+        return evicted
+
+    def stats(self) -> dict:
+        """Cumulative hits / misses / evictions, plus the current entries and size."""
+        entries = self.entries()
+        result = self.read_counts()
+        result["entries"] = len(entries)
+        result["size"] = sum(e["size"] for e in entries)
+        return result
+
+    def read_counts(self) -> dict:
+        """The cumulative hits / misses / evictions, from stats.json alone."""
+        result = {"hits": 0, "misses": 0, "evictions": 0}
+        try:
+            with open(os.path.join(self.root, CONST.STATS_FILE)) as f:
+                result.update(json.load(f))
+        except (OSError, ValueError):
+            pass
+        return result
+
+    def update_stats(self, **deltas) -> None:
+        # read-modify-write, so concurrent runs may occasionally lose a count
+        counts = self.read_counts()
+        for name, delta in deltas.items():
+            counts[name] = counts.get(name, 0) + delta
+        write_json_atomic(os.path.join(self.root, CONST.STATS_FILE), counts)
@@ -1,13 +1,320 @@
 """Console script for docker_cookiecutter."""
 
+import os
 import sys
 
-from docker_cookiecutter.suggest import cookiecutter_to_docker_args
+from docker_cookiecutter import instrumentation
+from docker_cookiecutter.batch import CONST as BATCH_CONST
 
 
-def main():
-    print(" ".join(cookiecutter_to_docker_args(sys.argv[1:])))
+# Work around python's lack of consts
+class CONST(object):
+    __slots__ = ()
+    SUGGEST = "suggest"
+    SERVE = "serve"
+    RUN = "run"
+    SESSION = "session"
+    BATCH = "--batch"
+    VIA_SERVER = "--server"
+    SOCKET = "--socket"
+    TEMPLATE_CACHE = "--template-cache"
+    BYTECODE_CACHE = "--bytecode-cache"
+    NO_CACHE = "--no-cache"
+    TIMINGS = "--timings"
+    EXEC = "--exec"
+    PRINT0 = "--print0"
+    JOBS = "--jobs"
+    DOCKER_SOCKET = "--docker-socket"
+    IDLE_TIMEOUT = "--idle-timeout"
+    # suggest options taking a number, and the cookiecutter_to_docker_args option they set
+    NUMERIC_SUGGEST_OPTIONS = {
+        "--max-mounts": "max_mounts",
+        "--min-mount-depth": "min_mount_depth",
+    }
+    SESSION_USAGE = (
+        "usage: session start [--idle-timeout SECONDS] [--template-cache CACHE] "
+        "[--null | -0 | --jsonl] < commandlines\n"
+        "       session exec SESSION COMMANDLINE...\n"
+        "       session stop SESSION"
+    )
+    BATCH_FORMATS = {
+        "--null": BATCH_CONST.FORMAT_NULL,
+        "-0": BATCH_CONST.FORMAT_NULL,
+        "--jsonl": BATCH_CONST.FORMAT_JSONL,
+    }
+
+
+CONST = CONST()
+
+
+def parse_socket_option(args: "list[str]"):
+    if len(args) == 0:
+        return None
+    if len(args) == 2 and args[0] == CONST.SOCKET:
+        return args[1]
+    sys.exit("usage: serve [--socket PATH]")
+
+
+def parse_run_options(args: "list[str]") -> dict:
+    """The run options, as engine.run_batch keyword options."""
+    options = {}
+    index = 0
+    while index < len(args):
+        option = args[index]
+        if option in CONST.BATCH_FORMATS:
+            options["fmt"] = CONST.BATCH_FORMATS[option]
+        elif (
+            option == CONST.JOBS and index + 1 < len(args) and args[index + 1].isdigit()
+        ):
+            index += 1
+            options["jobs"] = max(1, int(args[index]))
+        elif option == CONST.DOCKER_SOCKET and index + 1 < len(args):
+            index += 1
+            options["socket_path"] = args[index]
+        elif option == CONST.TEMPLATE_CACHE and index + 1 < len(args):
+            index += 1
+            options["template_cache"] = args[index]
+        else:
+            sys.exit(
+                "usage: run [--null | -0 | --jsonl] [--jobs N] [--docker-socket PATH] "
+                "[--template-cache CACHE] < commandlines"
+            )
+        index += 1
+    return options
+
+
+def parse_session_start_options(args: "list[str]"):
+    """Returns (batch format, start_session keyword options)."""
+    fmt = BATCH_CONST.FORMAT_LINES
+    options = {}
+    index = 0
+    while index < len(args):
+        option = args[index]
+        if option in CONST.BATCH_FORMATS:
+            fmt = CONST.BATCH_FORMATS[option]
+        elif (
+            option == CONST.IDLE_TIMEOUT
+            and index + 1 < len(args)
+            and args[index + 1].isdigit()
+        ):
+            index += 1
+            options["idle_timeout"] = int(args[index])
+        elif option == CONST.TEMPLATE_CACHE and index + 1 < len(args):
+            index += 1
+            options["template_cache"] = args[index]
+        else:
+            sys.exit(CONST.SESSION_USAGE)
+        index += 1
+    return fmt, options
+
+
+def run_session(args: "list[str]"):
+    from docker_cookiecutter import session
+
+    action = args[0] if len(args) > 0 else None
+    try:
+        if action == "start":
+            from docker_cookiecutter.batch import parse_record, read_records
+
+            fmt, options = parse_session_start_options(args[1:])
+            delimiter = "\0" if fmt == BATCH_CONST.FORMAT_NULL else "\n"
+            commandlines = [
+                parse_record(record, fmt)
+                for record in read_records(sys.stdin, delimiter)
+                if record.strip()
+            ]
+            print(session.start_session(commandlines, **options))
+            return
+        if action == "exec" and len(args) > 2:
+            return session.exec_in_session(args[1], args[2:])
+        if action == "stop" and len(args) == 2:
+            return session.stop_session(args[1])
+        # within the session container
+        if action == "serve":
+            _, options = parse_session_start_options(args[1:])
+            return session.serve_session(
+                options.get("idle_timeout", session.CONST.DEFAULT_IDLE_TIMEOUT)
+            )
+        if action == "run":
+            return session.run_in_session(args[1:])
+    except session.SessionError as e:
+        sys.exit(str(e))
+    sys.exit(CONST.SESSION_USAGE)
+
+
+def parse_suggest_options(args: "list[str]"):
+    """
+    Split the leading suggest options from the docker commandline (which never starts with
+    "-"). Returns (batch format or None, whether to go via the server, whether to report
+    timings, the output (None for a shell commandline, or --exec or --print0), suggest
+    keyword options, remaining args, whether to use the suggest memo).
+    """
+    batch_fmt = None
+    via_server = False
+    timings = False
+    use_memo = True
+    output = None
+    suggest_options = {}
+
+    index = 0
+    while index < len(args) and args[index].startswith("-"):
+        option = args[index]
+        if option == CONST.BATCH:
+            batch_fmt = batch_fmt or BATCH_CONST.FORMAT_LINES
+        elif option in CONST.BATCH_FORMATS:
+            batch_fmt = CONST.BATCH_FORMATS[option]
+        elif option == CONST.VIA_SERVER:
+            via_server = True
+        elif option == CONST.TIMINGS:
+            timings = True
+        elif option == CONST.NO_CACHE:
+            use_memo = False
+        elif option in (CONST.EXEC, CONST.PRINT0):
+            if output not in (None, option):
+                sys.exit("--exec and --print0 can't be combined")
+            output = option
+        elif option == CONST.TEMPLATE_CACHE and index + 1 < len(args):
+            index += 1
+            suggest_options["template_cache"] = args[index]
+        elif option == CONST.BYTECODE_CACHE:
+            suggest_options["bytecode_cache"] = True
+        elif (
+            option in CONST.NUMERIC_SUGGEST_OPTIONS
+            and index + 1 < len(args)
+            and args[index + 1].isdigit()
+        ):
+            index += 1
+            suggest_options[CONST.NUMERIC_SUGGEST_OPTIONS[option]] = int(args[index])
+        else:
+            sys.exit("unrecognized suggest option: " + option)
+        index += 1
+
+    if batch_fmt is not None and via_server:
+        sys.exit("--batch and --server can't be combined")
+    if batch_fmt is not None and output is not None:
+        sys.exit("--batch can't be combined with --exec or --print0")
+    if timings and output == CONST.EXEC:
+        sys.exit("--timings and --exec can't be combined")
+    if "bytecode_cache" in suggest_options and "template_cache" not in suggest_options:
+        sys.exit(
+            "--bytecode-cache is kept in the --template-cache, which must be given"
+        )
+
+    if output is not None:
+        # resolved here, as a server may well be running from another folder
+        suggest_options["argv"] = True
+        suggest_options["cwd"] = os.getcwd()
+
+    return (
+        batch_fmt,
+        via_server,
+        timings,
+        output,
+        suggest_options,
+        args[index:],
+        use_memo,
+    )
+
+
+def main(argv=None):
+    args = sys.argv[1:] if argv is None else argv
+
+    if len(args) > 0 and args[0] == CONST.SERVE:
+        from docker_cookiecutter.server import serve
+
+        return serve(parse_socket_option(args[1:]))
+
+    if len(args) > 0 and args[0] == CONST.RUN:
+        from docker_cookiecutter.engine import EngineError, run_batch
+
+        try:
+            return run_batch(**parse_run_options(args[1:]))
+        except EngineError as e:
+            # eg. a DOCKER_HOST that isn't a unix socket
+            sys.exit(str(e))
+
+    if len(args) > 0 and args[0] == CONST.SESSION:
+        return run_session(args[1:])
+
+    # the entrypoint passes the subcommand through, but it's also the default
+    if len(args) > 0 and args[0] == CONST.SUGGEST:
+        args = args[1:]
+
+    (
+        batch_fmt,
+        via_server,
+        timings,
+        output,
+        suggest_options,
+        args,
+        use_memo,
+    ) = parse_suggest_options(args)
+
+    # a batch is already paying for its warm process, as is a server
+    memo = None
+    if use_memo and batch_fmt is None and not via_server:
+        from docker_cookiecutter.memo import SuggestMemo
+
+        memo = SuggestMemo()
+
+    if not timings:
+        return run_suggest(batch_fmt, via_server, output, suggest_options, args, memo)
+
+    # with --server, only the time waiting on the server is seen from here
+    with instrumentation.recording() as recorder:
+        with instrumentation.stage("total"):
+            exit_code = run_suggest(
+                batch_fmt, via_server, output, suggest_options, args, memo
+            )
+    import json
+
+    print(json.dumps(recorder.report()), file=sys.stderr)
+    return exit_code
+
+
+def run_suggest(
+    batch_fmt,
+    via_server: bool,
+    output,
+    suggest_options: dict,
+    args: "list[str]",
+    memo=None,
+):
+    # each way of suggesting imports only what it needs, see test_cli's import budget
+    if batch_fmt is not None:
+        from docker_cookiecutter.batch import suggest_batch
+
+        return suggest_batch(fmt=batch_fmt, **suggest_options)
+
+    try:
+        if via_server:
+            from docker_cookiecutter.server import suggest
+
+            result = suggest(args, **suggest_options)
+        elif memo is not None:
+            result = memo.suggest(args, **suggest_options)
+        else:
+            from docker_cookiecutter.suggest import cookiecutter_to_docker_args
+
+            result = cookiecutter_to_docker_args(args, **suggest_options)
+    except ValueError as e:
+        # a commandline that can't be containerized (eg. a manifest's template outside its
+        # folder), rather than a bug
+        sys.exit(str(e))
+    return output_suggestion(result, output)
+
+
+def output_suggestion(result: "list[str]", output) -> None:
+    if output == CONST.EXEC:
+        # replaces this process, so that docker gets the terminal and signals directly
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.execvp(result[0], result)
+    elif output == CONST.PRINT0:
+        sys.stdout.write("".join(arg + "\0" for arg in result))
+    else:
+        print(" ".join(result))
 
 
 if __name__ == "__main__":
-    main()  # pragma: no cover
+    sys.exit(main())  # pragma: no cover
@@ -1,14 +1,948 @@
-from cookiecutter.main import cookiecutter
+"""Generate a project from several stacked cookiecutter templates."""
 
-from docker_cookiecutter.templates import decode_template_sources
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack
 
+from cookiecutter.exceptions import CookiecutterException
+from cookiecutter.log import configure_logger
+
+from docker_cookiecutter.bytecode import CONST as BYTECODE_CONST
+from docker_cookiecutter.bytecode import BytecodeCache, bytecode_dir, caching_bytecode
+from docker_cookiecutter.cache import CONST as CACHE_CONST
+from docker_cookiecutter.cache import TemplateCache, TemplateCacheError
+from docker_cookiecutter.incremental import (
+    Manifest,
+    is_same_content,
+    skipping_unchanged_renders,
+)
+from docker_cookiecutter.render import rendering_concurrently
+from docker_cookiecutter.templates import (
+    TemplateManifest,
+    encode_template_sources,
+    is_cacheable,
+    is_repo_url,
+    normalize_template_uri,
+    template_sources,
+)
+
+
+# Work around python's lack of consts
+class CONST(object):
+    __slots__ = ()
+    ON_CONFLICT_ERROR = "error"
+    ON_CONFLICT_OVERWRITE = "overwrite"
+    ON_CONFLICT_SKIP = "skip"
+    ON_CONFLICT_CHOICES = (ON_CONFLICT_ERROR, ON_CONFLICT_OVERWRITE, ON_CONFLICT_SKIP)
+    STAGING_PREFIX = ".cookiecutters-"
+
+
+CONST = CONST()
+
+logger = logging.getLogger(__name__)
+
+
+class CookiecuttersError(Exception):
+    """
+    One or more templates failed to generate.
+
+    failures - list of (TemplateSourceInfo, exception) in template order
+    """
+
+    def __init__(self, failures) -> None:
+        self.failures = failures
+        super().__init__(
+            "\n".join(
+                "{}: {}".format(source.template, error) for source, error in failures
+            )
+        )
+
+
+class TemplateGenerationError(Exception):
+    """A template failed to generate in a worker process."""
+
+
+class OutputConflictError(Exception):
+    """A template would overwrite files written by an earlier template in the same run."""
+
+
+def cookiecutter(template: str, **kwargs) -> str:
+    """
+    cookiecutter.main.cookiecutter, imported on first use since it pulls in jinja2, requests
+    and more, which aren't needed until generation starts.
+    """
+    from cookiecutter.main import cookiecutter as generate_project
+
+    return generate_project(template, **kwargs)
+
+
+def cookiecutter_kwargs(source, options: dict) -> dict:
+    """
+    The cookiecutter() keyword args for the template source: the options that were given,
+    with the source's own checkout / directory taking precedence.
+    """
+    kwargs = {k: v for k, v in options.items() if v is not None}
+    if source.checkout:
+        kwargs["checkout"] = source.checkout
+    if source.directory:
+        kwargs["directory"] = source.directory
+    return kwargs
+
+
+def resolve_template(source, options: dict, fetched=None):
+    """
+    Returns the (template, kwargs) to call cookiecutter() with for the source, given the local
+    folder its repository was fetched into (see fetch_shared), if it was.
+    """
+    kwargs = cookiecutter_kwargs(source, options)
+    if fetched is None:
+        return source.template, kwargs
+    if isinstance(fetched, Exception):
+        raise fetched
+
+    # the directory stays in kwargs, as the fetched subtrees keep their place in the template
+    kwargs.pop("checkout", None)
+    return fetched, kwargs
+
+
+def fetch_groups(sources, options: dict) -> OrderedDict:
+    """
+    The indices of the cacheable sources, grouped by the (repository, checkout) they need, so
+    that every source in a group can be generated from one fetch.
+    """
+    groups = OrderedDict()
+    for index, source in enumerate(sources):
+        if is_cacheable(source.template):
+            key = (
+                normalize_template_uri(source.template),
+                cookiecutter_kwargs(source, options).get("checkout"),
+            )
+            groups.setdefault(key, []).append(index)
+    return groups
+
+
+def wants_shared_fetch(sources, options: dict) -> bool:
+    """
+    Whether fetching remote sources ourselves beats letting cookiecutter clone each of them:
+    when a repository is used by several sources, or only a directory of it is wanted.
+    """
+    return any(
+        len(indices) > 1
+        or cookiecutter_kwargs(sources[indices[0]], options).get("directory")
+        for indices in fetch_groups(sources, options).values()
+    )
+
+
+def fetch_shared(
+    sources, options: dict, template_cache: TemplateCache, jobs: int = 1
+) -> "list":
+    """
+    Fetch each remote repository once per checkout through the template cache, with just the
+    directories its sources need (or all of it, if any source needs the whole repository).
+    Different repositories are fetched concurrently when jobs > 1.
+
+    Returns:
+        for each source, the local folder it was fetched into, the exception fetching it
+        raised, or None if it isn't fetched (eg. a local template)
+    """
+    groups = list(fetch_groups(sources, options).values())
+
+    def fetch(indices):
+        kwargs = [cookiecutter_kwargs(sources[i], options) for i in indices]
+        directories = [k.get("directory") for k in kwargs]
+        try:
+            return template_cache.fetch(
+                sources[indices[0]].template,
+                kwargs[0].get("checkout"),
+                directories if all(directories) else None,
+            )
+        except Exception as e:
+            return e
+
+    if jobs > 1 and len(groups) > 1:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(fetch, groups))
+    else:
+        results = [fetch(indices) for indices in groups]
+
+    fetched = [None] * len(sources)
+    for indices, result in zip(groups, results):
+        for index in indices:
+            fetched[index] = result
+
+    saved = sum(len(indices) - 1 for indices in groups)
+    if saved > 0:
+        logger.info(
+            "Fetched %d repositories for %d templates (%d fetches saved)",
+            len(groups),
+            len(groups) + saved,
+            saved,
+        )
+    return fetched
+
+
+def cookiecutters(
+    templates: str,
+    jobs: int = 1,
+    on_conflict: str = CONST.ON_CONFLICT_ERROR,
+    template_cache: TemplateCache = None,
+    incremental: bool = False,
+    bytecode_cache: BytecodeCache = None,
+    render_jobs: int = 1,
+    prefetch: int = 0,
+    fail_fast: bool = False,
+    **options
+) -> "list[str]":
+    """
+    Generate each of the template sources in turn.
+
+    Args:
+        templates: encoded template sources (see templates.encode_template_sources), or
+            @FILE for those of a manifest file (see templates.decode_template_manifest)
+        jobs: number of templates to generate concurrently, in separate processes
+        on_conflict: (jobs > 1 or incremental only) what to do when a template writes a file
+            that an earlier template in the same run wrote: "error" fails the later template,
+            "overwrite" lets it win (as with sequential generation), "skip" keeps the earlier
+            file
+        template_cache: fetch remote templates through this cache rather than cloning. Without
+            one, remote templates that share a repository or are given a directory are still
+            fetched once (and sparsely), through a cache that only lasts for the run
+        incremental: skip rendering template files that are unchanged since the last
+            (incremental) run into the same output folder, and skip writing files that render
+            to what is already there (see incremental.py)
+        bytecode_cache: load and store the templates' compiled jinja bytecode through this
+            cache (see bytecode.py), rather than compiling every template file every run
+        render_jobs: number of each template's files to render concurrently, in worker
+            processes (threads when incremental, see render.py)
+        prefetch: (sequential and not incremental only) number of templates to fetch ahead
+            of the one being generated, so that fetching overlaps rendering (see pipeline.py)
+        fail_fast: (prefetch only) stop at the first template that fails, rather than trying
+            every template
+        options: passed through to cookiecutter() (eg. output_dir, no_input, extra_context)
+
+    Returns:
+        the generated project folders, in template order
+
+    Raises:
+        CookiecuttersError: (jobs > 1, incremental or prefetch only) with every failure, once
+            all templates are done (or the first one, with fail_fast)
+    """
+    sources = template_sources(templates)
+
+    if prefetch > 0 and jobs <= 1 and not incremental:
+        return generate_prefetching(
+            sources,
+            template_cache,
+            bytecode_cache,
+            render_jobs,
+            prefetch,
+            fail_fast,
+            options,
+        )
+
+    if isinstance(sources, TemplateManifest):
+        if jobs <= 1 and not incremental:
+            return generate_streamed(
+                sources, template_cache, bytecode_cache, render_jobs, options
+            )
+        # generating concurrently (or incrementally) works from the whole list of sources
+        sources = list(sources)
+
+    if template_cache is None and wants_shared_fetch(sources, options):
+        with tempfile.TemporaryDirectory(prefix=CONST.STAGING_PREFIX) as cache_dir:
+            return generate(
+                sources,
+                jobs,
+                on_conflict,
+                TemplateCache(cache_dir),
+                incremental,
+                bytecode_cache,
+                render_jobs,
+                options,
+            )
+
+    return generate(
+        sources,
+        jobs,
+        on_conflict,
+        template_cache,
+        incremental,
+        bytecode_cache,
+        render_jobs,
+        options,
+    )
+
+
+def generate(
+    sources,
+    jobs: int,
+    on_conflict: str,
+    template_cache: TemplateCache,
+    incremental: bool,
+    bytecode_cache: BytecodeCache,
+    render_jobs: int,
+    options: dict,
+) -> "list[str]":
+    fetched = [None] * len(sources)
+    if template_cache is not None:
+        fetched = fetch_shared(sources, options, template_cache, jobs)
+
+    if incremental or (jobs > 1 and len(sources) > 1):
+        return generate_via_staging(
+            sources,
+            fetched,
+            jobs,
+            on_conflict,
+            incremental,
+            bytecode_cache,
+            render_jobs,
+            options,
+        )
 
-# TODO: Actually implement this..  right now, this is mostly a stub
-def cookiecutters(templates: str) -> "list[str]":
-    sources = decode_template_sources(templates)
     result = []
+    with caching_bytecode(bytecode_cache), rendering_concurrently(render_jobs):
+        for source, local in zip(sources, fetched):
+            template, kwargs = resolve_template(source, options, local)
+            result.append(cookiecutter(template, **kwargs))
 
-    for t in sources:
-        result.append(cookiecutter(t.template))
+    return result
+
+
+def generate_streamed(
+    sources,
+    template_cache: TemplateCache,
+    bytecode_cache: BytecodeCache,
+    render_jobs: int,
+    options: dict,
+) -> "list[str]":
+    """
+    Generate each of the sources in turn as they're read (eg. from a manifest), so that the
+    first is fetched and generated before the last is even read. Remote sources are fetched
+    through template_cache (or, without one, a cache that only lasts for the run), each
+    repository once per checkout and directory, just before the first source that needs it.
+    """
+    result = []
+    fetched = {}
+    with ExitStack() as stack:
+        stack.enter_context(caching_bytecode(bytecode_cache))
+        stack.enter_context(rendering_concurrently(render_jobs))
+        for source in sources:
+            local = None
+            if is_cacheable(source.template):
+                if template_cache is None:
+                    template_cache = TemplateCache(
+                        stack.enter_context(
+                            tempfile.TemporaryDirectory(prefix=CONST.STAGING_PREFIX)
+                        )
+                    )
+                kwargs = cookiecutter_kwargs(source, options)
+                checkout, directory = kwargs.get("checkout"), kwargs.get("directory")
+                key = (normalize_template_uri(source.template), checkout, directory)
+                if key not in fetched:
+                    try:
+                        fetched[key] = template_cache.fetch(
+                            source.template,
+                            checkout,
+                            [directory] if directory else None,
+                        )
+                    except Exception as e:
+                        fetched[key] = e
+                local = fetched[key]
+
+            template, kwargs = resolve_template(source, options, local)
+            result.append(cookiecutter(template, **kwargs))
 
     return result
+
+
+def fetch_with_cookiecutter(template: str, kwargs: dict, clone_dir: str) -> str:
+    """
+    Fetch a remote template that isn't fetched through the template cache (eg. a zip, or a
+    mercurial repository) into clone_dir the way cookiecutter would, without prompting.
+    Returns the local folder to generate it from.
+    """
+    from cookiecutter.config import get_user_config
+    from cookiecutter.repository import expand_abbreviations, is_zip_file
+    from cookiecutter.vcs import clone
+    from cookiecutter.zipfile import unzip
+
+    config = get_user_config(
+        config_file=kwargs.get("config_file"),
+        default_config=kwargs.get("default_config", False),
+    )
+    template = expand_abbreviations(template, config["abbreviations"])
+    if not is_zip_file(template):
+        return clone(template, kwargs.get("checkout"), clone_dir, no_input=True)
+
+    unzipped = unzip(
+        template, True, clone_dir, no_input=True, password=kwargs.get("password")
+    )
+    # unzipped into a temporary folder of its own, that cookiecutter would remove after
+    # generating, so it's moved next to the download (removed with the rest of the run's)
+    local = shutil.move(unzipped, tempfile.mkdtemp(dir=clone_dir))
+    shutil.rmtree(os.path.dirname(unzipped), ignore_errors=True)
+    return local
+
+
+def generate_prefetching(
+    sources,
+    template_cache: TemplateCache,
+    bytecode_cache: BytecodeCache,
+    render_jobs: int,
+    prefetch: int,
+    fail_fast: bool,
+    options: dict,
+) -> "list[str]":
+    """
+    Generate each of the sources in turn as they're read, while the next prefetch of them are
+    fetched (see pipeline.py). Remote git sources are fetched through template_cache (or,
+    without one, a cache that only lasts for the run), each repository once per checkout and
+    directory (unless it's needed again long after, see pipeline.FETCHED_MEMO_SIZE), and other
+    remote sources (eg. zips) the way cookiecutter would, when there's no input to prompt for.
+    """
+    # asyncio is only needed (and imported) when prefetching
+    from docker_cookiecutter.pipeline import generate_pipelined
+
+    def fetch_key(source):
+        if is_cacheable(source.template):
+            kwargs = cookiecutter_kwargs(source, options)
+            return (
+                normalize_template_uri(source.template),
+                kwargs.get("checkout"),
+                kwargs.get("directory"),
+            )
+        if options.get("no_input") and is_repo_url(source.template):
+            return (
+                source.template,
+                cookiecutter_kwargs(source, options).get("checkout"),
+            )
+        return None
+
+    def fetch(source):
+        kwargs = cookiecutter_kwargs(source, options)
+        if not is_cacheable(source.template):
+            return fetch_with_cookiecutter(
+                source.template, kwargs, tempfile.mkdtemp(dir=run_dir)
+            )
+        directory = kwargs.get("directory")
+        return template_cache.fetch(
+            source.template, kwargs.get("checkout"), [directory] if directory else None
+        )
+
+    def generate_source(source, local):
+        template, kwargs = resolve_template(source, options, local)
+        return cookiecutter(template, **kwargs)
+
+    with ExitStack() as stack:
+        run_dir = stack.enter_context(
+            tempfile.TemporaryDirectory(prefix=CONST.STAGING_PREFIX)
+        )
+        if template_cache is None:
+            template_cache = TemplateCache(os.path.join(run_dir, "cache"))
+        stack.enter_context(caching_bytecode(bytecode_cache))
+        stack.enter_context(rendering_concurrently(render_jobs))
+        result, failures = generate_pipelined(
+            sources, fetch_key, fetch, generate_source, prefetch, fail_fast
+        )
+
+    if failures:
+        raise CookiecuttersError(failures)
+    return result
+
+
+def clone_name(template: str) -> str:
+    """The folder name cookiecutter clones (or unzips) a remote template into."""
+    name = template.rstrip("/\\").replace("\\", "/").rsplit("/", 1)[-1]
+    name = name.rsplit(":", 1)[-1]
+    if name.endswith(".git"):
+        name = name[: -len(".git")]
+    return name
+
+
+def generate_staged(
+    sources,
+    fetched,
+    staging_dirs,
+    options: dict,
+    previous=None,
+    bytecode_cache=None,
+    render_jobs: int = 1,
+) -> "list":
+    """
+    Generate the sources in order (in a worker process, when concurrent), each into its own
+    staging folder. When incremental, previous holds each source's manifest records.
+    Templates are compiled through bytecode_cache, when given, and their files rendered
+    render_jobs at a time.
+
+    Returns:
+        (project folder or error, records or None) for each source
+    """
+    result = []
+    # incremental records each render in this process, so renders in threads there
+    rendering = rendering_concurrently(render_jobs, processes=previous is None)
+    with caching_bytecode(bytecode_cache), rendering:
+        for index, source in enumerate(sources):
+            staged_options = dict(
+                options,
+                output_dir=staging_dirs[index],
+                overwrite_if_exists=False,
+                skip_if_file_exists=False,
+            )
+            records = None
+            try:
+                template, kwargs = resolve_template(
+                    source, staged_options, fetched[index]
+                )
+                if previous is None:
+                    project = cookiecutter(template, **kwargs)
+                else:
+                    with skipping_unchanged_renders(
+                        previous[index],
+                        staging_dirs[index],
+                        options.get("output_dir") or ".",
+                    ) as records:
+                        project = cookiecutter(template, **kwargs)
+                result.append((project, records))
+            except Exception as e:
+                # not every cookiecutter exception survives pickling back to the parent
+                error = TemplateGenerationError("{}: {}".format(type(e).__name__, e))
+                result.append((error, None))
+    return result
+
+
+def generate_via_staging(
+    sources,
+    fetched,
+    jobs: int,
+    on_conflict: str,
+    incremental: bool,
+    bytecode_cache: BytecodeCache,
+    render_jobs: int,
+    options: dict,
+):
+    """
+    Generate every source into its own staging folder (concurrently when jobs > 1), then move
+    their output into the output folder in template order.
+    """
+    concurrent = jobs > 1 and len(sources) > 1
+    if concurrent and not options.get("no_input") and not options.get("replay"):
+        raise ValueError(
+            "generating templates concurrently requires no_input or replay"
+        )
+
+    output_dir = options.get("output_dir") or "."
+    os.makedirs(output_dir, exist_ok=True)
+
+    manifest = None
+    previous = None
+    if incremental:
+        manifest = Manifest(output_dir)
+        previous = [
+            manifest.templates.get(encode_template_sources([source]), {})
+            for source in sources
+        ]
+
+    staged = [None] * len(sources)
+    records = [None] * len(sources)
+    # Sources that cookiecutter would clone into the same folder have to be generated one
+    # after another within the same worker (already fetched ones render from their own folder)
+    groups = OrderedDict()
+    for index, source in enumerate(sources):
+        if isinstance(fetched[index], Exception):
+            staged[index] = fetched[index]
+        elif fetched[index] is not None:
+            groups[index] = [index]
+        else:
+            groups.setdefault(clone_name(source.template), []).append(index)
+
+    staging_dirs = [
+        tempfile.mkdtemp(prefix=CONST.STAGING_PREFIX, dir=output_dir) for _ in sources
+    ]
+    try:
+        group_args = [
+            (
+                indices,
+                (
+                    [sources[i] for i in indices],
+                    [fetched[i] for i in indices],
+                    [staging_dirs[i] for i in indices],
+                    options,
+                    None if previous is None else [previous[i] for i in indices],
+                    bytecode_cache,
+                    render_jobs,
+                ),
+            )
+            for indices in groups.values()
+        ]
+        if concurrent:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                futures = [
+                    (indices, executor.submit(generate_staged, *args))
+                    for indices, args in group_args
+                ]
+                group_results = [
+                    (indices, future.result()) for indices, future in futures
+                ]
+        else:
+            group_results = [
+                (indices, generate_staged(*args)) for indices, args in group_args
+            ]
+        for indices, group_result in group_results:
+            for index, (project_or_error, source_records) in zip(indices, group_result):
+                staged[index] = project_or_error
+                records[index] = source_records
+
+        result = []
+        failures = []
+        written = {}
+        counts = {"written": 0}
+        for index, source in enumerate(sources):
+            try:
+                if isinstance(staged[index], Exception):
+                    raise staged[index]
+                result.append(
+                    merge_staged(
+                        source.template,
+                        staging_dirs[index],
+                        staged[index],
+                        output_dir,
+                        on_conflict,
+                        options,
+                        written,
+                        counts if incremental else None,
+                    )
+                )
+                if incremental:
+                    manifest.update(
+                        encode_template_sources([source]), records[index], output_dir
+                    )
+            except Exception as e:
+                failures.append((source, e))
+    finally:
+        for staging_dir in staging_dirs:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+    if incremental:
+        manifest.save()
+        rendered = sum(
+            record["rendered"]
+            for source_records in records
+            if source_records is not None
+            for record in source_records.values()
+        )
+        skipped = sum(len(r) for r in records if r is not None) - rendered
+        logger.info(
+            "Incremental: %d files rendered, %d skipped, %d written",
+            rendered,
+            skipped,
+            counts["written"],
+        )
+
+    if failures:
+        raise CookiecuttersError(failures)
+
+    return result
+
+
+def merge_staged(
+    template: str,
+    staging_dir: str,
+    staged_project: str,
+    output_dir: str,
+    on_conflict: str,
+    options: dict,
+    written: dict,
+    counts: dict = None,
+) -> str:
+    """
+    Move a template's staged output, folders and symlinks included, into output_dir. Files
+    written by earlier templates in the run (tracked in written) are handled per on_conflict,
+    and files that were already there per the overwrite_if_exists / skip_if_file_exists
+    options. Nothing is moved if the template fails.
+
+    When counts is given (incremental), files identical to what is already there are left
+    alone, and the files actually written are counted in counts["written"].
+
+    Returns:
+        the project folder within output_dir
+    """
+    moves = []
+    folders = []
+    for root, dirs, files in os.walk(staging_dir):
+        # symlinks to folders aren't walked into, they're moved like files
+        links = [name for name in dirs if os.path.islink(os.path.join(root, name))]
+        # folders are merged into those already there, so empty ones aren't lost either
+        folders.extend(
+            os.path.relpath(os.path.join(root, name), staging_dir)
+            for name in dirs
+            if name not in links
+        )
+        for name in files + links:
+            source_path = os.path.join(root, name)
+            relative = os.path.relpath(source_path, staging_dir)
+            target = os.path.join(output_dir, relative)
+
+            if relative in written:
+                if on_conflict == CONST.ON_CONFLICT_SKIP:
+                    continue
+                if on_conflict == CONST.ON_CONFLICT_ERROR:
+                    raise OutputConflictError(
+                        "{} was already written by {}".format(
+                            relative, written[relative]
+                        )
+                    )
+            elif os.path.lexists(target):
+                if counts is not None and is_same_content(source_path, target):
+                    moves.append((None, target, relative))
+                    continue
+                if options.get("skip_if_file_exists"):
+                    continue
+                if not options.get("overwrite_if_exists"):
+                    raise OutputConflictError("{} already exists".format(target))
+
+            moves.append((source_path, target, relative))
+
+    for relative in folders:
+        os.makedirs(os.path.join(output_dir, relative), exist_ok=True)
+    for source_path, target, relative in moves:
+        if source_path is not None:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(source_path, target)
+            if counts is not None:
+                counts["written"] += 1
+        written[relative] = template
+
+    project = os.path.join(output_dir, os.path.relpath(staged_project, staging_dir))
+    os.makedirs(project, exist_ok=True)
+    return project
+
+
+def parse_extra_context(pairs: "list[str]") -> OrderedDict:
+    extra_context = OrderedDict()
+    for pair in pairs:
+        if "=" not in pair:
+            raise ValueError("extra context must be key=value, got: " + pair)
+        key, value = pair.split("=", 1)
+        extra_context[key] = value
+    return extra_context
+
+
+def prepare_option_parser():
+    parser = argparse.ArgumentParser(
+        prog="cookiecutters",
+        description="Generate a project from one or more ,,-delimited templates "
+        "(or @FILE, for those in a manifest file).",
+    )
+    parser.add_argument("templates")
+    parser.add_argument("extra_context", nargs="*", metavar="key=value")
+    parser.add_argument("--no-input", action="store_true")
+    parser.add_argument("--checkout", "-c")
+    parser.add_argument("--directory")
+    parser.add_argument("--verbose", "-v", action="store_true")
+    parser.add_argument("--replay", action="store_true")
+    parser.add_argument("--overwrite-if-exists", "-f", action="store_true")
+    parser.add_argument("--skip-if-file-exists", "-s", action="store_true")
+    parser.add_argument("--output-dir", "-o", default=".")
+    parser.add_argument("--config-file")
+    parser.add_argument("--default-config", action="store_true")
+    parser.add_argument("--debug-file")
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="number of templates to generate concurrently (requires --no-input)",
+    )
+    parser.add_argument(
+        "--render-jobs",
+        type=int,
+        default=1,
+        help="number of each template's files to render concurrently",
+    )
+    parser.add_argument(
+        "--prefetch",
+        type=int,
+        default=0,
+        metavar="N",
+        help="fetch up to N templates ahead of the one being generated",
+    )
+    parser.add_argument(
+        "--fail-fast",
+        action="store_true",
+        help="with --prefetch, stop at the first template that fails",
+    )
+    parser.add_argument(
+        "--on-conflict",
+        choices=CONST.ON_CONFLICT_CHOICES,
+        default=CONST.ON_CONFLICT_ERROR,
+        help="with --jobs, how to handle templates writing the same file",
+    )
+    parser.add_argument(
+        "--template-cache",
+        default=os.environ.get(CACHE_CONST.CACHE_ENV_VAR),
+        help="folder to cache remote templates in (default: $"
+        + CACHE_CONST.CACHE_ENV_VAR
+        + ")",
+    )
+    parser.add_argument(
+        "--no-revalidate",
+        action="store_true",
+        help="reuse cached templates without checking the remote for new commits",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only re-render changed template files, and only write changed output files",
+    )
+    parser.add_argument("--cache-max-mb", type=float)
+    parser.add_argument("--cache-max-age-days", type=float)
+    parser.add_argument(
+        "--no-bytecode-cache",
+        action="store_true",
+        help="don't keep the templates' compiled jinja bytecode in the template cache",
+    )
+    parser.add_argument(
+        "--bytecode-cache-max-mb",
+        type=float,
+        default=BYTECODE_CONST.DEFAULT_MAX_MB,
+        help="evict least recently used bytecode beyond this size (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--contexts",
+        metavar="FILE",
+        help="generate the template once per row of this CSV / JSONL file of contexts",
+    )
+    parser.add_argument(
+        "--contexts-format",
+        choices=("csv", "jsonl"),
+        help="with --contexts, the file's format (default: from its extension)",
+    )
+    parser.add_argument(
+        "--row-dir",
+        default="{index}",
+        metavar="PATTERN",
+        help="with --contexts, the folder each row is generated into within the output "
+        "folder, formatted with the row's values and its {index} (default: {index})",
+    )
+    return parser
+
+
+def bulk_main(ns, template_cache: TemplateCache, bytecode_cache: BytecodeCache) -> None:
+    from docker_cookiecutter.bulk import BulkGenerationError, bulk_cookiecutters
+    from docker_cookiecutter.bulk import logger as bulk_logger
+
+    bulk_logger.handlers = logger.handlers
+    bulk_logger.setLevel(logger.level)
+    if ns.replay:
+        raise ValueError("--contexts can't be used with --replay")
+    try:
+        bulk_cookiecutters(
+            ns.templates,
+            ns.contexts,
+            contexts_fmt=ns.contexts_format,
+            row_dir=ns.row_dir,
+            jobs=ns.jobs,
+            template_cache=template_cache,
+            bytecode_cache=bytecode_cache,
+            output_dir=ns.output_dir,
+            extra_context=parse_extra_context(ns.extra_context),
+            config_file=ns.config_file,
+            default_config=ns.default_config,
+            overwrite_if_exists=ns.overwrite_if_exists,
+            skip_if_file_exists=ns.skip_if_file_exists,
+            checkout=ns.checkout,
+            directory=ns.directory,
+            password=os.environ.get("COOKIECUTTER_REPO_PASSWORD"),
+        )
+    except BulkGenerationError as e:
+        # each failed row was already reported as it completed
+        sys.exit("{} rows failed".format(len(e.failures)))
+
+
+def main(argv=None):
+    ns = prepare_option_parser().parse_args(argv)
+    cookiecutter_logger = configure_logger(
+        stream_level="DEBUG" if ns.verbose else "INFO", debug_file=ns.debug_file
+    )
+    # report our own progress the same way cookiecutter reports its
+    logger.handlers = cookiecutter_logger.handlers
+    logger.setLevel(cookiecutter_logger.level)
+
+    max_age = (
+        None if ns.cache_max_age_days is None else ns.cache_max_age_days * 24 * 60 * 60
+    )
+    template_cache = None
+    bytecode_cache = None
+    if ns.template_cache:
+        template_cache = TemplateCache(
+            ns.template_cache,
+            max_bytes=None if ns.cache_max_mb is None else ns.cache_max_mb * 2**20,
+            max_age=max_age,
+            revalidate=not ns.no_revalidate,
+        )
+        if not ns.no_bytecode_cache:
+            bytecode_cache = BytecodeCache(
+                bytecode_dir(ns.template_cache),
+                max_bytes=ns.bytecode_cache_max_mb * 2**20,
+                max_age=max_age,
+            )
+
+    try:
+        if ns.contexts:
+            bulk_main(ns, template_cache, bytecode_cache)
+            return
+        cookiecutters(
+            ns.templates,
+            jobs=ns.jobs,
+            on_conflict=ns.on_conflict,
+            template_cache=template_cache,
+            incremental=ns.incremental,
+            bytecode_cache=bytecode_cache,
+            render_jobs=ns.render_jobs,
+            prefetch=ns.prefetch,
+            fail_fast=ns.fail_fast,
+            checkout=ns.checkout,
+            no_input=ns.no_input,
+            extra_context=parse_extra_context(ns.extra_context),
+            replay=ns.replay,
+            overwrite_if_exists=ns.overwrite_if_exists,
+            output_dir=ns.output_dir,
+            config_file=ns.config_file,
+            default_config=ns.default_config,
+            password=os.environ.get("COOKIECUTTER_REPO_PASSWORD"),
+            directory=ns.directory,
+            skip_if_file_exists=ns.skip_if_file_exists,
+        )
+    except (
+        CookiecuttersError,
+        CookiecutterException,
+        TemplateCacheError,
+        ValueError,
+    ) as e:
+        sys.exit(str(e))
+    finally:
+        if template_cache is not None:
+            template_cache.evict()
+            if ns.verbose:
+                print(
+                    "template cache: " + json.dumps(template_cache.stats()),
+                    file=sys.stderr,
+                )
+        if bytecode_cache is not None:
+            bytecode_cache.evict()
+            if ns.verbose:
+                print(
+                    "bytecode cache: " + json.dumps(bytecode_cache.stats()),
+                    file=sys.stderr,
+                )
+
+
+if __name__ == "__main__":
+    main()  # pragma: no cover
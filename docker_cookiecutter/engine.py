@@ -0,0 +1,358 @@
+"""Run suggested docker commandlines through the Docker Engine API instead of the docker CLI.
+
+Every container is created, started, waited on and removed over HTTP on the engine's local
+Unix socket, reusing a pool of keep-alive connections, so that a bulk run pays neither a docker
+CLI process nor a fresh connection per project. Only the docker run options that suggest
+produces (plus a few common ones, see container_config) are understood.
+"""
+
+import http.client
+import json
+import os
+import queue
+import socket
+import sys
+import time
+from collections import deque
+from contextlib import contextmanager
+from urllib.parse import quote, urlencode
+
+from docker_cookiecutter.batch import CONST as BATCH_CONST
+from docker_cookiecutter.batch import parse_record, read_records
+
+
+# Work around python's lack of consts
+class CONST(object):
+    __slots__ = ()
+    DOCKER_HOST_ENV_VAR = "DOCKER_HOST"
+    DEFAULT_SOCKET = "/var/run/docker.sock"
+    # docker run options that don't apply to a container run through the API
+    IGNORED_OPTIONS = ("-i", "-t", "-it", "-ti", "--interactive", "--tty", "--rm")
+    # docker run options taking a value, and the container_config field they go to
+    VALUE_OPTIONS = {
+        "--user": "User",
+        "-u": "User",
+        "--env": "Env",
+        "-e": "Env",
+        "--workdir": "WorkingDir",
+        "-w": "WorkingDir",
+        "--volume": "Binds",
+        "-v": "Binds",
+        "--mount": "Mounts",
+    }
+    # header of each frame of a non-tty container's multiplexed log stream
+    LOG_FRAME_HEADER_SIZE = 8
+    # commandlines read ahead of the one whose result is reported next, per job
+    RECORDS_IN_FLIGHT_PER_JOB = 2
+
+
+CONST = CONST()
+
+
+class EngineError(Exception):
+    """The Docker Engine API refused a request, or a commandline can't be run through it."""
+
+
+def default_socket_path() -> str:
+    docker_host = os.environ.get(CONST.DOCKER_HOST_ENV_VAR)
+    if not docker_host:
+        return CONST.DEFAULT_SOCKET
+    if not docker_host.startswith("unix://"):
+        raise EngineError("only unix:// docker hosts are supported, not " + docker_host)
+    return docker_host[len("unix://") :]
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """An HTTP/1.1 (keep-alive) connection over a Unix socket."""
+
+    def __init__(self, socket_path: str, timeout: float = None) -> None:
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class EngineClient:
+    """
+    Requests to the Docker Engine API, over a pool of connections that grows to however many
+    threads use it at once, and that are kept open between requests.
+    """
+
+    def __init__(self, socket_path: str = None, timeout: float = None) -> None:
+        self.socket_path = socket_path or default_socket_path()
+        self.timeout = timeout
+        self.idle = queue.LifoQueue()
+        self.connections_opened = 0
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self.idle.get_nowait()
+        except queue.Empty:
+            conn = UnixHTTPConnection(self.socket_path, self.timeout)
+            self.connections_opened += 1
+        try:
+            yield conn
+        except BaseException:
+            conn.close()
+            raise
+        self.idle.put(conn)
+
+    def request(self, method: str, path: str, body: dict = None) -> bytes:
+        """
+        Returns:
+            the response body
+
+        Raises:
+            EngineError: if the engine answers with an error status
+        """
+        headers = {}
+        encoded = None
+        if body is not None:
+            encoded = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+
+        with self.connection() as conn:
+            reused = conn.sock is not None
+            try:
+                conn.request(method, path, encoded, headers)
+                response = conn.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionError):
+                # the engine may close a keep-alive connection while it sits idle
+                conn.close()
+                if not reused:
+                    raise
+                conn.request(method, path, encoded, headers)
+                response = conn.getresponse()
+            data = response.read()
+
+        if response.status >= 400:
+            try:
+                message = json.loads(data)["message"]
+            except (ValueError, KeyError, TypeError):
+                message = data.decode(errors="replace")
+            raise EngineError(
+                "{} {}: {} {}".format(method, path, response.status, message)
+            )
+        return data
+
+    def close(self) -> None:
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def parse_mount(spec: str) -> dict:
+    """The API form of a --mount type=...,source=...,target=... spec."""
+    fields = dict(
+        field.split("=", 1) if "=" in field else (field, "true")
+        for field in spec.split(",")
+    )
+    mount = {
+        "Type": fields.get("type", "volume"),
+        "Source": fields.get("source", fields.get("src")),
+        "Target": fields.get("target", fields.get("destination", fields.get("dst"))),
+    }
+    if fields.get("readonly", fields.get("ro", "false")) in ("true", "1"):
+        mount["ReadOnly"] = True
+    return mount
+
+
+def container_config(argv: "list[str]") -> dict:
+    """
+    The create-container request equivalent to a docker run argv (see
+    cookiecutter_to_docker_args(..., argv=True)).
+
+    Raises:
+        EngineError: for arguments that aren't a docker run, or options that aren't understood
+    """
+    if argv[:2] != ["docker", "run"]:
+        raise EngineError("not a docker run commandline: " + " ".join(argv[:2]))
+
+    config = {"Tty": False, "OpenStdin": False, "Env": []}
+    host_config = {"Binds": [], "Mounts": []}
+
+    index = 2
+    while index < len(argv) and argv[index].startswith("-"):
+        option, _, value = argv[index].partition("=")
+        if option in CONST.IGNORED_OPTIONS:
+            index += 1
+            continue
+        field = CONST.VALUE_OPTIONS.get(option)
+        if field is None:
+            raise EngineError("unsupported docker run option: " + option)
+        if not value:
+            index += 1
+            if index == len(argv):
+                raise EngineError("missing value for " + option)
+            value = argv[index]
+        index += 1
+
+        if field == "Mounts":
+            host_config["Mounts"].append(parse_mount(value))
+        elif field == "Binds":
+            host_config["Binds"].append(value)
+        elif field == "Env":
+            config["Env"].append(value)
+        else:
+            config[field] = value
+
+    if index == len(argv):
+        raise EngineError("missing image")
+    config["Image"] = argv[index]
+    config["Cmd"] = argv[index + 1 :]
+    config["HostConfig"] = host_config
+    return config
+
+
+def demultiplex(data: bytes) -> bytes:
+    """The content of a non-tty container's log stream, stdout and stderr interleaved."""
+    content = []
+    index = 0
+    while index + CONST.LOG_FRAME_HEADER_SIZE <= len(data):
+        size = int.from_bytes(data[index + 4 : index + 8], "big")
+        start = index + CONST.LOG_FRAME_HEADER_SIZE
+        content.append(data[start : start + size])
+        index = start + size
+    return b"".join(content)
+
+
+def pull_image(client: EngineClient, image: str) -> None:
+    name, tag = image, "latest"
+    if "@" not in image and ":" in image.rsplit("/", 1)[-1]:
+        name, tag = image.rsplit(":", 1)
+    # the progress is streamed until the pull completes
+    client.request(
+        "POST", "/images/create?" + urlencode({"fromImage": name, "tag": tag})
+    )
+
+
+def create_container(client: EngineClient, config: dict) -> str:
+    try:
+        data = client.request("POST", "/containers/create", config)
+    except EngineError as e:
+        # the docker CLI pulls missing images, so do the same
+        if "No such image" not in str(e):
+            raise
+        pull_image(client, config["Image"])
+        data = client.request("POST", "/containers/create", config)
+    return json.loads(data)["Id"]
+
+
+def run_container(client: EngineClient, argv: "list[str]"):
+    """
+    Run the docker run argv to completion, then remove its container.
+
+    Returns:
+        (exit status, the container's output if it failed, otherwise b"")
+    """
+    container = "/containers/" + quote(create_container(client, container_config(argv)))
+    try:
+        client.request("POST", container + "/start")
+        status = json.loads(client.request("POST", container + "/wait"))
+        exit_code = status.get("StatusCode", 1)
+        output = b""
+        if exit_code != 0:
+            output = demultiplex(
+                client.request("GET", container + "/logs?stdout=1&stderr=1")
+            )
+    except BaseException:
+        # what went wrong running it is what's reported, not a failure to remove it as well
+        try:
+            client.request("DELETE", container + "?force=1")
+        except Exception:
+            pass
+        raise
+    client.request("DELETE", container + "?force=1")
+    return exit_code, output
+
+
+def projects_per_minute(projects: int, seconds: float) -> float:
+    return projects * 60 / seconds if seconds > 0 else 0.0
+
+
+def run_batch(
+    in_stream=None,
+    err_stream=None,
+    fmt: str = BATCH_CONST.FORMAT_LINES,
+    jobs: int = 1,
+    socket_path: str = None,
+    **suggest_options
+) -> int:
+    """
+    Run one container, through the Docker Engine API, per commandline read from in_stream
+    (in the same formats as suggest_batch), jobs at a time. Failures (and the output of failed
+    containers) are reported on err_stream, followed by the throughput of the whole batch.
+
+    Returns:
+        0 if every container ran successfully, otherwise 1
+    """
+    # deferred with the other suggest imports, see cli.run_suggest
+    from concurrent.futures import ThreadPoolExecutor
+
+    from docker_cookiecutter.suggest import cookiecutter_to_docker_args
+
+    in_stream = in_stream or sys.stdin
+    err_stream = err_stream or sys.stderr
+    delimiter = "\0" if fmt == BATCH_CONST.FORMAT_NULL else "\n"
+    cwd = os.getcwd()
+
+    def run_record(client: EngineClient, record: str):
+        try:
+            argv = cookiecutter_to_docker_args(
+                parse_record(record, fmt), argv=True, cwd=cwd, **suggest_options
+            )
+            return run_container(client, argv)
+        except (Exception, SystemExit) as e:
+            # argparse reports bad option values with SystemExit; that must not end the batch
+            return None, repr(e).encode()
+
+    start = time.perf_counter()
+    generated = 0
+    exit_code = 0
+    with EngineClient(socket_path) as client, ThreadPoolExecutor(jobs) as executor:
+
+        def results():
+            # in order, reading only a few records ahead rather than the whole batch up front
+            pending = deque()
+            for record in read_records(in_stream, delimiter):
+                pending.append(executor.submit(run_record, client, record))
+                if len(pending) > jobs * CONST.RECORDS_IN_FLIGHT_PER_JOB:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+        for record_number, (status, output) in enumerate(results(), 1):
+            if status == 0:
+                generated += 1
+                continue
+            exit_code = 1
+            output = output.decode(errors="replace")
+            err_stream.write(
+                "record {}: {}\n{}".format(
+                    record_number,
+                    "failed" if status is None else "exited with " + str(status),
+                    output if not output or output.endswith("\n") else output + "\n",
+                )
+            )
+    seconds = time.perf_counter() - start
+
+    err_stream.write(
+        "Generated {} projects in {:.1f}s ({:.1f} projects/minute)\n".format(
+            generated, seconds, projects_per_minute(generated, seconds)
+        )
+    )
+    err_stream.flush()
+    return exit_code
@@ -0,0 +1,146 @@
+"""Incremental regeneration of templates over an existing output folder.
+
+A manifest in the output folder records, for every file each template generated, the hash of
+the template file and of the context it was rendered with, and the hash of the output that was
+written. Re-running the template then skips rendering the files whose template file and context
+are unchanged (as long as the output is still as it was written), and skips writing the files
+that render to exactly what is already on disk, so their mtimes are left alone.
+"""
+
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+
+from docker_cookiecutter.cache import write_json_atomic
+
+
+# Work around python's lack of consts
+class CONST(object):
+    __slots__ = ()
+    MANIFEST_FILE = ".cookiecutters-manifest.json"
+    # context entries that vary with where the template was fetched to, not with its output
+    VOLATILE_CONTEXT_KEYS = ("_template", "_output_dir", "_repo_dir", "_checkout")
+
+
+CONST = CONST()
+
+
+def file_hash(path: str):
+    """The sha256 of the file's content, or None if it can't be read."""
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def context_hash(context: dict) -> str:
+    values = {
+        k: v
+        for k, v in context.get("cookiecutter", {}).items()
+        if k not in CONST.VOLATILE_CONTEXT_KEYS
+    }
+    encoded = json.dumps(values, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+class Manifest:
+    """
+    What each template last generated into an output folder.
+
+    templates - {template: {template file: record}}, where a record is a dict of the template
+        file's hash ("template"), the context's hash ("context"), the output file relative to
+        the output folder ("output") and the hash of what was written there ("output_hash")
+    """
+
+    def __init__(self, output_dir: str) -> None:
+        self.path = os.path.join(output_dir, CONST.MANIFEST_FILE)
+        try:
+            with open(self.path) as f:
+                self.templates = json.load(f)
+        except (OSError, ValueError):
+            self.templates = {}
+
+    def update(self, template: str, records: dict, output_dir: str) -> None:
+        """Record what template generated, once its output is in output_dir."""
+        self.templates[template] = {
+            infile: {
+                "template": record["template"],
+                "context": record["context"],
+                "output": record["output"],
+                "output_hash": (
+                    file_hash(os.path.join(output_dir, record["output"]))
+                    if record["rendered"]
+                    else record["output_hash"]
+                ),
+            }
+            for infile, record in records.items()
+        }
+
+    def save(self) -> None:
+        write_json_atomic(self.path, self.templates)
+
+
+def is_unchanged(previous: dict, record: dict, output_dir: str) -> bool:
+    if previous is None or previous.get("output_hash") is None:
+        return False
+    if any(previous.get(k) != v for k, v in record.items()):
+        return False
+    return previous["output_hash"] == file_hash(
+        os.path.join(output_dir, record["output"])
+    )
+
+
+@contextmanager
+def skipping_unchanged_renders(previous: dict, staging_dir: str, output_dir: str):
+    """
+    While active, cookiecutter (generating into staging_dir, bound for output_dir) doesn't
+    render the template files that are unchanged since the previous records.
+
+    Yields:
+        {template file: record} for every template file, with "rendered" telling whether it
+        was rendered or skipped
+    """
+    # deferred with the rest of cookiecutter, see cookiecutters.cookiecutter
+    import cookiecutter.generate
+
+    records = {}
+    generate_file = cookiecutter.generate.generate_file
+
+    def generate_file_unless_unchanged(
+        project_dir, infile, context, env, skip_if_file_exists=False
+    ):
+        # cookiecutter runs this from within the template folder, so infile can be read
+        outfile = os.path.join(project_dir, env.from_string(infile).render(**context))
+        record = {
+            "template": file_hash(infile),
+            "context": context_hash(context),
+            "output": os.path.relpath(outfile, staging_dir),
+        }
+        previous_record = previous.get(infile)
+        if is_unchanged(previous_record, record, output_dir):
+            records[infile] = dict(previous_record, rendered=False)
+            return
+
+        generate_file(project_dir, infile, context, env, skip_if_file_exists)
+        records[infile] = dict(record, rendered=True)
+
+    cookiecutter.generate.generate_file = generate_file_unless_unchanged
+    try:
+        yield records
+    finally:
+        cookiecutter.generate.generate_file = generate_file
+
+
+def is_same_content(path: str, other_path: str) -> bool:
+    if os.path.islink(path) or os.path.islink(other_path):
+        return (
+            os.path.islink(path)
+            and os.path.islink(other_path)
+            and os.readlink(path) == os.readlink(other_path)
+        )
+    if os.path.getsize(path) != os.path.getsize(other_path):
+        return False
+    with open(path, "rb") as f, open(other_path, "rb") as other:
+        return f.read() == other.read()
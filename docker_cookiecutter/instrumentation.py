@@ -0,0 +1,192 @@
+"""Opt-in per-stage wall times and counters for suggest.
+
+Nothing is recorded unless a Recorder is active (see recording, and --timings on the CLI) or a
+hook is registered (see add_hook). While disabled, each instrumented call site costs a global
+lookup and a comparison with None. Recording is per thread, so that concurrent suggestions (eg.
+in the server's request threads) each record into their own Recorder: while any thread is
+recording, active forwards to the calling thread's Recorder, if it has one.
+
+Stages may nest (eg. reduce_mounts runs within build_path_map), and a stage that runs more than
+once accumulates its time. Counters that come in "<name>.hits" / "<name>.lookups" pairs are
+also reported as "<name>.hit_rate".
+"""
+
+import functools
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# CURRENT_THREAD while any thread is recording, or None when instrumentation is off
+active = None
+
+# The Recorder each thread is recording into (its "recorder", None when it isn't)
+local = threading.local()
+
+# How many recording() blocks are active, across threads
+recordings = 0
+recordings_lock = threading.Lock()
+
+# Callables given (name, report) after each instrumented call, see add_hook
+hooks = []
+
+
+class Recorder:
+    """Accumulates stage wall times (seconds) and counters."""
+
+    def __init__(self) -> None:
+        self.timings = OrderedDict()
+        self.counters = OrderedDict()
+
+    def add_time(self, stage: str, seconds: float) -> None:
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def report(self) -> dict:
+        """The timings (in milliseconds) and counters, ready to be dumped as JSON."""
+        counters = OrderedDict(self.counters)
+        for name, lookups in self.counters.items():
+            if name.endswith(".lookups") and lookups > 0:
+                prefix = name[: -len(".lookups")]
+                counters[prefix + ".hit_rate"] = (
+                    self.counters.get(prefix + ".hits", 0) / lookups
+                )
+        return {
+            "timings_ms": OrderedDict(
+                (stage, seconds * 1000) for stage, seconds in self.timings.items()
+            ),
+            "counters": counters,
+        }
+
+
+def current():
+    """The Recorder the calling thread is recording into, or None."""
+    return getattr(local, "recorder", None)
+
+
+class CurrentThreadRecorder:
+    """Forwards to the calling thread's Recorder, if it's recording."""
+
+    __slots__ = ()
+
+    def add_time(self, stage: str, seconds: float) -> None:
+        recorder = current()
+        if recorder is not None:
+            recorder.add_time(stage, seconds)
+
+    def count(self, name: str, n: int = 1) -> None:
+        recorder = current()
+        if recorder is not None:
+            recorder.count(name, n)
+
+
+CURRENT_THREAD = CurrentThreadRecorder()
+
+
+class Stage:
+    """Context manager adding its wall time to a recorder's stage."""
+
+    __slots__ = ("recorder", "name", "start")
+
+    def __init__(self, recorder: Recorder, name: str) -> None:
+        self.recorder = recorder
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.recorder.add_time(self.name, time.perf_counter() - self.start)
+
+
+class NullStage:
+    """The stage handed out while instrumentation is off."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+NULL_STAGE = NullStage()
+
+
+def stage(name: str):
+    """Context manager timing the enclosed block as the named stage, if recording."""
+    if active is None:
+        return NULL_STAGE
+    recorder = current()
+    if recorder is None:
+        return NULL_STAGE
+    return Stage(recorder, name)
+
+
+def count(name: str, n: int = 1) -> None:
+    """Add n to the named counter, if recording."""
+    if active is not None:
+        active.count(name, n)
+
+
+@contextmanager
+def recording(recorder: Recorder = None):
+    """
+    Context manager recording everything instrumented within it (in the calling thread) into
+    recorder (a new Recorder by default), which it yields.
+    """
+    global active, recordings
+    previous = current()
+    local.recorder = recorder or Recorder()
+    with recordings_lock:
+        recordings += 1
+        active = CURRENT_THREAD
+    try:
+        yield local.recorder
+    finally:
+        local.recorder = previous
+        with recordings_lock:
+            recordings -= 1
+            if recordings == 0:
+                active = None
+
+
+def add_hook(hook) -> None:
+    """
+    Call hook(name, report) after every call of an instrumented function (eg.
+    cookiecutter_to_docker_args), with the report (see Recorder.report) of that call, or of
+    everything recorded so far if a Recorder was already active.
+    """
+    hooks.append(hook)
+
+
+def remove_hook(hook) -> None:
+    hooks.remove(hook)
+
+
+def instrumented(name: str):
+    """Decorator timing each call of the function as the named stage, and calling the hooks."""
+
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if active is None and not hooks:
+                return fn(*args, **kwargs)
+
+            with recording(current()) as recorder:
+                recorder.count(name + ".calls")
+                with Stage(recorder, name):
+                    result = fn(*args, **kwargs)
+
+            report = recorder.report()
+            for hook in list(hooks):
+                hook(name, report)
+            return result
+
+        return wrapper
+
+    return decorate
@@ -0,0 +1,157 @@
+"""On-disk memo of suggestions, for scripts that ask for the same ones over and over.
+
+Each suggestion is kept in a small file of its own, named for a hash of everything it depends
+on: the commandline, the suggest options (container folders, mount budget, ...), the current
+folder, the user, the package version, and the size and mtime of any @FILE template manifest.
+So a memo hit is a stat and a single file read, without importing the suggest machinery at all,
+let alone parsing or path mapping, and anything that would change the suggestion (a new version
+or an edited manifest included) simply misses. Files are written atomically. Rather than
+listing the folder on every miss, one put in evict_every (picked by its key) evicts the least
+recently used entries beyond max_entries, so the memo may run over by a few entries meanwhile.
+"""
+
+import hashlib
+import json
+import os
+import zlib
+
+from docker_cookiecutter import __version__, instrumentation
+from docker_cookiecutter.templates import CONST as TEMPLATES_CONST
+
+
+# Work around python's lack of consts
+class CONST(object):
+    __slots__ = ()
+    DIR_ENV = "DOCKER_COOKIECUTTER_SUGGEST_CACHE"
+    DIR_NAME = os.path.join("docker_cookiecutter", "suggest")
+    SUFFIX = ".json"
+    DEFAULT_MAX_ENTRIES = 1000
+    DEFAULT_EVICT_EVERY = 32
+
+
+CONST = CONST()
+
+
+def default_memo_dir() -> str:
+    """$DOCKER_COOKIECUTTER_SUGGEST_CACHE, or a folder in the user's cache folder."""
+    memo_dir = os.environ.get(CONST.DIR_ENV)
+    if memo_dir:
+        return memo_dir
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(cache_home, CONST.DIR_NAME)
+
+
+def manifest_stats(args: "list[str]") -> list:
+    """
+    (size, mtime) of each template manifest in args, or None where there's no such file, as
+    the suggestion depends on what the manifest holds.
+    """
+    stats = []
+    for arg in args:
+        if arg.startswith(TEMPLATES_CONST.MANIFEST_PREFIX):
+            try:
+                stat = os.stat(arg[len(TEMPLATES_CONST.MANIFEST_PREFIX) :])
+            except OSError:
+                stats.append(None)
+            else:
+                stats.append([stat.st_size, stat.st_mtime_ns])
+    return stats
+
+
+def memo_key(args: "list[str]", options: dict) -> str:
+    """Hash identifying the suggestion for args (with options), here and now."""
+    user = "{}:{}".format(os.getuid(), os.getgid()) if hasattr(os, "getuid") else ""
+    identity = [
+        __version__,
+        args,
+        sorted(options.items()),
+        os.getcwd(),
+        user,
+        manifest_stats(args),
+    ]
+    return hashlib.sha256(json.dumps(identity).encode()).hexdigest()
+
+
+class SuggestMemo:
+    """Memo of cookiecutter_to_docker_args results, in a folder (see default_memo_dir)."""
+
+    def __init__(
+        self,
+        root: str = None,
+        max_entries: int = CONST.DEFAULT_MAX_ENTRIES,
+        evict_every: int = CONST.DEFAULT_EVICT_EVERY,
+    ) -> None:
+        self.root = root or default_memo_dir()
+        self.max_entries = max_entries
+        self.evict_every = evict_every
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key + CONST.SUFFIX)
+
+    def get(self, key: str):
+        """The memoized suggestion, or None."""
+        try:
+            with open(self.path(key)) as f:
+                result = json.load(f)
+            # the mtime tracks when the entry was last used, for eviction
+            os.utime(self.path(key))
+        except (OSError, ValueError):
+            result = None
+
+        if instrumentation.active is not None:
+            instrumentation.active.count("suggest_memo.lookups")
+            if result is not None:
+                instrumentation.active.count("suggest_memo.hits")
+        return result
+
+    def put(self, key: str, result: "list[str]") -> None:
+        tmp_path = "{}.{}.tmp".format(self.path(key), os.getpid())
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            with open(tmp_path, "w") as f:
+                json.dump(result, f)
+            os.replace(tmp_path, self.path(key))
+            if zlib.crc32(key.encode()) % self.evict_every == 0:
+                self.evict()
+        except OSError:
+            # a memo that can't be written to only costs the suggestion next time
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def entries(self):
+        """(last used, path) of each entry."""
+        result = []
+        for name in os.listdir(self.root):
+            if name.endswith(CONST.SUFFIX):
+                path = os.path.join(self.root, name)
+                try:
+                    result.append((os.stat(path).st_mtime, path))
+                except OSError:
+                    continue
+        return result
+
+    def evict(self) -> int:
+        """Remove the least recently used entries beyond max_entries, returning how many."""
+        entries = self.entries()
+        evicted = 0
+        for _, path in sorted(entries)[: max(0, len(entries) - self.max_entries)]:
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            evicted += 1
+        return evicted
+
+    def suggest(self, args: "list[str]", **options) -> "list[str]":
+        """cookiecutter_to_docker_args(args, **options), from the memo when it's there."""
+        key = memo_key(args, options)
+        result = self.get(key)
+        if result is None:
+            # only imported when needed, so that a memo hit imports next to nothing
+            from docker_cookiecutter.suggest import cookiecutter_to_docker_args
+
+            result = cookiecutter_to_docker_args(args, **options)
+            self.put(key, result)
+        return result
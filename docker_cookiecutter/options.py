@@ -0,0 +1,127 @@
+"""Precompiled option parsing for the hot path of suggest."""
+
+import argparse
+
+
+class CompiledOptionParser:
+    """
+    Precompiled equivalent of an argparse parser made of flag / single-value options and a
+    trailing REMAINDER positional, which is all that suggest needs.
+
+    The common shapes of commandline (exact or abbreviated long options, --option=value, short
+    options and clusters of them, then the remainder) are handled directly. Anything else
+    (unknown or ambiguous options, "--", help, values that look like options, ...) is handed to
+    the argparse parser from fallback_factory, so results always match argparse exactly.
+    """
+
+    def __init__(self, options, remainder_dest: str, fallback_factory) -> None:
+        """
+        Args:
+            options: sequence of (option_strings, takes_value) with the long option first, as
+                they would be given to ArgumentParser.add_argument (flags are store_true)
+            remainder_dest: the dest of the REMAINDER positional
+            fallback_factory: returns the equivalent argparse.ArgumentParser
+        """
+        self.remainder_dest = remainder_dest
+        self.fallback_factory = fallback_factory
+        self.fallback = None
+        self.defaults = {}
+        self.options = {}
+
+        for option_strings, takes_value in options:
+            dest = option_strings[0].lstrip("-").replace("-", "_")
+            self.defaults[dest] = None if takes_value else False
+            for option_string in option_strings:
+                self.options[option_string] = (dest, takes_value)
+
+        # argparse accepts any unambiguous prefix of a long option ("--help" included, which
+        # maps to None so that it gets handed to argparse)
+        long_options = [s for s in self.options if s.startswith("--")] + ["--help"]
+        prefix_matches = {}
+        for long_option in long_options:
+            for end in range(3, len(long_option) + 1):
+                prefix_matches.setdefault(long_option[:end], []).append(long_option)
+        self.long_options = {
+            prefix: self.options.get(matches[0]) if len(matches) == 1 else None
+            for prefix, matches in prefix_matches.items()
+        }
+        self.ambiguous_prefixes = {
+            prefix for prefix, matches in prefix_matches.items() if len(matches) > 1
+        }
+        self.long_options.update(
+            {s: option for s, option in self.options.items() if s.startswith("--")}
+        )
+
+    def parse_known_args(self, args: "list[str]"):
+        """Same as argparse.ArgumentParser.parse_known_args for this parser's options."""
+        parsed = self.parse_fast(args)
+        if parsed is not None:
+            return parsed, []
+
+        if self.fallback is None:
+            self.fallback = self.fallback_factory()
+        return self.fallback.parse_known_args(args)
+
+    def parse_fast(self, args: "list[str]"):
+        """Returns the parsed namespace, or None if args need the full argparse treatment."""
+        values = dict(self.defaults)
+        index = 0
+        count = len(args)
+
+        while index < count:
+            arg = args[index]
+            if len(arg) < 2 or arg[0] != "-":
+                # first positional, everything from here on is the remainder
+                break
+
+            if arg[1] == "-":
+                name, sep, value = arg.partition("=")
+                option = self.options.get(name) if sep else self.long_options.get(name)
+                if option is None:
+                    return None
+                dest, takes_value = option
+                if not takes_value:
+                    if sep:
+                        return None
+                    value = True
+                elif not sep:
+                    index += 1
+                    if index >= count or args[index].startswith("-"):
+                        return None
+                    value = args[index]
+                values[dest] = value
+            else:
+                if "=" in arg or " " in arg:
+                    return None
+                # a cluster of short options, where the first one taking a value swallows
+                # the rest of the cluster (or the next arg) as its value
+                for pos in range(1, len(arg)):
+                    option = self.options.get("-" + arg[pos])
+                    if option is None:
+                        return None
+                    dest, takes_value = option
+                    if not takes_value:
+                        values[dest] = True
+                        continue
+                    value = arg[pos + 1 :]
+                    if len(value) == 0:
+                        index += 1
+                        if index >= count or args[index].startswith("-"):
+                            return None
+                        value = args[index]
+                    values[dest] = value
+                    break
+
+            index += 1
+
+        remainder = args[index:]
+        for arg in remainder:
+            # argparse classifies every arg up front, and rejects ambiguous abbreviations
+            # even within the remainder
+            if arg.startswith("--") and (
+                arg == "--" or arg.partition("=")[0] in self.ambiguous_prefixes
+            ):
+                return None
+        values[self.remainder_dest] = remainder
+
+        return argparse.Namespace(**values)
@@ -2,11 +2,21 @@ import ntpath
 import os
 import posixpath
 import re
+import sys
+from array import array
 from typing import Tuple
 
+from docker_cookiecutter import instrumentation
+
 # Regex for finding separators
 UNKNOWN_SEP_CHARS_REGEX = re.compile(r"[/\\]+")
 
+# Coalesced mounts are never above this many folders below their root (or relative base)
+DEFAULT_MIN_MOUNT_DEPTH = 1
+
+# PathMap.get_container_path remembers the container paths of up to this many host paths
+LOOKUP_MEMO_SIZE = 4096
+
 
 class PathMap:
     """
@@ -19,6 +29,9 @@ class PathMap:
         container_abs: str = "/h/abs",
         container_rel: str = "/h/rel",
         container_rel_dd: str = "dd",
+        max_mounts: int = None,
+        min_mount_depth: int = DEFAULT_MIN_MOUNT_DEPTH,
+        existing_mounts: dict = None,
     ) -> None:
         """
         Args:
@@ -27,10 +40,30 @@ class PathMap:
             container_rel: the container folder under which relative host paths will be mapped
             container_rel_dd: a folder name to use to stand in for ".." which will force
                 additional levels of sub-folders to be included under container_rel
+            max_mounts: if given, coalesce mounts into common ancestors (see coalesce_mounts)
+                to need no more than this many
+            min_mount_depth: the shallowest a coalesced mount may be
+            existing_mounts: {host path: container path} of mounts made regardless (eg. by the
+                user), which host paths beneath them are mapped through instead of a new mount
         """
-        normalized_host_paths = [normalize_path(host_path) for host_path in host_paths]
-        self.mounts, self.mappings = PathMap.__map_host_to_container(
-            normalized_host_paths, container_abs, container_rel, container_rel_dd
+        host_paths = list(host_paths)
+        existing_mounts = existing_mounts or {}
+        normalized = normalize_paths(host_paths + list(existing_mounts))
+        normalized_host_paths = [normalized[host_path] for host_path in host_paths]
+        existing_mounts = {
+            normalized[host_path]: container_path
+            for host_path, container_path in existing_mounts.items()
+        }
+        # {host path: container path} of get_container_path's lookups, until it's full
+        self.lookups = {}
+        self.mounts, self.mappings, self.mount_trie = PathMap.__map_host_to_container(
+            normalized_host_paths,
+            container_abs,
+            container_rel,
+            container_rel_dd,
+            max_mounts,
+            min_mount_depth,
+            existing_mounts,
         )
 
     def get_mounts(self) -> "list[str]":
@@ -42,26 +75,75 @@ class PathMap:
 
     def get_container_path(self, host_path: str) -> str:
         """
-        Return the already-mapped container_path for the specified host_path.
+        Return the container_path for the specified host_path. This is either one of the
+        host paths used to construct this PathMap, or any path beneath one of its mounts.
+
+        Raises:
+            KeyError: if the host_path is not reachable through any of the mounts
         """
+        container_path = self.lookups.get(host_path)
+        if container_path is not None:
+            return container_path
+
         normalized_host_path = normalize_path(host_path)
-        return self.mappings[normalized_host_path]
+        container_path = self.mappings.get(normalized_host_path)
+        if container_path is None:
+            found = self.mount_trie.find_longest_prefix(normalized_host_path)
+            if found is None:
+                raise KeyError(host_path)
+            mount_container_path, remaining = found
+            container_path = posixpath.join(mount_container_path, *remaining)
+
+        if len(self.lookups) >= LOOKUP_MEMO_SIZE:
+            # start over rather than track what was used least recently, which costs more than
+            # the lookups it would save
+            self.lookups.clear()
+        self.lookups[host_path] = container_path
+        return container_path
 
     @staticmethod
     def __map_host_to_container(
-        host_paths, container_abs, container_rel, container_rel_dd
+        host_paths,
+        container_abs,
+        container_rel,
+        container_rel_dd,
+        max_mounts,
+        min_mount_depth,
+        existing_mounts,
     ):
         """
-        Takes a set of host paths, and computes the list of host paths needing mounting, and
-        a mapping of all related host_paths (those explicitly provided, and those needing mounting)
-        to container paths.
+        Takes a set of host paths, and computes the list of host paths needing mounting, a
+        mapping of all related host_paths (those explicitly provided, and those needing mounting)
+        to container paths, and a trie of the mounts for looking up paths beneath them. The host
+        paths (and existing mounts) are already normalized.
         """
-        min_mounts = reduce_mounts(host_paths)
+        mount_trie = PathTrie()
         map_host_to_container_paths = {}
+        if existing_mounts:
+            for host_path, container_path in existing_mounts.items():
+                mount_trie.insert(host_path, container_path)
+            unmounted = []
+            for path in host_paths:
+                found = mount_trie.find_longest_prefix(path)
+                if found is None:
+                    unmounted.append(path)
+                else:
+                    mount_container_path, remaining = found
+                    map_host_to_container_paths[path] = posixpath.join(
+                        mount_container_path, *remaining
+                    )
+            host_paths = unmounted
+
+        with instrumentation.stage("reduce_mounts"):
+            min_mounts = reduce_mounts(host_paths, normalized=True)
+            if max_mounts is not None:
+                min_mounts = coalesce_mounts(min_mounts, max_mounts, min_mount_depth)
+                # the coalesced ancestors need mapping like any other path
+                host_paths = host_paths + sorted(set(min_mounts) - set(host_paths))
         relative_path_tuples = []
 
         for path in host_paths:
-            nix_path = transform_to_nix_path(path)
+            nix_path = transform_to_nix_path(path, normalized=True)
 
             if nix_path.startswith("/"):
                 container_path = posixpath.join(
@@ -75,6 +157,7 @@ class PathMap:
         relative_path_tuples.sort()
         relative_path_prefix = container_rel
         current_relative_path_head = None
+        joined_paths = []
         for relative, host_path in relative_path_tuples:
             head, tail = split_relative(relative)
 
@@ -88,11 +171,182 @@ class PathMap:
 
             current_relative_path_head = head
 
-            container_path = normalize_path(posixpath.join(relative_path_prefix, tail))
+            joined_paths.append((host_path, posixpath.join(relative_path_prefix, tail)))
+
+        normalized = normalize_paths(joined for _, joined in joined_paths)
+        for host_path, joined in joined_paths:
+            map_host_to_container_paths[host_path] = normalized[joined]
+
+        for mount in min_mounts:
+            mount_trie.insert(mount, map_host_to_container_paths[mount])
+
+        return min_mounts, map_host_to_container_paths, mount_trie
+
 
-            map_host_to_container_paths[host_path] = container_path
+class CompactPathMap:
+    """
+    Maps host paths to container paths, as PathMap does, but for very large numbers of paths.
+    Rather than a string for each path (and container path), it keeps a forest of path nodes,
+    each an interned component and its parent node, so that a component shared by many paths
+    (eg. a common folder) is only stored once. A container path is kept as a base (eg.
+    "/h/abs") and how many of the host path's leading components it replaces, so the many
+    container paths under the same base cost one node between them. Paths are rebuilt from
+    their nodes on lookup.
+
+    It is built through a PathMap, so saves on what is kept for lookups, not on the peak while
+    building it.
+    """
+
+    __slots__ = (
+        "components",
+        "component_ids",
+        "parents",
+        "names",
+        "children",
+        "bases",
+        "replaced",
+        "is_mount",
+        "mount_nodes",
+        "lookups",
+    )
+
+    # Node 0 is the parent of every path's first component
+    _ROOT = 0
+    # No node (eg. the container base of a host path that isn't mapped)
+    _NONE = -1
+    # Children are keyed on (parent node << _CHILD_SHIFT) | component id
+    _CHILD_SHIFT = 32
+
+    def __init__(self, host_paths: "list[str]", *args, **kwargs) -> None:
+        """Takes the same arguments as PathMap."""
+        path_map = PathMap(host_paths, *args, **kwargs)
+
+        # interned component strings, and their ids
+        self.components = []
+        self.component_ids = {}
+        # per node, in arrays rather than lists of python ints
+        self.parents = array("i", [CompactPathMap._NONE])
+        self.names = array("i", [CompactPathMap._NONE])
+        self.bases = array("i", [CompactPathMap._NONE])
+        self.replaced = array("H", [0])
+        self.is_mount = bytearray(1)
+        self.children = {}
+        self.lookups = {}
+
+        for host_path, container_path in path_map.mappings.items():
+            self.map(path_components(host_path), container_path)
+        # the mounts, along with any existing mounts, are exactly what the trie holds
+        for components, container_path in path_map.mount_trie.items():
+            self.is_mount[self.map(components, container_path)] = 1
+        self.mount_nodes = array("i", (self.node(m) for m in path_map.get_mounts()))
+
+    def map(self, host_components: "list[str]", container_path: str) -> int:
+        """Map a host path's node to container_path, returning the node."""
+        node = self.node_of_components(host_components)
+        container_components = path_components(container_path)
+        # the components both paths end with are the host path's own, not the container's
+        shared = 0
+        limit = min(len(host_components), len(container_components) - 1)
+        while (
+            shared < limit
+            and host_components[-1 - shared] == container_components[-1 - shared]
+        ):
+            shared += 1
+        base = self.node_of_components(container_components[: -shared or None])
+        replaced = len(host_components) - shared
+        if self.container_path(base, replaced, host_components) != container_path:
+            # keep the odd one out (eg. with an empty component) whole
+            base = self.node_of_components(container_components)
+            replaced = len(host_components)
+        self.bases[node] = base
+        self.replaced[node] = replaced
+        return node
+
+    def node(self, path: str) -> int:
+        """Node of a normalized path, added if need be."""
+        return self.node_of_components(path_components(path))
+
+    def node_of_components(self, components: "list[str]") -> int:
+        node = CompactPathMap._ROOT
+        for component in components:
+            component_id = self.component_ids.get(component)
+            if component_id is None:
+                component_id = len(self.components)
+                self.components.append(sys.intern(component))
+                self.component_ids[self.components[-1]] = component_id
+            key = (node << CompactPathMap._CHILD_SHIFT) | component_id
+            child = self.children.get(key)
+            if child is None:
+                child = len(self.parents)
+                self.parents.append(node)
+                self.names.append(component_id)
+                self.bases.append(CompactPathMap._NONE)
+                self.replaced.append(0)
+                self.is_mount.append(0)
+                self.children[key] = child
+            node = child
+        return node
+
+    def path(self, node: int) -> str:
+        """Rebuild the path of a node."""
+        components = []
+        while node != CompactPathMap._ROOT:
+            components.append(self.components[self.names[node]])
+            node = self.parents[node]
+        components.reverse()
+        if len(components) == 1 and components[0].endswith(":"):
+            # a drive root
+            return components[0] + posixpath.sep
+        if components[0] == posixpath.sep:
+            return posixpath.sep + posixpath.sep.join(components[1:])
+        return posixpath.sep.join(components)
+
+    def container_path(
+        self, base: int, replaced: int, host_components: "list[str]"
+    ) -> str:
+        return posixpath.join(self.path(base), *host_components[replaced:])
+
+    def get_mounts(self) -> "list[str]":
+        """See PathMap.get_mounts"""
+        return [self.path(node) for node in self.mount_nodes]
+
+    def get_container_path(self, host_path: str) -> str:
+        """See PathMap.get_container_path"""
+        container_path = self.lookups.get(host_path)
+        if container_path is not None:
+            return container_path
+
+        components = path_components(normalize_path(host_path))
+        node = CompactPathMap._ROOT
+        # host_path itself, when mapped, otherwise the deepest mount above it
+        mapped = None
+        for component in components:
+            component_id = self.component_ids.get(component)
+            if component_id is None:
+                break
+            node = self.children.get(
+                (node << CompactPathMap._CHILD_SHIFT) | component_id
+            )
+            if node is None:
+                break
+            if self.is_mount[node]:
+                mapped = node
+        else:
+            if self.bases[node] != CompactPathMap._NONE:
+                mapped = node
+        if mapped is None:
+            raise KeyError(host_path)
+
+        # a path beneath a mount keeps (more of) its own components, as the mount's do
+        container_path = self.container_path(
+            self.bases[mapped], self.replaced[mapped], components
+        )
 
-        return min_mounts, map_host_to_container_paths
+        if len(self.lookups) >= LOOKUP_MEMO_SIZE:
+            # see PathMap.get_container_path
+            self.lookups.clear()
+        self.lookups[host_path] = container_path
+        return container_path
 
 
 class PathMapBuilder:
@@ -105,9 +359,25 @@ class PathMapBuilder:
         self.paths.append(path)
 
     def build(
-        self, container_abs: str, container_rel: str, container_dd: str
+        self,
+        container_abs: str,
+        container_rel: str,
+        container_dd: str,
+        max_mounts: int = None,
+        min_mount_depth: int = DEFAULT_MIN_MOUNT_DEPTH,
+        existing_mounts: dict = None,
+        compact: bool = False,
     ) -> PathMap:
-        return PathMap(self.paths, container_abs, container_rel, container_dd)
+        """Build a PathMap, or a CompactPathMap when compact."""
+        return (CompactPathMap if compact else PathMap)(
+            self.paths,
+            container_abs,
+            container_rel,
+            container_dd,
+            max_mounts,
+            min_mount_depth,
+            existing_mounts,
+        )
 
 
 def split_relative(path: str) -> Tuple[str, str]:
@@ -130,6 +400,9 @@ def normalize_path(candidate: str) -> str:
     Path origin is unknown, but we wish to collapse consecutive separators down to singles
     and trim any final trailing separator (but only if the path is not for "root" folder)
     """
+    if instrumentation.active is not None:
+        instrumentation.active.count("paths_normalized")
+
     # CAUTION: Making simplifying assumption that any and all "\" characters are just folder
     # separators (eg. from windows path), and not actually meant to be escaping anything.
     norm = UNKNOWN_SEP_CHARS_REGEX.sub(posixpath.sep, candidate)
@@ -143,6 +416,19 @@ def normalize_path(candidate: str) -> str:
     return make_explicit_relative(norm)
 
 
+def normalize_paths(candidates) -> "dict[str, str]":
+    """
+    Normalize (see normalize_path) a batch of paths, each distinct one only once. Returns a
+    table of {path: normalized path}, with the normalized paths interned, so that equal paths
+    share one string and compare (and hash into the PathTrie) cheaply.
+    """
+    table = {}
+    for candidate in candidates:
+        if candidate not in table:
+            table[candidate] = sys.intern(normalize_path(candidate))
+    return table
+
+
 def make_explicit_relative(candidate: str) -> str:
     # If we're an absolute path or explicit relative path, then all done
     if candidate.startswith(posixpath.sep) or candidate.startswith("."):
@@ -155,28 +441,188 @@ def make_explicit_relative(candidate: str) -> str:
     return candidate
 
 
-def transform_to_nix_path(candidate: str) -> str:
+def transform_to_nix_path(candidate: str, normalized: bool = False) -> str:
     """
-    Path origin is unknown, but we wish to transform it to a comparable *nix path
+    Path origin is unknown, but we wish to transform it to a comparable *nix path. A normalized
+    candidate (see normalize_path) already has only single "/" separators, and nothing left to
+    collapse once its drive is dropped.
     """
-    # CAUTION: Making simplifying assumption that any and all "\" characters are just folder
-    # separators (eg. from windows path), and not actually meant to be escaping anything.
-    norm = UNKNOWN_SEP_CHARS_REGEX.sub(posixpath.sep, candidate)
+    norm = candidate
+    if not normalized:
+        # CAUTION: Making simplifying assumption that any and all "\" characters are just
+        # folder separators (eg. from windows path), and not actually meant to be escaping
+        # anything.
+        norm = UNKNOWN_SEP_CHARS_REGEX.sub(posixpath.sep, candidate)
 
     # let's ensure we skip any possible windows / UNC drive bit
     _, tail = ntpath.splitdrive(norm)
     norm = tail
 
     # finally, we normalize to unix
-    norm = posixpath.normpath(norm)
+    if not normalized or not norm:
+        norm = posixpath.normpath(norm)
 
     return make_explicit_relative(norm)
 
 
-def reduce_mounts(inputs):
+def path_components(path: str) -> "list[str]":
+    """
+    Split a normalized path into the components used to key a PathTrie. An absolute path's
+    leading separator is kept as its own "/" component so that root is a node like any other,
+    and a drive root ("c:/") is just its drive's component.
+    """
+    if path == posixpath.sep:
+        return [posixpath.sep]
+
+    components = path.split(posixpath.sep)
+    if path.startswith(posixpath.sep):
+        components[0] = posixpath.sep
+    elif len(components) == 2 and components[0].endswith(":") and not components[1]:
+        components.pop()
+
+    return components
+
+
+class PathTrie:
+    """
+    Path-component trie mapping normalized paths to values, so that the nearest mapped
+    ancestor of any path can be found in O(path depth).
+    """
+
+    # Key under which a node's value is stored (can never collide with a str component)
+    _VALUE = None
+
+    def __init__(self) -> None:
+        self.root = {}
+
+    def insert(self, path: str, value) -> None:
+        node = self.root
+        for component in path_components(path):
+            node = node.setdefault(component, {})
+        node[PathTrie._VALUE] = value
+
+    def find_longest_prefix(self, path: str):
+        """
+        Returns (value, remaining_components) for the deepest mapped path that is the given
+        path or one of its ancestors, or None if there is no such path.
+        """
+        found = None
+        node = self.root
+        components = path_components(path)
+        for depth, component in enumerate(components):
+            node = node.get(component)
+            if node is None:
+                break
+            if PathTrie._VALUE in node:
+                found = (node[PathTrie._VALUE], components[depth + 1 :])
+
+        return found
+
+    def items(self):
+        """Yield (path components, value) of each mapped path."""
+        pending = [([], self.root)]
+        while pending:
+            components, node = pending.pop()
+            for component, child in node.items():
+                if component is PathTrie._VALUE:
+                    yield components, child
+                else:
+                    pending.append((components + [component], child))
+
+
+def reduce_mounts(inputs, normalized: bool = False):
     """
     Given a set of input paths intended to be mounted, reduce this to the subset that need mounting.
-    (eg. avoid mounting children of folders already being mounted).
+    (eg. avoid mounting children of folders already being mounted). The inputs are normalized
+    first, unless they already are.
+    """
+    mount_trie = PathTrie()
+    reduced_mounts = []
+
+    # sorted so that we get to parents before children (a parent is always a string prefix
+    # of its children), meaning each candidate only has to look upward in the trie
+    if not normalized:
+        inputs = normalize_paths(inputs).values()
+    candidates = sorted(set(inputs))
+    for mount in candidates:
+        if mount_trie.find_longest_prefix(mount) is None:
+            mount_trie.insert(mount, mount)
+            reduced_mounts.append(mount)
+
+    if instrumentation.active is not None:
+        # a candidate with a mount at or above it is the trie's equivalent of a memo hit
+        instrumentation.active.count("mount_or_parent_mount.lookups", len(candidates))
+        instrumentation.active.count(
+            "mount_or_parent_mount.hits", len(candidates) - len(reduced_mounts)
+        )
+    return reduced_mounts
+
+
+def split_mount(mount: str):
+    """
+    Split a normalized mount into its base (its root, drive or relative "." / ".." prefix)
+    and the folders beneath that.
+    """
+    components = mount.split(posixpath.sep)
+    if mount.startswith(posixpath.sep):
+        return posixpath.sep, [c for c in components[1:] if c]
+
+    base = []
+    for component in components:
+        if component in (".", "..") or (not base and component.endswith(":")):
+            base.append(component)
+        else:
+            break
+    folders = [c for c in components[len(base) :] if c]
+    return posixpath.sep.join(base), folders
+
+
+def coalesce_mounts(
+    mounts: "list[str]", max_mounts: int, min_depth: int = DEFAULT_MIN_MOUNT_DEPTH
+) -> "list[str]":
+    """
+    Merge (already reduced) mounts into common ancestors until there are no more than
+    max_mounts of them, or no more can be merged. Each merge is into the deepest ancestor that
+    is shared by more than one mount, so that as little else as possible gets mounted along the
+    way, and no merge is into an ancestor less than min_depth folders below its root (or "./"),
+    nor into a bare "../" (which can't be mapped into the container).
+    """
+    mounts = list(mounts)
+    while len(mounts) > max_mounts:
+        shared = {}
+        for mount in mounts:
+            base, folders = split_mount(mount)
+            shallowest = (
+                min_depth if base in (posixpath.sep, ".") else max(min_depth, 1)
+            )
+            for depth in range(shallowest, len(folders)):
+                key = (base, tuple(folders[:depth]))
+                shared[key] = shared.get(key, 0) + 1
+
+        candidates = [(len(key[1]), count, key) for key, count in shared.items()]
+        candidates = [c for c in candidates if c[1] > 1]
+        if not candidates:
+            break
+
+        _, _, (base, folders) = max(candidates)
+        # joined from the components of normalized mounts, so it's normalized already
+        ancestor = posixpath.join(base, *folders)
+        mounts = [m for m in mounts if not is_at_or_below(m, ancestor)] + [ancestor]
+
+    return sorted(mounts)
+
+
+def is_at_or_below(path: str, ancestor: str) -> bool:
+    return path == ancestor or path.startswith(
+        ancestor.rstrip(posixpath.sep) + posixpath.sep
+    )
+
+
+def reduce_mounts_reference(inputs):
+    """
+    Original (quadratic) implementation of reduce_mounts, kept as the reference that the
+    trie-based version is checked against. Note that it keeps duplicates, and that when "/"
+    itself is an input it also keeps the absolute paths beneath it.
     """
     has_mount_or_parent_mount = {}
     reduced_mounts = []
@@ -208,6 +654,10 @@ def has_mount_or_parent_mount_recurse(
         return False
 
     status = has_mount_or_parent_mount_map.get(candidate)
+    if instrumentation.active is not None:
+        instrumentation.active.count("has_mount_or_parent_mount.lookups")
+        if status is not None:
+            instrumentation.active.count("has_mount_or_parent_mount.hits")
     if status is not None:
         # We've already computed this one, so return directly
         return status
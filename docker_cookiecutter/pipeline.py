@@ -0,0 +1,141 @@
+"""Fetch the next templates while the current one is generated.
+
+Generating templates one after another leaves the network idle while a template renders, and the
+CPU idle while the next one is fetched. generate_pipelined overlaps the two: while a template is
+generated, up to prefetch of the templates after it are fetched, each in a thread of its own
+(where the fetch mostly waits on its git / hg / download subprocess), so they overlap each other
+as well as the rendering. An asyncio event loop drives the pipeline, generating each template in
+turn on its own thread (the caller's) once its fetch is done, since cookiecutter prompts, changes
+folders and is patched while rendering (see render.py), none of which mixes with threads.
+
+The window is bounded, so no more than prefetch fetched templates wait for their turn (and no
+more of the sources, eg. of a manifest, are read ahead than that). Neither does anything else
+grow with the number of templates: a fetch is let go of once the window is past it, and only
+the folders of the last FETCHED_MEMO_SIZE fetches are remembered, so that templates sharing
+a fetch (eg. directories of one repository) that are read close together are fetched once. A template that fails, to fetch
+or to generate, fails at its turn in template order, so what was generated before it is what a
+sequential run would have generated. With fail_fast, the first failure stops the run: fetches of
+the templates after it that haven't started are cancelled, and no more are read. Otherwise every
+template is tried, and the failures are reported together.
+"""
+
+import asyncio
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+# How many of the latest fetches' folders are remembered, for templates sharing their fetch
+FETCHED_MEMO_SIZE = 256
+
+
+def generate_pipelined(
+    sources, fetch_key, fetch, generate, prefetch: int, fail_fast: bool = False
+):
+    """
+    Generate the sources in turn, fetching up to prefetch of the next ones meanwhile.
+
+    Args:
+        sources: the template sources, read as the window moves along them
+        fetch_key: returns what identifies the fetch a source needs (sources with the same key
+            share one fetch), or None if it needs none (eg. a local template)
+        fetch: returns the local folder a source was fetched into, called in a worker thread
+        generate: called with each source and its local folder (or None), returns the project
+            folder
+        prefetch: number of templates to fetch ahead of the one being generated (at least 1)
+        fail_fast: stop at the first failure, rather than trying every template
+
+    Returns:
+        (the generated project folders, (source, exception) of each failure), in template
+        order. With fail_fast, there's at most one failure, and nothing after it is generated
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(
+            run_pipeline(loop, sources, fetch_key, fetch, generate, prefetch, fail_fast)
+        )
+    finally:
+        loop.close()
+
+
+async def run_pipeline(
+    loop, sources, fetch_key, fetch, generate, prefetch: int, fail_fast: bool
+):
+    sources = iter(sources)
+    # (source, key) of the template being generated, then of those being fetched after it
+    window = deque()
+    # {key: future} of the fetches the window refers to, in the order they were started
+    fetches = {}
+    # {key: how many of the window's templates refer to its fetch}
+    references = {}
+    # {key: local folder} of the latest fetches the window is past, least recent first
+    fetched_folders = OrderedDict()
+    failed = []
+
+    def fetched(key, future):
+        if fail_fast and not future.cancelled() and future.exception() is not None:
+            # the run stops at (or before) this template, so nothing after it is needed
+            failed.append(key)
+            started = list(fetches)
+            for later in started[started.index(key) + 1 :]:
+                fetches[later].cancel()
+
+    def read_ahead():
+        if failed:
+            return
+        for source in islice(sources, max(0, prefetch + 1 - len(window))):
+            key = fetch_key(source)
+            if key is not None and key not in fetches:
+                if key in fetched_folders:
+                    fetched_folders.move_to_end(key)
+                    future = loop.create_future()
+                    future.set_result(fetched_folders[key])
+                else:
+                    future = loop.run_in_executor(executor, fetch, source)
+                    future.add_done_callback(lambda f, key=key: fetched(key, f))
+                fetches[key] = future
+            if key is not None:
+                references[key] = references.get(key, 0) + 1
+            window.append((source, key))
+
+    def release(key):
+        references[key] -= 1
+        if references[key] > 0:
+            return
+        del references[key]
+        future = fetches.pop(key)
+        if not future.cancelled() and future.exception() is None:
+            fetched_folders[key] = future.result()
+            fetched_folders.move_to_end(key)
+            if len(fetched_folders) > FETCHED_MEMO_SIZE:
+                fetched_folders.popitem(last=False)
+
+    result = []
+    failures = []
+    # a thread for each fetch of the window, so the current one never holds up the others
+    executor = ThreadPoolExecutor(max_workers=prefetch + 1)
+    try:
+        read_ahead()
+        while window:
+            source, key = window[0]
+            try:
+                local = None if key is None else await fetches[key]
+                result.append(generate(source, local))
+            except Exception as e:
+                failures.append((source, e))
+                if fail_fast:
+                    break
+            window.popleft()
+            if key is not None:
+                release(key)
+            read_ahead()
+    finally:
+        for future in fetches.values():
+            future.cancel()
+        # wait for the fetches under way, their folders may be removed once we're done
+        executor.shutdown(wait=True)
+        for future in fetches.values():
+            if not future.cancelled():
+                # retrieved, so that a failure never needed isn't logged as unhandled
+                future.exception()
+
+    return result, failures
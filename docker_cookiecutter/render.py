@@ -0,0 +1,245 @@
+"""Render the files of a single template concurrently.
+
+cookiecutter walks the template serially, creating each (rendered) folder, copying the
+_copy_without_render files and rendering every other file in turn. While rendering_concurrently
+is active, that walk still runs as is, but only plans the files to render: each generate_file
+call is recorded, along with the output file its name renders to. The plan is then rendered
+across a pool, as the last step before the post_gen_project hook runs, so hooks see exactly
+the files they would have, in the same order. Files whose names render to the same output file
+are rendered one after another, in the order cookiecutter would have, so the output is
+identical to a serial run.
+
+When a file fails to render, cookiecutter stops at it, whereas the pool goes on to render the
+files after it. Those it wrote that weren't there before are removed again, so that only the
+files before the failure are left, as cookiecutter would have left them. (Files that were there
+before, in a project folder that already existed, may have been rewritten meanwhile though.)
+
+Compiling and rendering with jinja is CPU bound, so the pool is of worker processes, each
+rendering with cookiecutter's own generate_file and a jinja environment of its own (compiling
+through the same bytecode cache, see bytecode.py). Worker processes are spawned rather than
+forked, so they never see the generate_file patched here. Anything that has to see every render
+in this process (see incremental.py) needs the pool to be of threads instead, which overlap the
+reading and writing of files, but not much of jinja's work.
+"""
+
+import os
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+# Work around python's lack of consts
+class CONST(object):
+    __slots__ = ()
+    # plan tasks per worker process, small enough to balance uneven files
+    TASKS_PER_PROCESS = 4
+
+
+CONST = CONST()
+
+
+def renders_name(env, infile: str) -> bool:
+    """Whether infile's name has any templating in it, otherwise it renders to itself."""
+    return any(
+        start in infile
+        for start in (
+            env.block_start_string,
+            env.variable_start_string,
+            env.comment_start_string,
+        )
+    )
+
+
+class RenderPlan:
+    """The generate_file calls of one generate_files run, by the output file they write."""
+
+    def __init__(self) -> None:
+        self.template_dir = None
+        self.env = None
+        self.context = None
+        self.delete_project_on_failure = False
+        # generate_file args, in walk order
+        self.planned = []
+        # {output file: [walk order]}
+        self.outputs = OrderedDict()
+
+    def add(self, project_dir, infile, context, env, skip_if_file_exists) -> None:
+        # cookiecutter walks from within the template folder, so infile is relative to it
+        if self.template_dir is None:
+            self.template_dir = os.getcwd()
+            self.env = env
+            self.context = context
+        name = infile
+        if renders_name(env, infile):
+            name = env.from_string(infile).render(**context)
+        self.outputs.setdefault(os.path.join(project_dir, name), []).append(
+            len(self.planned)
+        )
+        self.planned.append((project_dir, infile, context, env, skip_if_file_exists))
+
+
+# The jinja environment each worker process renders a template folder's files with, for each
+# set of jinja extensions
+worker_environments = {}
+
+
+def render_in_worker(template_dir: str, context, bytecode_cache, outputs) -> list:
+    """
+    Render (in a worker process) the outputs' files, each a list of (walk order, project
+    folder, template file, skip_if_file_exists).
+
+    Returns:
+        (walk order, error) for each output that failed
+    """
+    from cookiecutter.environment import StrictEnvironment
+    from cookiecutter.generate import generate_file
+    from cookiecutter.utils import work_in
+    from jinja2 import FileSystemLoader
+
+    extensions = context.get("cookiecutter", {}).get("_extensions", [])
+    key = (template_dir, tuple(str(e) for e in extensions))
+    env = worker_environments.get(key)
+    if env is None:
+        # as generate_files sets it up; keeping it keeps what it has compiled
+        env = StrictEnvironment(context=context, keep_trailing_newline=True)
+        env.loader = FileSystemLoader(".")
+        env.bytecode_cache = bytecode_cache
+        worker_environments[key] = env
+
+    failures = []
+    with work_in(template_dir):
+        for calls in outputs:
+            for order, project_dir, infile, skip_if_file_exists in calls:
+                try:
+                    generate_file(
+                        project_dir, infile, context, env, skip_if_file_exists
+                    )
+                except Exception as e:
+                    failures.append((order, e))
+                    break
+    return failures
+
+
+def render_plan(plan: RenderPlan, executor, jobs: int, generate_file=None) -> None:
+    """
+    Render the plan's files on executor: in threads with generate_file, or when it's None, in
+    jobs worker processes with cookiecutter's own. Then raise what the first of them (in walk
+    order) to fail raised, if any, as cookiecutter's walk would have, having removed the new
+    files rendered after it.
+    """
+    # deferred with the rest of cookiecutter, see cookiecutters.cookiecutter
+    from cookiecutter.exceptions import UndefinedVariableInTemplate
+    from cookiecutter.utils import rmtree, work_in
+    from jinja2.exceptions import UndefinedError
+
+    # a fresh project folder (deleted on failure) has nothing in it yet
+    existed = set()
+    if not plan.delete_project_on_failure:
+        # rendering into a project folder that was there already, where a failure leaves it be
+        existed = {output for output in plan.outputs if os.path.exists(output)}
+
+    if generate_file is None:
+        outputs = [
+            [
+                (order,) + tuple(plan.planned[order][i] for i in (0, 1, 4))
+                for order in orders
+            ]
+            for orders in plan.outputs.values()
+        ]
+        tasks = min(jobs * CONST.TASKS_PER_PROCESS, len(outputs))
+        futures = [
+            executor.submit(
+                render_in_worker,
+                plan.template_dir,
+                plan.context,
+                plan.env.bytecode_cache,
+                outputs[index::tasks],
+            )
+            for index in range(tasks)
+        ]
+        failures = [failure for future in futures for failure in future.result()]
+    else:
+
+        def render_output(orders):
+            for order in orders:
+                try:
+                    generate_file(*plan.planned[order])
+                except Exception as e:
+                    return order, e
+            return None
+
+        with work_in(plan.template_dir):
+            results = executor.map(render_output, plan.outputs.values())
+            failures = [failure for failure in results if failure is not None]
+
+    if not failures:
+        return
+    order, error = min(failures, key=lambda f: f[0])
+    for output, orders in plan.outputs.items():
+        # cookiecutter's walk would have stopped before ever writing these
+        if orders[0] > order and output not in existed and os.path.exists(output):
+            os.remove(output)
+    project_dir, infile = plan.planned[order][:2]
+    if isinstance(error, UndefinedError):
+        if plan.delete_project_on_failure:
+            rmtree(project_dir)
+        msg = "Unable to create file '{}'".format(infile)
+        raise UndefinedVariableInTemplate(msg, error, plan.context)
+    raise error
+
+
+@contextmanager
+def rendering_concurrently(jobs: int, processes: bool = True):
+    """
+    While active (with jobs > 1), cookiecutter.generate.generate_files renders a template's
+    files jobs at a time, in worker processes (or threads).
+    """
+    if jobs <= 1:
+        yield
+        return
+
+    # deferred with the rest of cookiecutter, see cookiecutters.cookiecutter
+    import cookiecutter.generate
+
+    if processes:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        executor = ProcessPoolExecutor(
+            jobs, mp_context=multiprocessing.get_context("spawn")
+        )
+    else:
+        from concurrent.futures import ThreadPoolExecutor
+
+        executor = ThreadPoolExecutor(jobs)
+
+    generate_file = cookiecutter.generate.generate_file
+    run_hook_from_repo_dir = cookiecutter.generate._run_hook_from_repo_dir
+    # the plan of the generate_files call in progress
+    current = [None]
+
+    def plan_file(project_dir, infile, context, env, skip_if_file_exists=False):
+        current[0].add(project_dir, infile, context, env, skip_if_file_exists)
+
+    def run_hook_after_rendering(
+        repo_dir, hook_name, project_dir, context, delete_project_on_failure
+    ):
+        if hook_name == "pre_gen_project":
+            # the walk (and so the planning) of a new generate_files is about to start
+            current[0] = RenderPlan()
+        elif hook_name == "post_gen_project" and current[0] is not None:
+            plan, current[0] = current[0], None
+            plan.delete_project_on_failure = delete_project_on_failure
+            if plan.planned:
+                render_plan(plan, executor, jobs, None if processes else generate_file)
+        run_hook_from_repo_dir(
+            repo_dir, hook_name, project_dir, context, delete_project_on_failure
+        )
+
+    with executor:
+        cookiecutter.generate.generate_file = plan_file
+        cookiecutter.generate._run_hook_from_repo_dir = run_hook_after_rendering
+        try:
+            yield
+        finally:
+            cookiecutter.generate.generate_file = generate_file
+            cookiecutter.generate._run_hook_from_repo_dir = run_hook_from_repo_dir
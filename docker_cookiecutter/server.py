@@ -0,0 +1,165 @@
+"""Keep a warm suggest process on a local Unix socket, and a thin client to talk to it.
+
+The protocol is newline-delimited JSON over a stream socket. Each request is a JSON array of
+the arguments that would otherwise be given to suggest (or {"args": [...], "options": {...}}
+to also pass cookiecutter_to_docker_args keyword options), and each response is either
+{"result": [...]} (the cookiecutter_to_docker_args output) or {"error": "..."}. A client may
+send any number of requests over one connection.
+"""
+
+import json
+import os
+import socket
+import socketserver
+import tempfile
+
+
+# Work around python's lack of consts
+class CONST(object):
+    __slots__ = ()
+    SOCKET_ENV_VAR = "DOCKER_COOKIECUTTER_SOCKET"
+    SOCKET_FILE_NAME = "docker_cookiecutter.sock"
+
+
+CONST = CONST()
+
+
+class ServerError(Exception):
+    """The suggest server could not handle a request."""
+
+
+def default_socket_path() -> str:
+    configured = os.environ.get(CONST.SOCKET_ENV_VAR)
+    if configured:
+        return configured
+
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return os.path.join(runtime_dir, CONST.SOCKET_FILE_NAME)
+
+
+def handle_request(line: bytes) -> dict:
+    # deferred so that the client side of this module stays cheap to import
+    from docker_cookiecutter.suggest import cookiecutter_to_docker_args
+
+    try:
+        request = json.loads(line)
+        options = {}
+        if isinstance(request, dict):
+            options = request.get("options") or {}
+            request = request.get("args")
+        if not isinstance(request, list):
+            raise ValueError("request must be a JSON array of arguments")
+        return {"result": cookiecutter_to_docker_args(request, **options)}
+    except (Exception, SystemExit) as e:
+        # argparse reports bad option values with SystemExit; that must not end the server
+        return {"error": repr(e)}
+
+
+class SuggestRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            response = json.dumps(handle_request(line)).encode() + b"\n"
+            self.wfile.write(response)
+            self.wfile.flush()
+
+
+class SuggestServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Answers suggest requests, one thread per connected client."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str = None) -> None:
+        self.socket_path = socket_path or default_socket_path()
+        remove_stale_socket(self.socket_path)
+        super().__init__(self.socket_path, SuggestRequestHandler)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+
+def remove_stale_socket(socket_path: str) -> None:
+    """
+    Remove a socket file left behind by a server that is no longer running.
+
+    Raises:
+        ServerError: if a server is still listening on the socket
+    """
+    if not os.path.exists(socket_path):
+        return
+
+    try:
+        SuggestClient(socket_path).close()
+    except OSError:
+        os.remove(socket_path)
+    else:
+        raise ServerError("a server is already listening on " + socket_path)
+
+
+def serve(socket_path: str = None) -> None:
+    with SuggestServer(socket_path) as server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+class SuggestClient:
+    """
+    A connection to a running suggest server.
+
+    Raises:
+        OSError: (on construction) if no server is listening on the socket
+    """
+
+    def __init__(self, socket_path: str = None) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.sock.connect(socket_path or default_socket_path())
+        except OSError:
+            self.sock.close()
+            raise
+        self.stream = self.sock.makefile("rwb")
+
+    def suggest(self, args: "list[str]", **options) -> "list[str]":
+        request = {"args": args, "options": options} if options else args
+        self.stream.write(json.dumps(request).encode() + b"\n")
+        self.stream.flush()
+
+        line = self.stream.readline()
+        if not line:
+            raise ServerError("server closed the connection")
+
+        response = json.loads(line)
+        if "error" in response:
+            raise ServerError(response["error"])
+        return response["result"]
+
+    def close(self) -> None:
+        self.stream.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def suggest(args: "list[str]", socket_path: str = None, **options) -> "list[str]":
+    """
+    cookiecutter_to_docker_args via the suggest server, falling back to running it in-process
+    when no server is running.
+    """
+    try:
+        client = SuggestClient(socket_path)
+    except OSError:
+        from docker_cookiecutter.suggest import cookiecutter_to_docker_args
+
+        return cookiecutter_to_docker_args(args, **options)
+
+    with client:
+        return client.suggest(args, **options)
@@ -0,0 +1,310 @@
+"""Reuse one long-lived container for many generations, instead of a docker run for each.
+
+A session is started (on the host) for a set of commandlines: one container is run in the
+background with the union of the mounts they need, and keeps a warm cookiecutters process in it
+listening on a Unix socket. Each generation is then dispatched into the container with docker
+exec, where a thin client hands its cookiecutter commandline to that process and relays the
+output and exit status. The container stops itself (and is removed) once it has gone idle.
+
+Host paths are resolved to absolute paths for a session, so that generations can be dispatched
+from any folder, as long as their paths are within the session's mounts.
+"""
+
+import io
+import json
+import os
+import socket
+import socketserver
+import subprocess
+import sys
+import tempfile
+import traceback
+from contextlib import redirect_stderr, redirect_stdout
+from dataclasses import replace
+
+from docker_cookiecutter import pathmap
+from docker_cookiecutter.suggest import (
+    cookiecutter_command_args,
+    docker_cache_mount_args,
+    docker_mount_args,
+    docker_user_args,
+    host_paths,
+    is_fs_template,
+    parse_commandline,
+)
+from docker_cookiecutter.templates import TemplateManifest, is_cacheable
+
+
+# Work around python's lack of consts
+class CONST(object):
+    __slots__ = ()
+    STATE_DIR_NAME = "docker_cookiecutter-sessions"
+    # where the warm process listens, within the container
+    CONTAINER_SOCKET = "/tmp/docker_cookiecutter-session.sock"
+    DEFAULT_IDLE_TIMEOUT = 600
+    COMMAND = ["docker_cookiecutter", "session"]
+
+
+CONST = CONST()
+
+
+class SessionError(Exception):
+    """A session couldn't be started, or a generation can't be dispatched into it."""
+
+
+def state_dir() -> str:
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return os.path.join(runtime_dir, CONST.STATE_DIR_NAME)
+
+
+def state_path(session: str) -> str:
+    if not session or os.sep in session or session.startswith("."):
+        raise SessionError("not a session: " + repr(session))
+    return os.path.join(state_dir(), session + ".json")
+
+
+def load_state(session: str) -> dict:
+    try:
+        with open(state_path(session)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        raise SessionError("no such session: " + session)
+
+
+def absolute_paths(cc_parsed, cc_templates, cwd: str):
+    """Resolve the commandline's host paths against cwd, in place."""
+    for name in ("output_dir", "config_file", "debug_file"):
+        value = getattr(cc_parsed, name)
+        if value:
+            setattr(cc_parsed, name, os.path.normpath(os.path.join(cwd, value)))
+    if isinstance(cc_templates, TemplateManifest):
+        # its templates are relative to it
+        return TemplateManifest(os.path.normpath(os.path.join(cwd, cc_templates.path)))
+    return [
+        (
+            replace(t, template=os.path.normpath(os.path.join(cwd, t.template)))
+            if is_fs_template(t.template)
+            else t
+        )
+        for t in cc_templates
+    ]
+
+
+def start_session(
+    commandlines: "list[list[str]]",
+    idle_timeout: int = CONST.DEFAULT_IDLE_TIMEOUT,
+    template_cache: str = None,
+    cwd: str = None,
+) -> str:
+    """
+    Start a session container able to run any of the (docker + cookiecutter) commandlines,
+    which must all use the same docker image and options.
+
+    Returns:
+        the session (the container's id)
+    """
+    cwd = cwd or os.getcwd()
+    paths = []
+    docker = None
+    for args in commandlines:
+        image, docker_extra, _, cc_parsed, cc_templates, _ = parse_commandline(args)
+        if docker is None:
+            docker = (image, docker_extra)
+        elif docker != (image, docker_extra):
+            raise SessionError("a session's commandlines must share the docker options")
+        if cc_parsed.replay_file:
+            raise SessionError("--replay-file isn't supported in a session")
+        cc_templates = absolute_paths(cc_parsed, cc_templates, cwd)
+        paths.extend(host_paths(cc_parsed, cc_templates))
+    if docker is None:
+        raise SessionError("no commandlines to start a session for")
+    image, docker_extra = docker
+
+    path_map = pathmap.PathMap(paths)
+    argv = ["docker", "run", "-d", "--rm"] + docker_extra + docker_user_args(True)
+    for mount in path_map.get_mounts():
+        argv.extend(docker_mount_args(mount, path_map.get_container_path(mount), cwd))
+    if template_cache is not None:
+        argv.extend(docker_cache_mount_args(template_cache, cwd))
+    argv.append(image)
+    argv.extend(CONST.COMMAND + ["serve", "--idle-timeout", str(idle_timeout)])
+
+    try:
+        started = subprocess.run(
+            argv, stdout=subprocess.PIPE, universal_newlines=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError) as e:
+        raise SessionError("couldn't start the session container: " + str(e))
+    session = started.stdout.strip()
+
+    os.makedirs(state_dir(), exist_ok=True)
+    with open(state_path(session), "w") as f:
+        json.dump({"paths": paths, "template_cache": template_cache}, f)
+    return session
+
+
+def session_exec_args(session: str, args: "list[str]", cwd: str = None):
+    """
+    The docker exec argv running the cookiecutter part of a (docker + cookiecutter)
+    commandline in the session. The docker part of the commandline is ignored.
+    """
+    state = load_state(session)
+    _, _, _, cc_parsed, cc_templates, cc_extra = parse_commandline(args)
+    if not (cc_parsed.no_input or cc_parsed.replay):
+        raise SessionError("generations in a session need --no-input (or --replay)")
+    if cc_parsed.replay_file:
+        raise SessionError("--replay-file isn't supported in a session")
+    cc_templates = absolute_paths(cc_parsed, cc_templates, cwd or os.getcwd())
+
+    path_map = pathmap.PathMap(state["paths"])
+    for path in host_paths(cc_parsed, cc_templates):
+        try:
+            path_map.get_container_path(path)
+        except KeyError:
+            raise SessionError(path + " is not within the session's mounts")
+
+    use_template_cache = state["template_cache"] is not None and any(
+        is_cacheable(t.template) for t in cc_templates
+    )
+    command = cookiecutter_command_args(
+        cc_parsed, cc_templates, cc_extra, path_map, use_template_cache, argv=True
+    )
+    return ["docker", "exec", session] + CONST.COMMAND + ["run"] + command
+
+
+def exec_in_session(session: str, args: "list[str]", cwd: str = None) -> int:
+    """
+    Run a generation in the session, returning its exit status.
+
+    Raises:
+        SessionError: if the session's container is gone (eg. it stopped itself once idle)
+    """
+    exit_code = subprocess.call(session_exec_args(session, args, cwd))
+    # only looked into when docker exec fails, which is also how a failed generation exits
+    if exit_code != 0 and not is_running(session):
+        remove_state(session)
+        raise SessionError(
+            "session {} has expired (its container is no longer running)".format(
+                session
+            )
+        )
+    return exit_code
+
+
+def is_running(session: str) -> bool:
+    inspected = subprocess.run(
+        ["docker", "inspect", "--format", "{{.State.Running}}", session],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        universal_newlines=True,
+    )
+    return inspected.returncode == 0 and inspected.stdout.strip() == "true"
+
+
+def remove_state(session: str) -> None:
+    path = state_path(session)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def stop_session(session: str) -> None:
+    subprocess.call(
+        ["docker", "rm", "-f", session],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    remove_state(session)
+
+
+def run_generation(args: "list[str]"):
+    """
+    Run a cookiecutter / cookiecutters commandline in this process.
+
+    Returns:
+        (exit status, everything it wrote to stdout and stderr)
+    """
+    from docker_cookiecutter.cookiecutters import main
+
+    output = io.StringIO()
+    exit_code = 0
+    with redirect_stdout(output), redirect_stderr(output):
+        try:
+            # a single template is generated the same way by cookiecutters
+            main(args[1:])
+        except SystemExit as e:
+            if isinstance(e.code, int):
+                exit_code = e.code
+            elif e.code is not None:
+                print(e.code, file=sys.stderr)
+                exit_code = 1
+        except Exception:
+            traceback.print_exc()
+            exit_code = 1
+    return exit_code, output.getvalue()
+
+
+class SessionRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        try:
+            exit_code, output = run_generation(json.loads(line))
+        except ValueError as e:
+            exit_code, output = 1, "bad request: {!r}\n".format(e)
+        response = {"exit_code": exit_code, "output": output}
+        self.wfile.write(json.dumps(response).encode() + b"\n")
+
+
+class SessionServer(socketserver.UnixStreamServer):
+    """
+    Runs one generation at a time (cookiecutter changes folder while generating), and stops
+    serving once no request has come for idle_timeout seconds.
+    """
+
+    def __init__(self, socket_path: str, idle_timeout: float) -> None:
+        self.socket_path = socket_path
+        self.timeout = idle_timeout
+        self.idle = False
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        super().__init__(socket_path, SessionRequestHandler)
+
+    def handle_timeout(self):
+        self.idle = True
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+
+def serve_session(
+    idle_timeout: float = CONST.DEFAULT_IDLE_TIMEOUT,
+    socket_path: str = CONST.CONTAINER_SOCKET,
+) -> None:
+    """The session container's main process."""
+    # warm up everything a generation needs before the first one arrives
+    import cookiecutter.main  # noqa: F401
+
+    with SessionServer(socket_path, idle_timeout) as server:
+        while not server.idle:
+            server.handle_request()
+
+
+def run_in_session(
+    args: "list[str]", socket_path: str = CONST.CONTAINER_SOCKET, out_stream=None
+) -> int:
+    """Have the session's warm process run a cookiecutter commandline (from docker exec)."""
+    out_stream = out_stream or sys.stdout
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        stream = sock.makefile("rwb")
+        stream.write(json.dumps(args).encode() + b"\n")
+        stream.flush()
+        line = stream.readline()
+    if not line:
+        out_stream.write("the session closed the connection\n")
+        return 1
+    response = json.loads(line)
+    out_stream.write(response["output"])
+    out_stream.flush()
+    return response["exit_code"]
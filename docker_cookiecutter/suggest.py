@@ -3,11 +3,16 @@ import os
 import posixpath
 import sys
 
-from docker_cookiecutter import pathmap
+from docker_cookiecutter import instrumentation, pathmap
+from docker_cookiecutter.options import CompiledOptionParser
+from docker_cookiecutter.templates import CONST as TEMPLATES_CONST
 from docker_cookiecutter.templates import (
+    TemplateManifest,
     TemplateSourceInfo,
-    decode_template_sources,
     encode_template_sources,
+    is_cacheable,
+    is_fs_template,
+    template_sources,
 )
 
 
@@ -17,9 +22,28 @@ class CONST(object):
     DOCKER_PREAMBLE = ["docker", "run", "-it", "--rm"]
     DOCKER_USER = ["--user", '"$(id -u):$(id -g)"']
     DOCKER_ARGS_TO_PRUNE = DOCKER_PREAMBLE + ["-i", "-t"]
+    DOCKER_MOUNT_OPTIONS = ("-v", "--volume", "--mount")
     CC = "cookiecutter"
     CCS = "cookiecutters"
     CC_REPLAY_FILE = "/.cookiecutter_replay/in.json"
+    CC_TEMPLATE_CACHE_DIR = "/.cookiecutter_cache"
+    # (option strings, takes a value) for the cookiecutter options we process and pass through
+    CC_OPTIONS = (
+        (("--version", "-V"), False),
+        (("--no-input",), False),
+        (("--checkout", "-c"), True),
+        (("--directory",), True),
+        (("--verbose", "-v"), False),
+        (("--replay",), False),
+        (("--replay-file",), True),
+        (("--overwrite-if-exists", "-f"), False),
+        (("--skip-if-file-exists", "-s"), False),
+        (("--output-dir", "-o"), True),
+        (("--config-file",), True),
+        (("--default-config",), False),
+        (("--debug-file",), True),
+    )
+    CC_ITEM_AND_EXTRA = "ITEM_AND_EXTRA"
 
 
 CONST = CONST()
@@ -39,71 +63,116 @@ def split_docker_from_cookiecutter(given):
     return got_docker, got_cookiecutter
 
 
-def docker_mount_args(host: str, container: str) -> "list[str]":
+def docker_mount_args(host: str, container: str, cwd: str = None) -> "list[str]":
+    """
+    The mount of host onto container. Relative host paths are given relative to "$(pwd)" for
+    a shell to expand, or when cwd is given, resolved against it for a plain argv.
+    """
     if host.startswith(".") or not host.startswith("/") and "$(pwd)" not in host:
         tail = host.lstrip("./") if not host.startswith("..") else host
-        host = '"$(pwd)"'
-        if len(tail) > 0:
-            host += "/" + quote_if_necessary(tail)
+        if cwd is not None:
+            host = os.path.normpath(os.path.join(cwd, tail))
+        else:
+            host = '"$(pwd)"'
+            if len(tail) > 0:
+                host += "/" + quote_if_necessary(tail)
 
-    container = quote_if_necessary(container)
+    if cwd is None:
+        container = quote_if_necessary(container)
 
     return ["--mount", "type=bind,source=" + host + ",target=" + container]
 
 
-def is_fs_template(template: str) -> bool:
-    if template is None or template.isspace():
-        return False
-
-    if template.startswith("file://"):
-        return True
-
+def docker_cache_mount_args(template_cache: str, cwd: str = None) -> "list[str]":
+    """
+    The mount for the template cache, which is either a host folder or a docker volume name.
+    """
     if (
-        "" == template
-        or "://" in template
-        or template.startswith("gh:")
-        or template.startswith("bb:")
-        or template.startswith("gl:")
+        "/" in template_cache
+        or "\\" in template_cache
+        or template_cache.startswith(".")
     ):
-        return False
+        return docker_mount_args(template_cache, CONST.CC_TEMPLATE_CACHE_DIR, cwd)
+
+    return [
+        "--mount",
+        "type=volume,source="
+        + template_cache
+        + ",target="
+        + CONST.CC_TEMPLATE_CACHE_DIR,
+    ]
 
-    return True
+
+def docker_user_args(argv: bool = False) -> "list[str]":
+    """Run as the calling user, either for a shell to work out or resolved here for argv."""
+    if not argv:
+        return CONST.DOCKER_USER
+    if not hasattr(os, "getuid"):
+        # eg. windows, where docker doesn't map the container user onto a host one
+        return []
+    return ["--user", "{}:{}".format(os.getuid(), os.getgid())]
 
 
 def parse_docker(args):
-    # TODO: split things out better (i.e. handle any conflicting volume mounts)
     image = args[-1]
 
     # hacky pruning of the --rm and -it because we'll add them back explicitly later
     extra = [x for x in args[:-1] if x not in CONST.DOCKER_ARGS_TO_PRUNE]
 
-    return [], image, extra
+    return docker_bind_mounts(extra), image, extra
+
+
+def docker_bind_mounts(args: "list[str]") -> dict:
+    """
+    The {host folder: container folder} of the bind mounts of absolute host folders that are
+    among the given docker run args (as -v / --volume or --mount).
+    """
+    mounts = {}
+    for i, arg in enumerate(args):
+        option, has_value, value = arg.partition("=")
+        if option not in CONST.DOCKER_MOUNT_OPTIONS:
+            continue
+        if not has_value:
+            value = args[i + 1] if i + 1 < len(args) else ""
+
+        if option == "--mount":
+            fields = dict(f.partition("=")[::2] for f in value.split(","))
+            if fields.get("type") != "bind":
+                continue
+            source = fields.get("source") or fields.get("src")
+            target = (
+                fields.get("target") or fields.get("destination") or fields.get("dst")
+            )
+        else:
+            source, _, target = value.partition(":")
+            target = target.partition(":")[0]
+
+        if source and target and source.startswith("/"):
+            mounts[source] = target
+    return mounts
 
 
 # For the options that we're attempting to process and pass through,
 # see: https://cookiecutter.readthedocs.io/en/1.7.3/advanced/cli_options.html
 def prepare_cookiecutter_option_parser():
     parser = argparse.ArgumentParser()
-    parser.add_argument("--version", "-V", action="store_true")
-    parser.add_argument("--no-input", action="store_true")
-    parser.add_argument("--checkout", "-c")
-    parser.add_argument("--directory")
-    parser.add_argument("--verbose", "-v", action="store_true")
-    parser.add_argument("--replay", action="store_true")
-    parser.add_argument("--replay-file")
-    parser.add_argument("--overwrite-if-exists", "-f", action="store_true")
-    parser.add_argument("--skip-if-file-exists", "-s", action="store_true")
-    parser.add_argument("--output-dir", "-o")
-    parser.add_argument("--config-file")
-    parser.add_argument("--default-config", action="store_true")
-    parser.add_argument("--debug-file")
-    parser.add_argument("ITEM_AND_EXTRA", nargs=argparse.REMAINDER)
+    for option_strings, takes_value in CONST.CC_OPTIONS:
+        if takes_value:
+            parser.add_argument(*option_strings)
+        else:
+            parser.add_argument(*option_strings, action="store_true")
+    parser.add_argument(CONST.CC_ITEM_AND_EXTRA, nargs=argparse.REMAINDER)
     return parser
 
 
+# Compiled once and reused, since building the argparse parser dominates a single suggestion
+cookiecutter_option_parser = CompiledOptionParser(
+    CONST.CC_OPTIONS, CONST.CC_ITEM_AND_EXTRA, prepare_cookiecutter_option_parser
+)
+
+
 def parse_cookiecutter(args):
-    parser = prepare_cookiecutter_option_parser()
-    ns, _ = parser.parse_known_args(args)
+    ns, _ = cookiecutter_option_parser.parse_known_args(args)
 
     item = None
     if len(ns.ITEM_AND_EXTRA) > 0:
@@ -133,86 +202,230 @@ def get_root_basename(filepath):
     return posixpath.join("/", posixpath.basename(filepath))
 
 
-def get_from_path_map_quoted(path_map: pathmap.PathMap, path: str) -> str:
-    return quote_if_necessary(path_map.get_container_path(path))
+def get_from_path_map_quoted(
+    path_map: pathmap.PathMap, path: str, argv: bool = False
+) -> str:
+    container_path = path_map.get_container_path(path)
+    return container_path if argv else quote_if_necessary(container_path)
 
 
-def cookiecutter_to_docker_args(
-    args: "list[str]",
-    container_abs: str = "/h/abs",
-    container_rel: str = "/h/rel",
-    container_dd: str = "dd",
-):
+def parse_commandline(args: "list[str]"):
+    """
+    Split and parse a docker + cookiecutter commandline. Returns (docker image, extra docker
+    args, the user's bind mounts among them, parsed cookiecutter options, template sources,
+    extra context args).
+    """
     docker, cookiecutter = split_docker_from_cookiecutter(args)
 
-    _, docker_image, docker_extra = parse_docker(docker[1:])
-    cc_parsed, cc_template, cc_extra = parse_cookiecutter(cookiecutter[1:])
+    with instrumentation.stage("parse_docker"):
+        docker_mounts, docker_image, docker_extra = parse_docker(docker[1:])
+    with instrumentation.stage("parse_cookiecutter"):
+        cc_parsed, cc_template, cc_extra = parse_cookiecutter(cookiecutter[1:])
 
-    result = CONST.DOCKER_PREAMBLE + docker_extra + CONST.DOCKER_USER
+    with instrumentation.stage("decode_templates"):
+        cc_templates = template_sources(cc_template)
 
-    cc_templates = decode_template_sources(cc_template)
+    if not cc_parsed.output_dir:
+        cc_parsed.output_dir = "."
 
-    # Build up a path map of host-to-container paths we'll use for volume mounting and
-    # argument adjustments later
-    path_map_builder = pathmap.PathMapBuilder()
+    return docker_image, docker_extra, docker_mounts, cc_parsed, cc_templates, cc_extra
+
+
+def manifest_folder(manifest: TemplateManifest) -> str:
+    """
+    The folder of the manifest, checking that its local templates are all within it, so that
+    they can be mounted along with it (and found relative to it in the container).
+    """
+    folder = os.path.dirname(manifest.path) or "."
+    normalized_folder = pathmap.normalize_path(folder)
+    for source in manifest:
+        if is_fs_template(source.template) and not pathmap.is_at_or_below(
+            pathmap.normalize_path(source.template), normalized_folder
+        ):
+            raise ValueError(
+                "the local templates of a manifest must be within its folder, not "
+                + source.template
+            )
+    return folder
 
-    # Add the file-based template(s) to teh builder
-    for template_path in [
-        t.template for t in cc_templates if is_fs_template(t.template)
-    ]:
-        path_map_builder.add_path(template_path)
 
-    # Add the other path-based arguments to the builder
-    if not cc_parsed.output_dir:
-        cc_parsed.output_dir = "."
-    path_map_builder.add_path(cc_parsed.output_dir)
+def host_paths(cc_parsed, cc_templates: "list[TemplateSourceInfo]") -> "list[str]":
+    """The host paths the cookiecutter part of a commandline needs mapped into the container."""
+    # the file-based template(s)
+    if isinstance(cc_templates, TemplateManifest):
+        paths = [manifest_folder(cc_templates)]
+    else:
+        paths = [t.template for t in cc_templates if is_fs_template(t.template)]
+
+    # the other path-based arguments
+    paths.append(cc_parsed.output_dir)
 
     if cc_parsed.config_file:
-        path_map_builder.add_path(cc_parsed.config_file)
+        paths.append(cc_parsed.config_file)
 
     if cc_parsed.debug_file:
-        path_map_builder.add_path(cc_parsed.debug_file)
+        paths.append(cc_parsed.debug_file)
+
+    return paths
+
+
+@instrumentation.instrumented("cookiecutter_to_docker_args")
+def cookiecutter_to_docker_args(
+    args: "list[str]",
+    container_abs: str = "/h/abs",
+    container_rel: str = "/h/rel",
+    container_dd: str = "dd",
+    template_cache: str = None,
+    argv: bool = False,
+    cwd: str = None,
+    max_mounts: int = None,
+    min_mount_depth: int = pathmap.DEFAULT_MIN_MOUNT_DEPTH,
+    bytecode_cache: bool = False,
+):
+    """
+    Args:
+        args: the docker + cookiecutter commandline to transform
+        container_abs: the container folder under which absolute host paths will be mapped
+        container_rel: the container folder under which relative host paths will be mapped
+        container_dd: a folder name to use to stand in for ".."
+        template_cache: a docker volume name or host folder in which to cache remote
+            templates across runs (mounted, and passed to cookiecutters, when any of the
+            templates are remote)
+        argv: return the docker argv to execute as is (eg. with os.execvp), with the user and
+            the relative host paths resolved, instead of the tokens of a shell commandline
+        cwd: the folder relative host paths are resolved against for argv (default: the
+            current working directory)
+        max_mounts: if given, merge sibling mounts into common ancestors to need no more
+            than this many mounts (besides the user's own), where min_mount_depth allows
+        min_mount_depth: never merge mounts into a folder less than this many folders below
+            the root (or the current folder)
+        bytecode_cache: mount the template cache (and pass it to cookiecutters) even when
+            every template is local, to keep their compiled jinja bytecode across runs
+    """
+    (
+        docker_image,
+        docker_extra,
+        docker_mounts,
+        cc_parsed,
+        cc_templates,
+        cc_extra,
+    ) = parse_commandline(args)
+
+    if argv:
+        cwd = cwd or os.getcwd()
+    else:
+        cwd = None
+
+    result = CONST.DOCKER_PREAMBLE + docker_extra + docker_user_args(argv)
+
+    # Build up a path map of host-to-container paths we'll use for volume mounting and
+    # argument adjustments later
+    path_map_builder = pathmap.PathMapBuilder()
+    for path in host_paths(cc_parsed, cc_templates):
+        path_map_builder.add_path(path)
 
     # Now that we've accumulated all the paths we need, build the path map so we can look mounts
     # and mappings up
-    path_map = path_map_builder.build(container_abs, container_rel, container_dd)
+    with instrumentation.stage("build_path_map"):
+        # paths within the user's own mounts are mapped through those rather than mounted again
+        path_map = path_map_builder.build(
+            container_abs,
+            container_rel,
+            container_dd,
+            max_mounts,
+            min_mount_depth,
+            docker_mounts,
+        )
 
     # Add the mounts
-    for mount_host_path in path_map.get_mounts():
-        result.extend(
-            docker_mount_args(
-                mount_host_path, path_map.get_container_path(mount_host_path)
+    mount_args_start = len(result)
+    with instrumentation.stage("mount_args"):
+        for mount_host_path in path_map.get_mounts():
+            result.extend(
+                docker_mount_args(
+                    mount_host_path, path_map.get_container_path(mount_host_path), cwd
+                )
             )
-        )
 
     # volume mount for replay-file
     # This is a special case in that although cookiecutter docs indicate this is a supported
     # commandline option, it doesn't appear to actually be supported in latest...  so we can
     # fake it into existence by volume mount trickery knowing where the file ends up
     if cc_parsed.replay_file:
-        result.extend(docker_mount_args(cc_parsed.replay_file, CONST.CC_REPLAY_FILE))
-
-    # Handle containerizing the templates param
-    container_mapped_templates = []
-    for template_info in cc_templates:
-        # If it's a filesystem input, update to container-path
-        if is_fs_template(template_info.template):
-            container_mapped_templates.append(
-                TemplateSourceInfo(path_map.get_container_path(template_info.template))
-            )
-        else:
-            container_mapped_templates.append(template_info)
+        result.extend(
+            docker_mount_args(cc_parsed.replay_file, CONST.CC_REPLAY_FILE, cwd)
+        )
 
-    cc_template = encode_template_sources(container_mapped_templates)
+    # the template cache is only worth mounting if there's a template to fetch through it, or
+    # the bytecode of the templates is to be kept in it
+    use_template_cache = template_cache is not None and (
+        bytecode_cache or any(is_cacheable(t.template) for t in cc_templates)
+    )
+    if use_template_cache:
+        result.extend(docker_cache_mount_args(template_cache, cwd))
 
     # wrap up the docker portion with the image
     result.append(docker_image)
 
-    # Build up the cookiecutter(s) portion now
-    result.append(CONST.CC if len(cc_templates) < 2 else CONST.CCS)
+    if instrumentation.active is not None:
+        instrumentation.active.count(
+            "mounts_emitted", result[mount_args_start:].count("--mount")
+        )
+
+    # timed as a whole (mapping and quoting its paths included), rather than per quoted path
+    with instrumentation.stage("cookiecutter_args"):
+        result.extend(
+            cookiecutter_command_args(
+                cc_parsed, cc_templates, cc_extra, path_map, use_template_cache, argv
+            )
+        )
+    return result
+
+
+def cookiecutter_command_args(
+    cc_parsed,
+    cc_templates: "list[TemplateSourceInfo]",
+    cc_extra: "list[str]",
+    path_map: pathmap.PathMap,
+    use_template_cache: bool = False,
+    argv: bool = False,
+) -> "list[str]":
+    """The cookiecutter(s) commandline to run in the container, its paths mapped by path_map."""
+    if isinstance(cc_templates, TemplateManifest):
+        # its local templates are found relative to it, in the container as on the host
+        cc_template = TEMPLATES_CONST.MANIFEST_PREFIX + path_map.get_container_path(
+            cc_templates.path
+        )
+        if not argv:
+            cc_template = quote_if_necessary(cc_template)
+        # only cookiecutters reads manifests
+        result = [CONST.CCS]
+    else:
+        # Handle containerizing the templates param
+        container_mapped_templates = []
+        for template_info in cc_templates:
+            # If it's a filesystem input, update to container-path
+            if is_fs_template(template_info.template):
+                container_mapped_templates.append(
+                    TemplateSourceInfo(
+                        path_map.get_container_path(template_info.template)
+                    )
+                )
+            else:
+                container_mapped_templates.append(template_info)
+
+        with instrumentation.stage("encode_templates"):
+            cc_template = encode_template_sources(container_mapped_templates)
+
+        # Build up the cookiecutter(s) portion now (only cookiecutters knows about the cache)
+        result = [
+            CONST.CC if len(cc_templates) < 2 and not use_template_cache else CONST.CCS
+        ]
 
     # Add the output folder
-    result.extend(["-o", get_from_path_map_quoted(path_map, cc_parsed.output_dir)])
+    result.extend(
+        ["-o", get_from_path_map_quoted(path_map, cc_parsed.output_dir, argv)]
+    )
 
     # Handle all the flag args
     if cc_parsed.no_input:
@@ -235,12 +448,20 @@ def cookiecutter_to_docker_args(
         result.extend(["--directory", cc_parsed.directory])
     if cc_parsed.config_file:
         result.extend(
-            ["--config-file", get_from_path_map_quoted(path_map, cc_parsed.config_file)]
+            [
+                "--config-file",
+                get_from_path_map_quoted(path_map, cc_parsed.config_file, argv),
+            ]
         )
     if cc_parsed.debug_file:
         result.extend(
-            ["--debug-file", get_from_path_map_quoted(path_map, cc_parsed.debug_file)]
+            [
+                "--debug-file",
+                get_from_path_map_quoted(path_map, cc_parsed.debug_file, argv),
+            ]
         )
+    if use_template_cache:
+        result.extend(["--template-cache", CONST.CC_TEMPLATE_CACHE_DIR])
 
     # add the (possibly updated) template param
     if cc_template is not None and len(cc_template) > 0 and not cc_template.isspace():
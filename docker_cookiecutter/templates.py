@@ -1,4 +1,9 @@
-from dataclasses import dataclass
+import json
+import ntpath
+import os
+import posixpath
+import re
+from dataclasses import dataclass, fields, replace
 from typing import AnyStr
 
 
@@ -23,10 +28,22 @@ class CONST(object):
     COMPONENT_DELIM = ","
     CHECKOUT_PREFIX = "checkout="
     DIRECTORY_PREFIX = "directory="
+    # a templates argument of @FILE names a manifest file (see decode_template_manifest)
+    MANIFEST_PREFIX = "@"
+    ABBREVIATIONS = {
+        "gh": "https://github.com/{}.git",
+        "gl": "https://gitlab.com/{}.git",
+        "bb": "https://bitbucket.org/{}",
+    }
 
 
 CONST = CONST()
 
+# Same notion of a repository url as cookiecutter's
+REPO_URL_REGEX = re.compile(
+    r"((((git|hg)\+)?(git|ssh|file|https?):(//)?)|(\w+@[\w\.]+))"
+)
+
 
 def encode_template_sources(sources):
     templates = []
@@ -61,3 +78,155 @@ def decode_template_sources(template: str) -> "list[TemplateSourceInfo]":
             result.append(TemplateSourceInfo(template, checkout, directory))
 
     return result
+
+
+def encode_template_manifest(sources):
+    """Lazily yield the manifest line (see decode_template_manifest) of each source."""
+    for source in sources:
+        yield json.dumps(
+            {
+                field.name: getattr(source, field.name)
+                for field in fields(source)
+                if getattr(source, field.name)
+            }
+        ) + "\n"
+
+
+def decode_template_manifest(lines, base: str = None):
+    """
+    Lazily yield the TemplateSourceInfo of each line of a template manifest: a JSON object
+    with the "template" and optionally its "checkout" and "directory", or just the template
+    as a JSON string. Unlike the ,,-delimited encoding, any template (or directory) can be
+    given, commas and all. Blank lines are skipped. Relative local templates are relative to
+    base (the manifest's folder), when given.
+
+    Raises:
+        ValueError: at the first line that isn't a template source
+    """
+    for number, line in enumerate(lines, 1):
+        if len(line.strip()) == 0:
+            continue
+        try:
+            entry = json.loads(line)
+            if isinstance(entry, str):
+                entry = {"template": entry}
+            source = TemplateSourceInfo(**entry)
+        except (ValueError, TypeError) as e:
+            raise ValueError("template manifest line {}: {}".format(number, e))
+        if not isinstance(source.template, str) or len(source.template) == 0:
+            raise ValueError("template manifest line {}: no template".format(number))
+
+        if base and is_relative_fs_template(source.template):
+            source = replace(source, template=os.path.join(base, source.template))
+        yield source
+
+
+class TemplateManifest:
+    """
+    The template sources listed in a manifest file (see decode_template_manifest). Each
+    iteration reads the file afresh, a line at a time, so that the sources never need to all
+    be in memory at once.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def __iter__(self):
+        with open(self.path) as f:
+            yield from decode_template_manifest(f, os.path.dirname(self.path))
+
+    def __repr__(self) -> str:
+        return "TemplateManifest({!r})".format(self.path)
+
+
+def is_template_manifest(templates: str) -> bool:
+    return templates is not None and templates.startswith(CONST.MANIFEST_PREFIX)
+
+
+def template_sources(templates: str):
+    """
+    The template sources of a templates argument: a TemplateManifest for @FILE, otherwise
+    the list of its ,,-delimited sources.
+    """
+    if is_template_manifest(templates):
+        return TemplateManifest(templates[len(CONST.MANIFEST_PREFIX) :])
+    return decode_template_sources(templates)
+
+
+def is_fs_template(template: str) -> bool:
+    if template is None or template.isspace():
+        return False
+
+    if template.startswith("file://"):
+        return True
+
+    if (
+        "" == template
+        or "://" in template
+        or template.startswith("gh:")
+        or template.startswith("bb:")
+        or template.startswith("gl:")
+    ):
+        return False
+
+    return True
+
+
+def is_relative_fs_template(template: str) -> bool:
+    return (
+        is_fs_template(template)
+        and not template.startswith("file://")
+        and not posixpath.isabs(template)
+        and not ntpath.isabs(template)
+    )
+
+
+def expand_template_uri(template: str) -> str:
+    """Expand the gh: / gl: / bb: abbreviations the way cookiecutter does by default."""
+    prefix, sep, rest = template.partition(":")
+    if sep and prefix in CONST.ABBREVIATIONS:
+        return CONST.ABBREVIATIONS[prefix].format(rest)
+    return template
+
+
+def normalize_template_uri(template: str) -> str:
+    uri = expand_template_uri(template).strip().rstrip("/")
+    if uri.startswith("git+"):
+        uri = uri[len("git+") :]
+    if uri.endswith(".git"):
+        uri = uri[: -len(".git")]
+
+    scheme, sep, rest = uri.partition("://")
+    if sep:
+        host, slash, path = rest.partition("/")
+        uri = scheme.lower() + sep + host.lower() + slash + path
+    return uri
+
+
+def is_repo_url(template: str) -> bool:
+    """Whether the template is fetched from a url (a repository or zip), not a local path."""
+    if template is None:
+        return False
+    return bool(REPO_URL_REGEX.match(expand_template_uri(template)))
+
+
+def is_mercurial(uri: str) -> bool:
+    """
+    Whether cookiecutter clones the (expanded) uri with mercurial rather than git: when it says
+    hg+, or when it doesn't say git anywhere but is on bitbucket (eg. bb:org/repo).
+    """
+    if uri.startswith("hg+"):
+        return True
+    return not uri.startswith("git+") and "git" not in uri and "bitbucket" in uri
+
+
+def is_cacheable(template: str) -> bool:
+    """Only remote git repositories are cached (not local folders, zips or mercurial)."""
+    if template is None:
+        return False
+    uri = expand_template_uri(template)
+    return (
+        bool(REPO_URL_REGEX.match(uri))
+        and not is_mercurial(uri)
+        and not uri.lower().endswith(".zip")
+    )
@@ -1,16 +1,21 @@
 #!/bin/sh
 set -e
 
-if [ "$1" = 'cookiecutter' ]; then
+if [ "$1" = 'cookiecutter' ] || [ "$1" = 'cookiecutters' ]; then
     # Set up default output (as long as -o wasn't already provided on the commandline)
     OUT_FOLDER_ARG="-o /out"
     case "$@" in
     *" -o"*) OUT_FOLDER_ARG=;;
     esac
 
+    CMD="$1"
     shift
-    exec cookiecutter $OUT_FOLDER_ARG $CFG_FILE_ARG $@
-elif [ "$1" = 'suggest' ]; then
+    # cookiecutter has no incremental mode, but cookiecutters does the same for one template
+    case " $* " in
+    *" --incremental "*) CMD=cookiecutters;;
+    esac
+    exec $CMD $OUT_FOLDER_ARG $CFG_FILE_ARG $@
+elif [ "$1" = 'suggest' ] || [ "$1" = 'serve' ]; then
     # We're wanting suggestions to transform a candidate docker commandline
     exec docker_cookiecutter $@
 else
@@ -0,0 +1,42 @@
+import json
+
+
+def make_template(
+    root,
+    files,
+    name="template",
+    project="{{cookiecutter.project}}",
+    context=None,
+    hooks=None,
+):
+    """
+    A local template of the given files (str or bytes contents), in root / name, whose
+    cookiecutter.json has "project" (the project folder) and the rest of context, and whose
+    hooks folder has the given {file name: source}.
+    """
+    template = root / name
+    (template / project).mkdir(parents=True, exist_ok=True)
+    (template / "cookiecutter.json").write_text(
+        json.dumps(dict({"project": "proj"}, **(context or {})))
+    )
+    if hooks:
+        (template / "hooks").mkdir(exist_ok=True)
+        for hook, source in hooks.items():
+            (template / "hooks" / hook).write_text(source)
+    for relative, content in files.items():
+        path = template / project / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if isinstance(content, bytes):
+            path.write_bytes(content)
+        else:
+            path.write_text(content)
+    return str(template)
+
+
+def read_tree(root, read=lambda path: path.read_text()):
+    """{path relative to root: read(path)} of each file under root."""
+    return {
+        str(path.relative_to(root)): read(path)
+        for path in sorted(root.rglob("*"))
+        if path.is_file()
+    }
@@ -0,0 +1,103 @@
+import io
+import json
+
+import pytest
+from docker_cookiecutter import batch
+from docker_cookiecutter.suggest import cookiecutter_to_docker_args
+
+some_command = "docker run some:image cookiecutter -o /out /some/template"
+other_command = "docker run some:image cookiecutter 'with space/template'"
+
+
+class TrickleStream(io.StringIO):
+    """Hands back at most a few characters per read, like a slow pipe."""
+
+    def read(self, size=-1):
+        return super().read(3)
+
+
+@pytest.mark.parametrize(
+    "given,want",
+    [
+        pytest.param("a\0b\0", ["a", "b"], id="trailing delimiter"),
+        pytest.param("a\0b", ["a", "b"], id="no trailing delimiter"),
+        pytest.param("a\0\0b", ["a", "", "b"], id="empty record"),
+        pytest.param("", [], id="empty stream"),
+    ],
+)
+def test_read_records_null(given, want):
+    got = list(batch.read_records(TrickleStream(given), "\0"))
+    assert got == want
+
+
+def test_read_records_lines():
+    got = list(batch.read_records(io.StringIO("a b\r\nc\n\nd"), "\n"))
+    assert got == ["a b", "c", "", "d"]
+
+
+@pytest.mark.parametrize(
+    "fmt,given",
+    [
+        pytest.param(
+            batch.CONST.FORMAT_LINES,
+            some_command + "\n" + other_command + "\n",
+            id="lines",
+        ),
+        pytest.param(
+            batch.CONST.FORMAT_NULL,
+            some_command + "\0" + other_command + "\0",
+            id="null",
+        ),
+    ],
+)
+def test_suggest_batch_shell_formats(fmt, given):
+    out = io.StringIO()
+
+    exit_code = batch.suggest_batch(io.StringIO(given), out, io.StringIO(), fmt)
+
+    delimiter = "\0" if fmt == batch.CONST.FORMAT_NULL else "\n"
+    want = [
+        " ".join(cookiecutter_to_docker_args(some_command.split())),
+        " ".join(
+            cookiecutter_to_docker_args(
+                some_command.split()[:4] + ["with space/template"]
+            )
+        ),
+    ]
+    assert exit_code == 0
+    assert out.getvalue().split(delimiter)[:-1] == want
+
+
+def test_suggest_batch_jsonl():
+    given_args = some_command.split()
+    out = io.StringIO()
+
+    exit_code = batch.suggest_batch(
+        io.StringIO(json.dumps(given_args) + "\n"),
+        out,
+        io.StringIO(),
+        batch.CONST.FORMAT_JSONL,
+    )
+
+    assert exit_code == 0
+    assert json.loads(out.getvalue()) == cookiecutter_to_docker_args(given_args)
+
+
+def test_suggest_batch_bad_record_keeps_going():
+    out = io.StringIO()
+    err = io.StringIO()
+
+    exit_code = batch.suggest_batch(
+        io.StringIO(
+            "\ndocker run some:image cookiecutter --checkout\n" + some_command + "\n"
+        ),
+        out,
+        err,
+    )
+
+    got = out.getvalue().split("\n")
+    assert exit_code == 1
+    assert got[:2] == ["", ""]
+    assert got[2] == " ".join(cookiecutter_to_docker_args(some_command.split()))
+    assert err.getvalue().startswith("record 1:")
+    assert "record 2:" in err.getvalue()
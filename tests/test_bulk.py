@@ -0,0 +1,166 @@
+import io
+
+import jinja2
+import pytest
+from docker_cookiecutter import bulk
+from docker_cookiecutter import cookiecutters as cookiecutters_module
+from tests.conftest import make_template
+
+some_files = {
+    "a.txt": "{{cookiecutter.greeting}} from {{cookiecutter.project}}",
+    "b.txt": "{% for c in cookiecutter.project %}{{c}}{% endfor %}",
+}
+
+
+@pytest.mark.parametrize(
+    "given,fmt,want",
+    [
+        pytest.param(
+            "project,greeting\nx,hi\ny,yo\n",
+            "csv",
+            [{"project": "x", "greeting": "hi"}, {"project": "y", "greeting": "yo"}],
+            id="csv",
+        ),
+        pytest.param(
+            '{"project": "x"}\n\n{"project": "y", "greeting": "yo"}\n',
+            "jsonl",
+            [{"project": "x"}, {"project": "y", "greeting": "yo"}],
+            id="jsonl, blank lines skipped",
+        ),
+    ],
+)
+def test_read_contexts(given, fmt, want):
+    assert [dict(row) for row in bulk.read_contexts(io.StringIO(given), fmt)] == want
+
+
+def test_read_contexts_bad_jsonl_line_is_a_row():
+    got = list(bulk.read_contexts(io.StringIO('{"a": 1}\nnope\n'), "jsonl"))
+
+    assert got[0] == {"a": 1}
+    assert isinstance(got[1], ValueError)
+
+
+@pytest.mark.parametrize(
+    "given,want",
+    [
+        pytest.param("rows.csv", "csv", id="csv"),
+        pytest.param("rows.jsonl", "jsonl", id="jsonl"),
+        pytest.param("rows.txt", "jsonl", id="anything else"),
+    ],
+)
+def test_contexts_format(given, want):
+    assert bulk.contexts_format(given) == want
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_generates_each_row_into_its_folder(tmp_path, jobs):
+    template = make_template(tmp_path, some_files, context={"greeting": "hello"})
+    contexts = tmp_path / "rows.jsonl"
+    contexts.write_text('{"project": "x"}\n{"project": "y", "greeting": "yo"}\n')
+    out = tmp_path / "out"
+
+    got = bulk.bulk_cookiecutters(
+        template,
+        str(contexts),
+        row_dir="{index}-{project}",
+        jobs=jobs,
+        output_dir=str(out),
+        default_config=True,
+    )
+
+    assert got == [str(out / "1-x" / "x"), str(out / "2-y" / "y")]
+    assert (out / "1-x" / "x" / "a.txt").read_text() == "hello from x"
+    assert (out / "2-y" / "y" / "a.txt").read_text() == "yo from y"
+    assert (out / "2-y" / "y" / "b.txt").read_text() == "y"
+
+
+def test_failed_rows_dont_stop_the_others(tmp_path, caplog):
+    template = make_template(tmp_path, some_files, context={"greeting": "hello"})
+    contexts = tmp_path / "rows.jsonl"
+    contexts.write_text('{"project": "x"}\n[1, 2]\n{"project": "z"}\n')
+    out = tmp_path / "out"
+    caplog.set_level("INFO")
+
+    with pytest.raises(bulk.BulkGenerationError) as e:
+        bulk.bulk_cookiecutters(
+            template, str(contexts), output_dir=str(out), default_config=True
+        )
+
+    assert [index for index, _ in e.value.failures] == [2]
+    assert (out / "1" / "x" / "a.txt").exists()
+    assert (out / "3" / "z" / "a.txt").exists()
+    assert "row 2: failed: ValueError" in caplog.text
+    assert "Generated 2 of 3 rows (1 failed)" in caplog.text
+
+
+def test_template_files_are_compiled_once(tmp_path, mocker):
+    template = make_template(tmp_path, some_files, context={"greeting": "hello"})
+    contexts = tmp_path / "rows.csv"
+    contexts.write_text("project\n" + "\n".join("p" + str(i) for i in range(5)))
+    compile_spy = mocker.spy(jinja2.Environment, "compile")
+
+    bulk.bulk_cookiecutters(
+        template, str(contexts), output_dir=str(tmp_path / "out"), default_config=True
+    )
+
+    # (self, source, name, ...) - only files loaded through the loader have a name
+    names = [c[0][2] for c in compile_spy.call_args_list if len(c[0]) > 2]
+    assert sorted(names) == ["a.txt", "b.txt"]
+
+
+def test_worker_compiles_template_files_once(tmp_path, mocker):
+    template = make_template(tmp_path, some_files, context={"greeting": "hello"})
+    compile_spy = mocker.spy(jinja2.Environment, "compile")
+
+    # as each worker process does, in-process
+    bulk.load_worker_template({"repo_dir": template, "default_config": True}, None)
+    for index in range(1, 4):
+        bulk.generate_worker_row(
+            (index, {"project": "p"}, str(tmp_path / "out"), "{index}", {})
+        )
+
+    names = [c[0][2] for c in compile_spy.call_args_list if len(c[0]) > 2]
+    assert sorted(names) == ["a.txt", "b.txt"]
+    assert (tmp_path / "out" / "3" / "p" / "a.txt").exists()
+
+
+def test_rejects_several_templates(tmp_path):
+    with pytest.raises(ValueError):
+        bulk.bulk_cookiecutters("a,,b", str(tmp_path / "rows.csv"))
+
+
+def test_main_generates_contexts(tmp_path):
+    template = make_template(tmp_path, some_files, context={"greeting": "hello"})
+    contexts = tmp_path / "rows.csv"
+    contexts.write_text("project\nx\ny\n")
+    out = tmp_path / "out"
+
+    cookiecutters_module.main(
+        [
+            template,
+            "greeting=hey",
+            "--contexts",
+            str(contexts),
+            "--row-dir",
+            "{project}",
+            "--default-config",
+            "-o",
+            str(out),
+        ]
+    )
+
+    assert (out / "x" / "x" / "a.txt").read_text() == "hey from x"
+    assert (out / "y" / "y" / "a.txt").read_text() == "hey from y"
+
+
+def test_main_exits_when_rows_fail(tmp_path):
+    template = make_template(tmp_path, some_files, context={"greeting": "hello"})
+    contexts = tmp_path / "rows.jsonl"
+    contexts.write_text("nope\n")
+
+    with pytest.raises(SystemExit) as e:
+        cookiecutters_module.main(
+            [template, "--contexts", str(contexts), "-o", str(tmp_path / "out")]
+        )
+
+    assert e.value.code == "1 rows failed"
@@ -0,0 +1,115 @@
+import os
+
+import jinja2
+import pytest
+from docker_cookiecutter import bytecode
+from docker_cookiecutter import cookiecutters as cookiecutters_module
+from docker_cookiecutter.cookiecutters import cookiecutters
+from tests.conftest import make_template
+
+
+def compiled_files(compile_spy) -> "list[str]":
+    # (self, source, name, ...) - only files loaded through a loader have a name
+    return [c[0][2] for c in compile_spy.call_args_list if len(c[0]) > 2]
+
+
+def render(cache, source: str, name: str = "a.txt") -> str:
+    env = jinja2.Environment(
+        loader=jinja2.DictLoader({name: source}), bytecode_cache=cache
+    )
+    return env.get_template(name).render(x=1)
+
+
+def test_second_environment_loads_bytecode(tmp_path, mocker):
+    cache = bytecode.BytecodeCache(str(tmp_path))
+    compile_spy = mocker.spy(jinja2.Environment, "compile")
+
+    got = [render(cache, "{{x}}!"), render(cache, "{{x}}!")]
+
+    assert got == ["1!", "1!"]
+    assert compiled_files(compile_spy) == ["a.txt"]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+@pytest.mark.parametrize(
+    "given_source,given_name,given_env",
+    [
+        pytest.param("{{x}}?", "a.txt", {}, id="edited content"),
+        pytest.param("{{x}}!", "b.txt", {}, id="other name"),
+        pytest.param("{{x}}!", "a.txt", {"trim_blocks": True}, id="other settings"),
+    ],
+)
+def test_keyed_on_content_and_settings(
+    tmp_path, mocker, given_source, given_name, given_env
+):
+    cache = bytecode.BytecodeCache(str(tmp_path))
+    render(cache, "{{x}}!")
+    compile_spy = mocker.spy(jinja2.Environment, "compile")
+
+    env = jinja2.Environment(
+        loader=jinja2.DictLoader({given_name: given_source}),
+        bytecode_cache=cache,
+        **given_env
+    )
+    env.get_template(given_name)
+
+    assert compiled_files(compile_spy) == [given_name]
+    assert cache.stats()["entries"] == 2
+
+
+def test_evicts_least_recently_used_beyond_max_bytes(tmp_path):
+    cache = bytecode.BytecodeCache(str(tmp_path))
+    for i in range(3):
+        render(cache, "{{x}}" + str(i))
+    entries = sorted(cache.entries())
+    for age, (path, _, _) in enumerate(entries):
+        os.utime(path, (1000 + age, 1000 + age))
+    cache.max_bytes = sum(size for _, size, _ in entries[1:])
+
+    assert cache.evict() == 1
+    assert sorted(cache.entries())[0][0] == entries[1][0]
+
+
+def test_evicts_unused_beyond_max_age(tmp_path):
+    cache = bytecode.BytecodeCache(str(tmp_path), max_age=60)
+    render(cache, "{{x}}")
+
+    assert cache.evict(now=cache.entries()[0][2] + 61) == 1
+    assert cache.stats()["entries"] == 0
+
+
+def test_cookiecutters_compiles_through_cache(tmp_path, mocker):
+    template = make_template(tmp_path, {"a.txt": "{{cookiecutter.project}}!"})
+    cache = bytecode.BytecodeCache(str(tmp_path / "bytecode"))
+    compile_spy = mocker.spy(jinja2.Environment, "compile")
+
+    for run in range(2):
+        cookiecutters(
+            template,
+            bytecode_cache=cache,
+            no_input=True,
+            default_config=True,
+            output_dir=str(tmp_path / ("out" + str(run))),
+        )
+
+    assert compiled_files(compile_spy) == ["a.txt"]
+    assert (tmp_path / "out1" / "proj" / "a.txt").read_text() == "proj!"
+
+
+def test_main_keeps_bytecode_in_template_cache(tmp_path):
+    template = make_template(tmp_path, {"a.txt": "{{cookiecutter.project}}!"})
+    cache_dir = tmp_path / "cache"
+
+    cookiecutters_module.main(
+        [
+            template,
+            "--no-input",
+            "--default-config",
+            "--template-cache",
+            str(cache_dir),
+            "-o",
+            str(tmp_path / "out"),
+        ]
+    )
+
+    assert len(os.listdir(bytecode.bytecode_dir(str(cache_dir)))) == 1
@@ -0,0 +1,251 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+from docker_cookiecutter import cache
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, reason="needs git")
+
+
+def git(*args, cwd=None):
+    return subprocess.run(
+        ("git",) + args,
+        cwd=cwd,
+        check=True,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    ).stdout.strip()
+
+
+class Remote:
+    """A local bare repository standing in for a remote template repository."""
+
+    def __init__(self, root):
+        self.bare = str(root / "remote.git")
+        self.work = str(root / "work")
+        git("init", "--quiet", "--bare", self.bare)
+        git("clone", "--quiet", self.bare, self.work)
+        git("config", "user.email", "test@example.com", cwd=self.work)
+        git("config", "user.name", "test", cwd=self.work)
+        self.url = "file://" + self.bare
+
+    def commit(self, files):
+        for relative, content in files.items():
+            path = os.path.join(self.work, relative)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write(content)
+        git("add", "-A", cwd=self.work)
+        git("commit", "--quiet", "-m", "commit", cwd=self.work)
+        git("push", "--quiet", "origin", "HEAD", cwd=self.work)
+        return git("rev-parse", "HEAD", cwd=self.work)
+
+
+@pytest.fixture
+def remote(tmp_path):
+    return Remote(tmp_path)
+
+
+@pytest.fixture
+def sut(tmp_path):
+    return cache.TemplateCache(str(tmp_path / "cache"))
+
+
+def test_fetch_miss_then_hit(remote, sut):
+    remote.commit({"cookiecutter.json": "{}"})
+
+    first = sut.fetch(remote.url)
+    second = sut.fetch(remote.url)
+
+    assert first == second
+    assert os.path.isfile(os.path.join(first, "cookiecutter.json"))
+    assert not os.path.exists(os.path.join(first, ".git"))
+    stats = sut.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+
+def test_fetch_revalidates_against_remote_head(remote, sut):
+    remote.commit({"cookiecutter.json": "1"})
+    first = sut.fetch(remote.url)
+    remote.commit({"cookiecutter.json": "2"})
+
+    second = sut.fetch(remote.url)
+
+    assert first != second
+    with open(os.path.join(second, "cookiecutter.json")) as f:
+        assert f.read() == "2"
+    assert sut.stats()["misses"] == 2
+
+
+def test_fetch_without_revalidation_reuses_entry(remote, tmp_path):
+    remote.commit({"cookiecutter.json": "1"})
+    first = cache.TemplateCache(str(tmp_path / "cache")).fetch(remote.url)
+    remote.commit({"cookiecutter.json": "2"})
+
+    second = cache.TemplateCache(str(tmp_path / "cache"), revalidate=False).fetch(
+        remote.url
+    )
+
+    assert first == second
+
+
+def test_fetch_checkout(remote, sut):
+    first_commit = remote.commit({"cookiecutter.json": "1"})
+    git("tag", "v1", cwd=remote.work)
+    git("push", "--quiet", "origin", "v1", cwd=remote.work)
+    remote.commit({"cookiecutter.json": "2"})
+
+    by_tag = sut.fetch(remote.url, "v1")
+    by_commit = sut.fetch(remote.url, first_commit)
+
+    assert by_tag == by_commit
+    with open(os.path.join(by_tag, "cookiecutter.json")) as f:
+        assert f.read() == "1"
+
+
+def test_fetch_offline_falls_back_to_cached(remote, sut):
+    remote.commit({"cookiecutter.json": "1"})
+    first = sut.fetch(remote.url)
+    shutil.rmtree(remote.bare)
+
+    assert sut.fetch(remote.url) == first
+
+
+def test_fetch_unknown_remote_raises(tmp_path, sut):
+    with pytest.raises(cache.TemplateCacheError):
+        sut.fetch("file://" + str(tmp_path / "nowhere.git"))
+
+
+def test_evict_least_recently_used_beyond_max_bytes(remote, tmp_path):
+    sut = cache.TemplateCache(str(tmp_path / "cache"), max_bytes=1500)
+    paths = []
+    for i in range(3):
+        remote.commit({"cookiecutter.json": str(i) * 1000})
+        paths.append(sut.fetch(remote.url))
+    sut.fetch(remote.url, git("rev-parse", "HEAD~2", cwd=remote.work))
+
+    evicted = sut.evict()
+
+    assert evicted == 2
+    assert [os.path.exists(p) for p in paths] == [True, False, False]
+    assert sut.stats()["evictions"] == 2
+
+
+def test_evict_older_than_max_age(remote, tmp_path):
+    sut = cache.TemplateCache(str(tmp_path / "cache"), max_age=60)
+    remote.commit({"cookiecutter.json": "1"})
+    path = sut.fetch(remote.url)
+
+    assert sut.evict() == 0
+    assert sut.evict(now=os.path.getmtime(path) + 3600) == 1
+    assert not os.path.exists(path)
+
+
+def test_evict_entry_evicted_concurrently(remote, tmp_path):
+    sut = cache.TemplateCache(str(tmp_path / "cache"), max_age=60)
+    remote.commit({"cookiecutter.json": "1"})
+    path = sut.fetch(remote.url)
+    entries = sut.entries()
+    # another run sharing the cache evicts it between our listing it and removing it
+    os.remove(path + ".json")
+    sut.entries = lambda: entries
+
+    assert sut.evict(now=os.path.getmtime(path) + 3600) == 0
+    assert not os.path.exists(path)
+
+
+def test_hits_and_misses_dont_read_the_entries(remote, sut, mocker):
+    remote.commit({"cookiecutter.json": "{}"})
+    sut.fetch(remote.url)
+    entries = mocker.spy(sut, "entries")
+
+    sut.update_stats(hits=1)
+
+    assert entries.call_count == 0
+    assert sut.read_counts() == {"hits": 1, "misses": 1, "evictions": 0}
+
+
+@pytest.fixture
+def monorepo(remote):
+    remote.commit({"old/cookiecutter.json": "old"})
+    commit = remote.commit(
+        {
+            "templates/a/cookiecutter.json": "a",
+            "templates/a/{{cookiecutter.name}}/README": "a",
+            "templates/b/cookiecutter.json": "b",
+        }
+    )
+    git("config", "uploadpack.allowFilter", "true", cwd=remote.bare)
+    return remote, commit
+
+
+def test_shallow_fetch_only_the_directory(monorepo, tmp_path):
+    remote, commit = monorepo
+    repo_dir = str(tmp_path / "fetched")
+
+    got = cache.shallow_fetch(remote.url, repo_dir, directories=["templates/a"])
+
+    assert got == commit
+    assert sorted(os.listdir(repo_dir)) == [".git", "templates"]
+    assert os.listdir(os.path.join(repo_dir, "templates")) == ["a"]
+    assert git("rev-list", "--count", "HEAD", cwd=repo_dir) == "1"
+    # the blobs outside the directory were never downloaded
+    objects = git("rev-list", "--objects", "--missing=print", "HEAD", cwd=repo_dir)
+    missing = {line[1:] for line in objects.splitlines() if line.startswith("?")}
+    outside = ("old/cookiecutter.json", "templates/b/cookiecutter.json")
+    assert missing == {git("rev-parse", "HEAD:" + p, cwd=remote.work) for p in outside}
+
+
+@pytest.mark.parametrize(
+    "checkout",
+    [
+        pytest.param(lambda commit: commit, id="commit"),
+        pytest.param(lambda commit: commit[:10], id="abbreviated commit"),
+        pytest.param(lambda commit: "v1", id="tag"),
+    ],
+)
+def test_shallow_fetch_checkout(monorepo, tmp_path, checkout):
+    remote, commit = monorepo
+    git("tag", "v1", cwd=remote.work)
+    git("push", "--quiet", "origin", "v1", cwd=remote.work)
+    remote.commit({"templates/a/cookiecutter.json": "newer"})
+    repo_dir = str(tmp_path / "fetched")
+
+    got = cache.shallow_fetch(remote.url, repo_dir, checkout(commit), ["templates/a"])
+
+    assert got == commit
+    with open(os.path.join(repo_dir, "templates", "a", "cookiecutter.json")) as f:
+        assert f.read() == "a"
+
+
+def test_shallow_fetch_without_checkout_raises_git_error(remote, tmp_path):
+    # nothing was ever committed, so the remote has no HEAD to fetch
+    with pytest.raises(cache.TemplateCacheError, match="git fetch failed"):
+        cache.shallow_fetch(remote.url, str(tmp_path / "fetched"))
+
+
+def test_fetch_directories_are_part_of_the_entry(monorepo, sut):
+    remote, _ = monorepo
+
+    a = sut.fetch(remote.url, directories=["/templates/a/"])
+    both = sut.fetch(remote.url, directories=["templates/b", "templates/a"])
+    whole = sut.fetch(remote.url)
+
+    assert len({a, both, whole}) == 3
+    assert os.listdir(os.path.join(a, "templates")) == ["a"]
+    assert sorted(os.listdir(os.path.join(both, "templates"))) == ["a", "b"]
+    assert "old" not in os.listdir(both)
+    assert "old" in os.listdir(whole)
+    assert sut.fetch(remote.url, directories=["templates/a"]) == a
+    assert sut.fetch(remote.url, directories=["templates/a", ""]) == whole
+    assert sut.stats()["hits"] == 2
+
+
+def test_relative_root_is_made_absolute(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    got = cache.TemplateCache("cache")
+
+    assert got.entries_dir == str(tmp_path / "cache" / "entries")
+    assert got.tmp_dir == str(tmp_path / "cache" / "tmp")
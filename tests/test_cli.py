@@ -0,0 +1,209 @@
+import os
+import subprocess
+import sys
+import tempfile
+
+import pytest
+from docker_cookiecutter import cli, suggest
+from docker_cookiecutter.memo import CONST as MEMO_CONST
+
+SUGGEST_ARGS = "suggest docker run img cookiecutter -o ../out /some/template".split()
+
+# generous, so that slow CI machines pass, but well short of importing cookiecutter/jinja2
+IMPORT_BUDGET_US = 60000
+
+# only needed for generation, serving or caching, never for a suggestion
+NOT_FOR_SUGGEST = [
+    "cookiecutter",
+    "jinja2",
+    "requests",
+    "concurrent.futures",
+    "docker_cookiecutter.cache",
+    "docker_cookiecutter.cookiecutters",
+    "docker_cookiecutter.incremental",
+    "docker_cookiecutter.server",
+]
+
+
+@pytest.fixture(autouse=True)
+def memo_dir(tmp_path, monkeypatch):
+    memo_dir = tmp_path / "memo"
+    monkeypatch.setenv(MEMO_CONST.DIR_ENV, str(memo_dir))
+    return memo_dir
+
+
+def import_times(args: "list[str]", memo_dir: str = None) -> "list[tuple[str, int]]":
+    """
+    (module, self time in us) for each module imported by running the cli with args, with the
+    suggest memo in memo_dir (by default, a new one, so that nothing is memoized yet).
+    """
+    with tempfile.TemporaryDirectory() as new_memo_dir:
+        env = dict(os.environ)
+        env[MEMO_CONST.DIR_ENV] = memo_dir or new_memo_dir
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-m", "docker_cookiecutter.cli"]
+            + args,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            stdin=subprocess.DEVNULL,
+            universal_newlines=True,
+            check=True,
+            env=env,
+        )
+    times = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:") :].split("|")
+        times.append((name.strip(), int(self_us)))
+    return times
+
+
+def package_import_time(times) -> int:
+    """The time spent importing from the first docker_cookiecutter module on."""
+    names = [name for name, _ in times]
+    first = names.index("docker_cookiecutter")
+    return sum(us for _, us in times[first:])
+
+
+@pytest.fixture(scope="module")
+def suggest_import_times():
+    return [import_times(SUGGEST_ARGS) for _ in range(3)]
+
+
+def test_suggest_imports_only_what_it_needs(suggest_import_times):
+    imported = {name for name, _ in suggest_import_times[0]}
+
+    assert "docker_cookiecutter.suggest" in imported
+    for module in NOT_FOR_SUGGEST:
+        assert module not in imported
+
+
+def test_suggest_import_time_budget(suggest_import_times):
+    assert (
+        min(package_import_time(times) for times in suggest_import_times)
+        < IMPORT_BUDGET_US
+    )
+
+
+def test_memoized_suggest_imports_no_suggest(memo_dir):
+    first = {name for name, _ in import_times(SUGGEST_ARGS, str(memo_dir))}
+    again = {name for name, _ in import_times(SUGGEST_ARGS, str(memo_dir))}
+
+    assert "docker_cookiecutter.suggest" in first
+    assert "docker_cookiecutter.memo" in again
+    assert "docker_cookiecutter.suggest" not in again
+
+
+def test_batch_imports_only_what_it_needs():
+    imported = {name for name, _ in import_times(["suggest", "--jsonl"])}
+
+    assert "docker_cookiecutter.batch" in imported
+    for module in NOT_FOR_SUGGEST:
+        assert module not in imported
+
+
+def test_print0_writes_nul_terminated_argv(capsys, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    cli.main(["suggest", "--print0"] + SUGGEST_ARGS[1:])
+
+    got = capsys.readouterr().out.split("\0")
+    assert got[-1] == "", "every arg is NUL terminated"
+    assert got[:4] == ["docker", "run", "-it", "--rm"]
+    assert (
+        "type=bind,source={},target=/h/rel/out".format(tmp_path.parent / "out") in got
+    )
+    assert not any("$(" in arg or "'" in arg for arg in got)
+
+
+def test_exec_replaces_process_with_docker(mocker):
+    mocked_execvp = mocker.patch("os.execvp")
+
+    cli.main(["--exec"] + SUGGEST_ARGS[1:])
+
+    file, argv = mocked_execvp.call_args[0]
+    assert file == "docker"
+    assert argv[:4] == ["docker", "run", "-it", "--rm"]
+
+
+@pytest.mark.parametrize(
+    "given",
+    [
+        pytest.param(["--exec", "--print0"], id="exec and print0"),
+        pytest.param(["--batch", "--print0"], id="batch"),
+        pytest.param(["--timings", "--exec"], id="timings and exec"),
+    ],
+)
+def test_conflicting_output_options(given):
+    with pytest.raises(SystemExit):
+        cli.parse_suggest_options(given + SUGGEST_ARGS[1:])
+
+
+def test_mount_budget_options():
+    got = cli.parse_suggest_options(
+        ["--max-mounts", "3", "--min-mount-depth", "2"] + SUGGEST_ARGS[1:]
+    )
+
+    assert got[4] == {"max_mounts": 3, "min_mount_depth": 2}
+
+
+def test_bytecode_cache_option():
+    got = cli.parse_suggest_options(
+        ["--template-cache", "cc", "--bytecode-cache"] + SUGGEST_ARGS[1:]
+    )
+
+    assert got[4] == {"template_cache": "cc", "bytecode_cache": True}
+    with pytest.raises(SystemExit):
+        cli.parse_suggest_options(["--bytecode-cache"] + SUGGEST_ARGS[1:])
+
+
+@pytest.mark.parametrize(
+    "given,want_files,want_calls",
+    [
+        pytest.param([], 1, 0, id="memoized"),
+        pytest.param(["--no-cache"], 0, 1, id="no cache"),
+    ],
+)
+def test_suggest_memo(capsys, mocker, memo_dir, given, want_files, want_calls):
+    args = SUGGEST_ARGS[:1] + given + SUGGEST_ARGS[1:]
+    cli.main(args)
+    first = capsys.readouterr().out
+    suggest_spy = mocker.spy(suggest, "cookiecutter_to_docker_args")
+
+    cli.main(args)
+
+    assert capsys.readouterr().out == first
+    assert suggest_spy.call_count == want_calls
+    files = os.listdir(str(memo_dir)) if memo_dir.exists() else []
+    assert len(files) == want_files
+
+
+def test_suggest_memo_sees_manifest_edits(capsys, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "proj").mkdir()
+    manifest = tmp_path / "proj" / "m.jsonl"
+    manifest.write_text('"t"\n')
+    args = "suggest docker run img cookiecutters @proj/m.jsonl".split()
+    cli.main(args)
+    capsys.readouterr()
+
+    with manifest.open("a") as f:
+        f.write('"../elsewhere"\n')
+    with pytest.raises(SystemExit) as e:
+        cli.main(args)
+
+    assert str(e.value) == (
+        "the local templates of a manifest must be within its folder, not proj/../elsewhere"
+    )
+
+
+def test_run_reports_unsupported_docker_host(monkeypatch):
+    monkeypatch.setenv("DOCKER_HOST", "tcp://127.0.0.1:2375")
+
+    with pytest.raises(SystemExit) as e:
+        cli.main(["run"])
+
+    assert str(e.value) == (
+        "only unix:// docker hosts are supported, not tcp://127.0.0.1:2375"
+    )
@@ -1,7 +1,12 @@
+import json
+import os
 from unittest.mock import call
 
 import pytest
-from docker_cookiecutter.cookiecutters import cookiecutters
+from docker_cookiecutter import cookiecutters as cookiecutters_module
+from docker_cookiecutter.cache import TemplateCacheError
+from docker_cookiecutter.cookiecutters import CookiecuttersError, cookiecutters
+from tests.conftest import make_template, read_tree
 
 
 @pytest.mark.parametrize(
@@ -22,3 +27,475 @@ def test_calls_cookiecutter_once_per_template(mocker, given, want_templates):
 
     mocked_cookiecutter.assert_has_calls(expected_calls)
     assert result is not None
+
+
+@pytest.mark.parametrize(
+    "given_files,given_on_conflict,want_tree",
+    [
+        pytest.param(
+            [{"a.txt": "1"}, {"b.txt": "2"}, {"c.txt": "3"}],
+            cookiecutters_module.CONST.ON_CONFLICT_ERROR,
+            {"proj/a.txt": "1", "proj/b.txt": "2", "proj/c.txt": "3"},
+            id="disjoint",
+        ),
+        pytest.param(
+            [{"a.txt": "1"}, {"a.txt": "2"}, {"a.txt": "3"}],
+            cookiecutters_module.CONST.ON_CONFLICT_OVERWRITE,
+            {"proj/a.txt": "3"},
+            id="overlap - overwrite - last wins",
+        ),
+        pytest.param(
+            [{"a.txt": "1"}, {"a.txt": "2", "b.txt": "2"}],
+            cookiecutters_module.CONST.ON_CONFLICT_SKIP,
+            {"proj/a.txt": "1", "proj/b.txt": "2"},
+            id="overlap - skip - first wins",
+        ),
+    ],
+)
+def test_concurrent_generation(tmp_path, given_files, given_on_conflict, want_tree):
+    templates = ",,".join(
+        make_template(tmp_path / "templates", files, name="t" + str(i))
+        for i, files in enumerate(given_files)
+    )
+    out = tmp_path / "out"
+
+    result = cookiecutters(
+        templates,
+        jobs=2,
+        on_conflict=given_on_conflict,
+        no_input=True,
+        output_dir=str(out),
+    )
+
+    assert result == [str(out / "proj")] * len(given_files)
+    assert read_tree(out) == want_tree
+    assert [p.name for p in out.iterdir()] == ["proj"], "staging folders are removed"
+
+
+def test_concurrent_generation_collects_failures(tmp_path):
+    templates = ",,".join(
+        [
+            make_template(tmp_path / "templates", {"a.txt": "1"}, name="t0"),
+            str(tmp_path / "does-not-exist"),
+            make_template(tmp_path / "templates", {"a.txt": "2"}, name="t2"),
+            make_template(tmp_path / "templates", {"b.txt": "3"}, name="t3"),
+        ]
+    )
+    out = tmp_path / "out"
+
+    with pytest.raises(cookiecutters_module.CookiecuttersError) as e:
+        cookiecutters(templates, jobs=3, no_input=True, output_dir=str(out))
+
+    failed = [source.template for source, _ in e.value.failures]
+    assert failed == templates.split(",,")[1:3]
+    assert isinstance(
+        e.value.failures[1][1], cookiecutters_module.OutputConflictError
+    ), "overlap fails by default"
+    assert read_tree(out) == {"proj/a.txt": "1", "proj/b.txt": "3"}
+
+
+def test_concurrent_generation_requires_no_input(tmp_path):
+    with pytest.raises(ValueError):
+        cookiecutters("a,,b", jobs=2)
+
+
+def test_main_passes_options_through(mocker):
+    mocked_cookiecutter = mocker.patch(
+        "docker_cookiecutter.cookiecutters.cookiecutter", return_value="ignored"
+    )
+
+    cookiecutters_module.main(
+        ["-o", "/out", "--no-input", "-f", "a,checkout=v1,,b", "k=v"]
+    )
+
+    assert mocked_cookiecutter.call_count == 2
+    first_args, first_kwargs = mocked_cookiecutter.call_args_list[0]
+    assert first_args == ("a",)
+    assert first_kwargs["checkout"] == "v1"
+    assert first_kwargs["output_dir"] == "/out"
+    assert first_kwargs["no_input"] is True
+    assert first_kwargs["overwrite_if_exists"] is True
+    assert first_kwargs["extra_context"] == {"k": "v"}
+    assert "checkout" not in mocked_cookiecutter.call_args_list[1][1]
+
+
+def test_fetches_remote_templates_through_cache(mocker):
+    mocked_cookiecutter = mocker.patch(
+        "docker_cookiecutter.cookiecutters.cookiecutter", return_value="ignored"
+    )
+    template_cache = mocker.Mock()
+    template_cache.fetch.return_value = "/cache/entries/abc"
+
+    cookiecutters(
+        "gh:org/repo,checkout=v1,directory=sub,,/local/template",
+        template_cache=template_cache,
+    )
+
+    template_cache.fetch.assert_called_once_with("gh:org/repo", "v1", ["sub"])
+    mocked_cookiecutter.assert_has_calls(
+        [call("/cache/entries/abc", directory="sub"), call("/local/template")]
+    )
+
+
+def test_remote_directory_fetched_sparsely_without_cache(mocker):
+    mocked_cookiecutter = mocker.patch(
+        "docker_cookiecutter.cookiecutters.cookiecutter", return_value="ignored"
+    )
+    mocked_fetch = mocker.patch(
+        "docker_cookiecutter.cookiecutters.TemplateCache.fetch",
+        return_value="/tmp/entries/abc",
+    )
+
+    cookiecutters("gh:org/repo,directory=sub,,gh:org/other")
+
+    assert mocked_fetch.call_args_list == [
+        call("gh:org/repo", None, ["sub"]),
+        call("gh:org/other", None, None),
+    ]
+    mocked_cookiecutter.assert_has_calls(
+        [call("/tmp/entries/abc", directory="sub"), call("/tmp/entries/abc")]
+    )
+
+
+def test_remote_without_directory_is_cloned_by_cookiecutter(mocker):
+    mocked_cookiecutter = mocker.patch(
+        "docker_cookiecutter.cookiecutters.cookiecutter", return_value="ignored"
+    )
+    mocked_fetch = mocker.patch("docker_cookiecutter.cookiecutters.TemplateCache.fetch")
+
+    cookiecutters("gh:org/repo,,/local,directory=sub")
+
+    mocked_fetch.assert_not_called()
+    mocked_cookiecutter.assert_has_calls(
+        [call("gh:org/repo"), call("/local", directory="sub")]
+    )
+
+
+def test_sources_sharing_a_repository_are_fetched_once(mocker, caplog):
+    mocked_cookiecutter = mocker.patch(
+        "docker_cookiecutter.cookiecutters.cookiecutter", return_value="ignored"
+    )
+    template_cache = mocker.Mock()
+    template_cache.fetch.side_effect = lambda template, checkout, directories: (
+        "/cache/" + template + "@" + str(checkout)
+    )
+    caplog.set_level("INFO", logger="docker_cookiecutter.cookiecutters")
+
+    cookiecutters(
+        "gh:org/mono,directory=a,,https://github.com/org/mono.git,directory=b,,"
+        "gh:org/mono,checkout=v1,directory=a,,/local",
+        template_cache=template_cache,
+    )
+
+    assert template_cache.fetch.call_args_list == [
+        call("gh:org/mono", None, ["a", "b"]),
+        call("gh:org/mono", "v1", ["a"]),
+    ]
+    mocked_cookiecutter.assert_has_calls(
+        [
+            call("/cache/gh:org/mono@None", directory="a"),
+            call("/cache/gh:org/mono@None", directory="b"),
+            call("/cache/gh:org/mono@v1", directory="a"),
+            call("/local"),
+        ]
+    )
+    assert "1 fetches saved" in caplog.text
+
+
+def test_shared_fetch_of_whole_repository_when_any_source_needs_it(mocker):
+    mocker.patch(
+        "docker_cookiecutter.cookiecutters.cookiecutter", return_value="ignored"
+    )
+    template_cache = mocker.Mock()
+
+    cookiecutters("gh:org/mono,directory=a,,gh:org/mono", template_cache=template_cache)
+
+    template_cache.fetch.assert_called_once_with("gh:org/mono", None, None)
+
+
+def write_manifest(tmp_path, lines) -> str:
+    path = tmp_path / "templates.jsonl"
+    path.write_text("\n".join(json.dumps(line) for line in lines))
+    return "@" + str(path)
+
+
+def test_manifest_streams_fetch_and_generation(tmp_path, mocker):
+    order = []
+    mocked_cookiecutter = mocker.patch(
+        "docker_cookiecutter.cookiecutters.cookiecutter",
+        side_effect=lambda template, **kwargs: order.append(("generate", template)),
+    )
+    template_cache = mocker.Mock()
+    template_cache.fetch.side_effect = lambda template, checkout, directories: (
+        order.append(("fetch", template)) or "/cache/" + template
+    )
+    manifest = write_manifest(
+        tmp_path,
+        [
+            {"template": "gh:org/mono", "directory": "a,b"},
+            "local",
+            {"template": "gh:org/mono", "directory": "a,b"},
+            {"template": "gh:org/other", "checkout": "v1"},
+        ],
+    )
+
+    cookiecutters(manifest, template_cache=template_cache)
+
+    assert order == [
+        ("fetch", "gh:org/mono"),
+        ("generate", "/cache/gh:org/mono"),
+        ("generate", str(tmp_path / "local")),
+        ("generate", "/cache/gh:org/mono"),
+        ("fetch", "gh:org/other"),
+        ("generate", "/cache/gh:org/other"),
+    ]
+    assert template_cache.fetch.call_args_list[0] == call("gh:org/mono", None, ["a,b"])
+    assert mocked_cookiecutter.call_args_list[0] == call(
+        "/cache/gh:org/mono", directory="a,b"
+    )
+
+
+def test_manifest_stops_reading_at_failure(tmp_path, mocker):
+    mocker.patch(
+        "docker_cookiecutter.cookiecutters.cookiecutter",
+        side_effect=[None, ValueError("boom")],
+    )
+    read = []
+    manifest = cookiecutters_module.TemplateManifest(
+        write_manifest(tmp_path, ["/a", "/b", "/c"])[1:]
+    )
+    decode = cookiecutters_module.TemplateManifest.__iter__
+
+    def recording_iter(self):
+        for source in decode(self):
+            read.append(source.template)
+            yield source
+
+    mocker.patch.object(
+        cookiecutters_module.TemplateManifest, "__iter__", recording_iter
+    )
+
+    with pytest.raises(ValueError):
+        cookiecutters("@" + manifest.path)
+
+    assert read == ["/a", "/b"], "the rest of the manifest is never read"
+
+
+def test_manifest_without_cache_fetches_through_run_cache(tmp_path, mocker):
+    mocker.patch(
+        "docker_cookiecutter.cookiecutters.cookiecutter", return_value="ignored"
+    )
+    mocked_fetch = mocker.patch(
+        "docker_cookiecutter.cookiecutters.TemplateCache.fetch",
+        return_value="/tmp/entries/abc",
+    )
+
+    cookiecutters(write_manifest(tmp_path, ["gh:org/repo", "gh:org/repo"]))
+
+    mocked_fetch.assert_called_once_with("gh:org/repo", None, None)
+
+
+def test_manifest_with_jobs(tmp_path, mocker):
+    mocked_cookiecutter = mocker.patch(
+        "docker_cookiecutter.cookiecutters.cookiecutter", return_value="ignored"
+    )
+    mocked_generate = mocker.patch(
+        "docker_cookiecutter.cookiecutters.generate_via_staging",
+        return_value=["a", "b"],
+    )
+
+    got = cookiecutters(write_manifest(tmp_path, ["/a", "/b"]), jobs=2)
+
+    assert got == ["a", "b"]
+    mocked_cookiecutter.assert_not_called()
+    assert [s.template for s in mocked_generate.call_args[0][0]] == ["/a", "/b"]
+
+
+def test_prefetch_fetches_zips_like_cookiecutter(tmp_path, mocker):
+    mocked_cookiecutter = mocker.patch(
+        "docker_cookiecutter.cookiecutters.cookiecutter", return_value="ignored"
+    )
+    unzipped = tmp_path / "unzip-base" / "template"
+    unzipped.mkdir(parents=True)
+
+    def unzip(zip_uri, is_url, clone_to_dir, no_input, password):
+        assert (zip_uri, is_url, no_input) == ("https://x/t.zip", True, True)
+        return str(unzipped)
+
+    mocker.patch("cookiecutter.zipfile.unzip", side_effect=unzip)
+
+    cookiecutters(
+        "https://x/t.zip,,local", prefetch=1, no_input=True, default_config=True
+    )
+
+    fetched = mocked_cookiecutter.call_args_list[0][0][0]
+    assert os.path.basename(fetched) == "template"
+    assert not (tmp_path / "unzip-base").exists(), "moved out of unzip's own folder"
+    assert mocked_cookiecutter.call_args_list[1] == call(
+        "local", no_input=True, default_config=True
+    )
+
+
+def test_prefetch_leaves_zips_to_cookiecutter_when_it_may_prompt(mocker):
+    mocked_cookiecutter = mocker.patch(
+        "docker_cookiecutter.cookiecutters.cookiecutter", return_value="ignored"
+    )
+
+    cookiecutters("https://x/t.zip", prefetch=1)
+
+    mocked_cookiecutter.assert_called_once_with("https://x/t.zip")
+
+
+def test_main_prefetch_fail_fast(mocker):
+    mocked_cookiecutter = mocker.patch(
+        "docker_cookiecutter.cookiecutters.cookiecutter",
+        side_effect=[ValueError("boom"), "ignored"],
+    )
+
+    with pytest.raises(SystemExit) as e:
+        cookiecutters_module.main(["--prefetch", "2", "--fail-fast", "a,,b"])
+
+    assert str(e.value) == "a: boom"
+    assert mocked_cookiecutter.call_count == 1
+
+
+def test_concurrent_generation_reports_fetch_failures(tmp_path, mocker):
+    make_template(tmp_path, {"ok.txt": "ok"}, name="ok")
+    template_cache = mocker.Mock()
+    template_cache.fetch.side_effect = TemplateCacheError("unreachable")
+    out = tmp_path / "out"
+
+    with pytest.raises(CookiecuttersError) as e:
+        cookiecutters(
+            "gh:org/a,directory=x,,gh:org/a,directory=y,," + str(tmp_path / "ok"),
+            jobs=2,
+            template_cache=template_cache,
+            no_input=True,
+            output_dir=str(out),
+        )
+
+    assert template_cache.fetch.call_count == 1
+    assert [(s.directory, str(err)) for s, err in e.value.failures] == [
+        ("x", "unreachable"),
+        ("y", "unreachable"),
+    ]
+    assert read_tree(out) == {"proj/ok.txt": "ok"}
+
+
+def generate_incrementally(template, out, caplog, **options):
+    caplog.clear()
+    cookiecutters(
+        template,
+        incremental=True,
+        no_input=True,
+        overwrite_if_exists=True,
+        output_dir=str(out),
+        **options
+    )
+    return caplog.text
+
+
+@pytest.fixture
+def incremental_run(tmp_path, caplog):
+    caplog.set_level("INFO", logger="docker_cookiecutter.cookiecutters")
+    template = make_template(
+        tmp_path,
+        {"a.txt": "{{cookiecutter.greeting}}", "b.txt": "b"},
+        name="t",
+        context={"greeting": "hi"},
+    )
+    out = tmp_path / "out"
+    first = generate_incrementally(template, out, caplog)
+    assert "2 files rendered, 0 skipped, 2 written" in first
+    return template, out, caplog
+
+
+def mtimes(root):
+    return {p.name: p.stat().st_mtime_ns for p in root.iterdir()}
+
+
+def test_incremental_rerun_renders_and_writes_nothing(incremental_run):
+    template, out, caplog = incremental_run
+    before = mtimes(out / "proj")
+
+    report = generate_incrementally(template, out, caplog)
+
+    assert "0 files rendered, 2 skipped, 0 written" in report
+    assert mtimes(out / "proj") == before
+    assert read_tree(out / "proj") == {"a.txt": "hi", "b.txt": "b"}
+    assert sorted(p.name for p in out.iterdir()) == [
+        ".cookiecutters-manifest.json",
+        "proj",
+    ]
+
+
+def test_incremental_rerenders_changed_template_file(incremental_run):
+    template, out, caplog = incremental_run
+    (out / "proj" / "b.txt").write_text("edited")
+    with open(os.path.join(template, "{{cookiecutter.project}}", "a.txt"), "w") as f:
+        f.write("a changed")
+
+    report = generate_incrementally(template, out, caplog)
+
+    assert "2 files rendered, 0 skipped, 2 written" in report
+    assert read_tree(out / "proj") == {"a.txt": "a changed", "b.txt": "b"}
+
+
+def test_incremental_skips_writing_unchanged_output(incremental_run):
+    template, out, caplog = incremental_run
+    b_mtime = (out / "proj" / "b.txt").stat().st_mtime_ns
+
+    report = generate_incrementally(
+        template, out, caplog, extra_context={"greeting": "hello"}
+    )
+
+    assert "2 files rendered, 0 skipped, 1 written" in report
+    assert (out / "proj" / "b.txt").stat().st_mtime_ns == b_mtime
+
+
+def test_incremental_rerun_with_jobs(incremental_run, tmp_path):
+    template, out, caplog = incremental_run
+    other = make_template(tmp_path, {"c.txt": "c"}, name="other")
+
+    report = generate_incrementally(template + ",," + other, out, caplog, jobs=2)
+
+    assert "1 files rendered, 2 skipped, 1 written" in report
+    assert read_tree(out / "proj") == {"a.txt": "hi", "b.txt": "b", "c.txt": "c"}
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        pytest.param({"jobs": 2}, id="jobs"),
+        pytest.param({"incremental": True}, id="incremental"),
+    ],
+)
+def test_staged_generation_keeps_folders_and_symlinks(tmp_path, options):
+    post_gen = """
+import os
+os.makedirs("empty/nested")
+os.mkdir("real")
+os.symlink("real", "linked")
+os.symlink("a.txt", "a-link.txt")
+"""
+    template = make_template(
+        tmp_path, {"a.txt": "a"}, name="t", hooks={"post_gen_project.py": post_gen}
+    )
+    other = make_template(tmp_path, {"b.txt": "b"}, name="other")
+    out = tmp_path / "out"
+
+    # the second time round, over what the first one merged
+    for _ in range(2):
+        cookiecutters(
+            template + ",," + other,
+            no_input=True,
+            overwrite_if_exists=True,
+            output_dir=str(out),
+            **options
+        )
+
+    project = out / "proj"
+    assert (project / "empty" / "nested").is_dir()
+    assert (project / "real").is_dir()
+    assert os.readlink(str(project / "linked")) == "real"
+    assert os.readlink(str(project / "a-link.txt")) == "a.txt"
@@ -0,0 +1,276 @@
+import http.server
+import io
+import json
+import os
+import socket
+import socketserver
+import threading
+
+import pytest
+
+if not hasattr(socket, "AF_UNIX"):
+    pytest.skip("unix domain sockets are not available", allow_module_level=True)
+
+from docker_cookiecutter import engine
+from docker_cookiecutter.suggest import cookiecutter_to_docker_args
+
+some_args = "docker run some:image cookiecutter -o /out /some/template".split()
+
+
+def log_frame(stream: int, content: bytes) -> bytes:
+    return bytes([stream, 0, 0, 0]) + len(content).to_bytes(4, "big") + content
+
+
+class StubEngineHandler(http.server.BaseHTTPRequestHandler):
+    """Answers the container lifecycle requests the way the Docker Engine API does."""
+
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status: int, body: bytes = b"") -> None:
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+        self.server.requests.append(("POST", self.path, body))
+
+        if self.path.rsplit("/", 1)[-1] in self.server.failing:
+            self.reply(500, b'{"message": "failed to ' + self.path.encode() + b'"}')
+        elif self.path == "/containers/create":
+            if body["Image"] not in self.server.images:
+                self.reply(
+                    404,
+                    b'{"message": "No such image: ' + body["Image"].encode() + b'"}',
+                )
+                return
+            self.server.created += 1
+            self.reply(201, json.dumps({"Id": "c" + str(self.server.created)}).encode())
+        elif self.path.startswith("/images/create"):
+            self.server.images.add("some:image")
+            self.reply(200, b'{"status": "Downloaded"}\n')
+        elif self.path.endswith("/wait"):
+            self.reply(200, json.dumps({"StatusCode": self.server.exit_code}).encode())
+        else:
+            self.reply(204)
+
+    def do_GET(self):
+        self.server.requests.append(("GET", self.path, None))
+        self.reply(200, log_frame(1, b"out\n") + log_frame(2, b"err\n"))
+
+    def do_DELETE(self):
+        self.server.requests.append(("DELETE", self.path, None))
+        if "DELETE" in self.server.failing:
+            self.reply(500, b'{"message": "failed to remove"}')
+        else:
+            self.reply(204)
+
+
+class StubEngine(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str) -> None:
+        self.socket_path = socket_path
+        self.requests = []
+        self.connections = 0
+        self.created = 0
+        self.exit_code = 0
+        self.images = {"some:image"}
+        # last path segments of the POSTs (or "DELETE") that fail
+        self.failing = set()
+        super().__init__(socket_path, StubEngineHandler)
+
+
+@pytest.fixture
+def stub_engine(tmp_path):
+    # keep it short, unix socket paths are limited to ~100 characters
+    path = os.path.join(str(tmp_path), "d.sock")
+    if len(path) > 100:
+        pytest.skip("temporary path is too long for a unix socket")
+    sut = StubEngine(path)
+    thread = threading.Thread(target=sut.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield sut
+    sut.shutdown()
+    sut.server_close()
+    thread.join()
+
+
+def test_container_config_from_suggested_argv():
+    argv = cookiecutter_to_docker_args(some_args, argv=True, cwd="/work")
+
+    got = engine.container_config(argv)
+
+    assert got["Image"] == "some:image"
+    assert got["Cmd"] == [
+        "cookiecutter",
+        "-o",
+        "/h/abs/out",
+        "/h/abs/some/template",
+    ]
+    assert got["Tty"] is False
+    assert {"Type": "bind", "Source": "/out", "Target": "/h/abs/out"} in got[
+        "HostConfig"
+    ]["Mounts"]
+    assert len(got["HostConfig"]["Mounts"]) == 2
+
+
+@pytest.mark.parametrize(
+    "given,want",
+    [
+        pytest.param(
+            ["-e", "A=1", "--env=B=2"], {"Env": ["A=1", "B=2"]}, id="env, both forms"
+        ),
+        pytest.param(["-u", "1:2", "-w", "/w"], {"User": "1:2", "WorkingDir": "/w"}),
+        pytest.param(
+            ["-v", "/a:/b:ro"], {"HostConfig": {"Binds": ["/a:/b:ro"], "Mounts": []}}
+        ),
+    ],
+)
+def test_container_config_options(given, want):
+    got = engine.container_config(["docker", "run"] + given + ["img", "cmd"])
+
+    assert {k: got[k] for k in want} == want
+
+
+@pytest.mark.parametrize(
+    "given",
+    [
+        pytest.param(["docker", "ps"], id="not docker run"),
+        pytest.param(["docker", "run", "--privileged", "img"], id="unsupported option"),
+        pytest.param(["docker", "run", "-e"], id="missing value"),
+        pytest.param(["docker", "run", "--rm"], id="missing image"),
+    ],
+)
+def test_container_config_rejects(given):
+    with pytest.raises(engine.EngineError):
+        engine.container_config(given)
+
+
+def test_run_container_lifecycle_over_one_connection(stub_engine):
+    argv = cookiecutter_to_docker_args(some_args, argv=True)
+
+    with engine.EngineClient(stub_engine.socket_path) as client:
+        got = [engine.run_container(client, argv) for _ in range(3)]
+
+    assert got == [(0, b"")] * 3
+    assert [(m, p) for m, p, _ in stub_engine.requests[:4]] == [
+        ("POST", "/containers/create"),
+        ("POST", "/containers/c1/start"),
+        ("POST", "/containers/c1/wait"),
+        ("DELETE", "/containers/c1?force=1"),
+    ]
+    assert stub_engine.connections == 1
+
+
+def test_run_container_failure_returns_output(stub_engine):
+    stub_engine.exit_code = 3
+
+    with engine.EngineClient(stub_engine.socket_path) as client:
+        got = engine.run_container(client, ["docker", "run", "some:image"])
+
+    assert got == (3, b"out\nerr\n")
+    assert stub_engine.requests[-1][0] == "DELETE", "removed even when failed"
+
+
+def test_run_container_failure_not_replaced_by_removal_failure(stub_engine):
+    stub_engine.failing.update(["start", "DELETE"])
+
+    with engine.EngineClient(stub_engine.socket_path) as client:
+        with pytest.raises(engine.EngineError) as e:
+            engine.run_container(client, ["docker", "run", "some:image"])
+
+    assert "failed to /containers/c1/start" in str(e.value)
+    assert stub_engine.requests[-1][0] == "DELETE", "removal was still attempted"
+
+
+def test_run_container_pulls_missing_image(stub_engine):
+    stub_engine.images.clear()
+
+    with engine.EngineClient(stub_engine.socket_path) as client:
+        got = engine.run_container(client, ["docker", "run", "some:image"])
+
+    assert got == (0, b"")
+    assert [p for _, p, _ in stub_engine.requests[:3]] == [
+        "/containers/create",
+        "/images/create?fromImage=some&tag=image",
+        "/containers/create",
+    ]
+
+
+def test_error_status_raises(stub_engine):
+    with engine.EngineClient(stub_engine.socket_path) as client:
+        with pytest.raises(engine.EngineError) as e:
+            engine.create_container(client, {"Image": "other"})
+
+    assert "404" in str(e.value)
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_run_batch_reports_throughput(stub_engine, jobs):
+    err = io.StringIO()
+    commandlines = "\n".join([" ".join(some_args)] * 5 + ["docker run"]) + "\n"
+
+    got = engine.run_batch(
+        io.StringIO(commandlines),
+        err,
+        jobs=jobs,
+        socket_path=stub_engine.socket_path,
+    )
+
+    assert got == 1
+    assert stub_engine.created == 5
+    assert stub_engine.connections <= jobs
+    assert "record 6: failed" in err.getvalue()
+    assert "Generated 5 projects in " in err.getvalue()
+    assert "projects/minute" in err.getvalue()
+
+
+def test_run_batch_reads_a_bounded_window_ahead(stub_engine):
+    read = []
+    reported = []
+
+    def commandlines():
+        for i in range(50):
+            read.append(i)
+            # fails without running a container
+            yield "docker run\n"
+
+    class Err(io.StringIO):
+        def write(self, s):
+            if s.startswith("record "):
+                reported.append(len(read))
+            return super().write(s)
+
+    got = engine.run_batch(
+        commandlines(), Err(), jobs=2, socket_path=stub_engine.socket_path
+    )
+
+    assert got == 1
+    assert len(reported) == 50
+    assert reported[0] <= 2 * engine.CONST.RECORDS_IN_FLIGHT_PER_JOB + 1
+
+
+@pytest.mark.parametrize(
+    "given,want",
+    [
+        pytest.param(None, "/var/run/docker.sock", id="default"),
+        pytest.param("unix:///tmp/d.sock", "/tmp/d.sock", id="unix"),
+    ],
+)
+def test_default_socket_path(monkeypatch, given, want):
+    if given is None:
+        monkeypatch.delenv("DOCKER_HOST", raising=False)
+    else:
+        monkeypatch.setenv("DOCKER_HOST", given)
+
+    assert engine.default_socket_path() == want
@@ -0,0 +1,61 @@
+import pytest
+from docker_cookiecutter import incremental
+
+
+@pytest.mark.parametrize(
+    "given,want_same",
+    [
+        pytest.param({"project": "a"}, True, id="same values"),
+        pytest.param(
+            {"project": "a", "_template": "/tmp/elsewhere"},
+            True,
+            id="volatile keys ignored",
+        ),
+        pytest.param({"project": "b"}, False, id="different value"),
+        pytest.param({"project": "a", "extra": "x"}, False, id="extra value"),
+    ],
+)
+def test_context_hash(given, want_same):
+    base = {"cookiecutter": {"project": "a", "_template": "/tmp/t"}}
+
+    got_same = incremental.context_hash({"cookiecutter": given}) == (
+        incremental.context_hash(base)
+    )
+
+    assert got_same == want_same
+
+
+def test_manifest_round_trip(tmp_path):
+    (tmp_path / "proj").mkdir()
+    (tmp_path / "proj" / "a.txt").write_text("a")
+    sut = incremental.Manifest(str(tmp_path))
+    record = {"template": "t", "context": "c", "output": "proj/a.txt"}
+
+    sut.update("gh:org/t", {"a.txt": dict(record, rendered=True)}, str(tmp_path))
+    sut.save()
+
+    got = incremental.Manifest(str(tmp_path)).templates["gh:org/t"]["a.txt"]
+    assert got == dict(
+        record, output_hash=incremental.file_hash(str(tmp_path / "proj" / "a.txt"))
+    )
+
+
+def test_manifest_unreadable_starts_empty(tmp_path):
+    (tmp_path / incremental.CONST.MANIFEST_FILE).write_text("{not json")
+
+    assert incremental.Manifest(str(tmp_path)).templates == {}
+
+
+@pytest.mark.parametrize(
+    "given,want",
+    [
+        pytest.param(b"same", True, id="same"),
+        pytest.param(b"diff", False, id="same size"),
+        pytest.param(b"longer", False, id="different size"),
+    ],
+)
+def test_is_same_content(tmp_path, given, want):
+    (tmp_path / "a").write_bytes(b"same")
+    (tmp_path / "b").write_bytes(given)
+
+    assert incremental.is_same_content(str(tmp_path / "a"), str(tmp_path / "b")) == want
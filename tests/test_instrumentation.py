@@ -0,0 +1,146 @@
+import io
+import json
+import threading
+
+import pytest
+from docker_cookiecutter import cli, instrumentation
+from docker_cookiecutter.memo import CONST as MEMO_CONST
+from docker_cookiecutter.pathmap import reduce_mounts_reference
+from docker_cookiecutter.suggest import cookiecutter_to_docker_args
+
+SOME_ARGS = "docker run img cookiecutter -o ../out /some/template,,./other".split()
+
+
+@pytest.fixture(autouse=True)
+def memo_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv(MEMO_CONST.DIR_ENV, str(tmp_path / "memo"))
+
+
+@pytest.fixture(autouse=True)
+def no_leftover_hooks():
+    yield
+    assert instrumentation.active is None
+    instrumentation.hooks.clear()
+
+
+def test_disabled_records_nothing():
+    recorder = instrumentation.Recorder()
+
+    cookiecutter_to_docker_args(SOME_ARGS)
+
+    assert instrumentation.stage("any") is instrumentation.NULL_STAGE
+    assert recorder.report() == {"timings_ms": {}, "counters": {}}
+
+
+def test_recording_stages_and_counters():
+    with instrumentation.recording() as recorder:
+        cookiecutter_to_docker_args(SOME_ARGS)
+
+    report = recorder.report()
+    assert set(report["timings_ms"]) >= {
+        "cookiecutter_to_docker_args",
+        "parse_docker",
+        "parse_cookiecutter",
+        "decode_templates",
+        "build_path_map",
+        "reduce_mounts",
+        "mount_args",
+        "encode_templates",
+        "cookiecutter_args",
+    }
+    counters = report["counters"]
+    assert counters["cookiecutter_to_docker_args.calls"] == 1
+    assert counters["mounts_emitted"] == 3
+    assert counters["paths_normalized"] > 0
+    assert counters["mount_or_parent_mount.lookups"] == 3
+
+
+def test_hit_rate_from_hits_and_lookups():
+    recorder = instrumentation.Recorder()
+    recorder.count("memo.lookups", 4)
+    recorder.count("memo.hits", 3)
+    recorder.count("other", 2)
+
+    assert recorder.report()["counters"] == {
+        "memo.lookups": 4,
+        "memo.hits": 3,
+        "other": 2,
+        "memo.hit_rate": 0.75,
+    }
+
+
+def test_reference_reduce_mounts_counts_memo_hits():
+    with instrumentation.recording() as recorder:
+        reduce_mounts_reference(["/a", "/a/b", "/a/c", "/d"])
+
+    counters = recorder.report()["counters"]
+    assert counters["has_mount_or_parent_mount.lookups"] > 0
+    assert 0 < counters["has_mount_or_parent_mount.hit_rate"] <= 1
+
+
+def test_hooks_get_a_report_per_call():
+    reports = []
+    instrumentation.add_hook(lambda name, report: reports.append((name, report)))
+
+    cookiecutter_to_docker_args(SOME_ARGS)
+    cookiecutter_to_docker_args(SOME_ARGS)
+
+    assert [name for name, _ in reports] == ["cookiecutter_to_docker_args"] * 2
+    assert [r["counters"]["cookiecutter_to_docker_args.calls"] for _, r in reports] == [
+        1,
+        1,
+    ]
+
+
+def test_recording_is_per_thread():
+    first_entered = threading.Event()
+    second_entered = threading.Event()
+    first_exited = threading.Event()
+    reports = {}
+
+    def first():
+        with instrumentation.recording() as recorder:
+            first_entered.set()
+            second_entered.wait(timeout=5)
+            cookiecutter_to_docker_args(SOME_ARGS)
+        first_exited.set()
+        reports["first"] = recorder.report()
+
+    def second():
+        first_entered.wait(timeout=5)
+        with instrumentation.recording() as recorder:
+            second_entered.set()
+            # overlapping the first, which leaves while this one still records
+            first_exited.wait(timeout=5)
+            cookiecutter_to_docker_args(SOME_ARGS)
+        reports["second"] = recorder.report()
+
+    threads = [threading.Thread(target=first), threading.Thread(target=second)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for name in ("first", "second"):
+        assert reports[name]["counters"]["cookiecutter_to_docker_args.calls"] == 1
+    # and nothing is left recording, see no_leftover_hooks
+    assert instrumentation.stage("any") is instrumentation.NULL_STAGE
+
+
+def test_cli_timings_on_stderr(capsys):
+    cli.main(["--timings"] + SOME_ARGS)
+
+    captured = capsys.readouterr()
+    assert captured.out.startswith("docker run")
+    report = json.loads(captured.err)
+    assert "total" in report["timings_ms"]
+    assert report["counters"]["mounts_emitted"] == 3
+
+
+def test_cli_batch_timings_accumulate(capsys, monkeypatch):
+    monkeypatch.setattr("sys.stdin", io.StringIO((" ".join(SOME_ARGS) + "\n") * 2))
+
+    cli.main(["--batch", "--timings"])
+
+    report = json.loads(capsys.readouterr().err)
+    assert report["counters"]["cookiecutter_to_docker_args.calls"] == 2
@@ -0,0 +1,108 @@
+import os
+
+import pytest
+from docker_cookiecutter import instrumentation, memo, suggest
+
+SOME_ARGS = "docker run img cookiecutter -o ../out /some/template".split()
+
+
+@pytest.fixture
+def sut(tmp_path):
+    return memo.SuggestMemo(str(tmp_path / "memo"))
+
+
+def test_memoizes_suggestion(sut, mocker):
+    suggest_spy = mocker.spy(suggest, "cookiecutter_to_docker_args")
+
+    with instrumentation.recording() as recorder:
+        got = [sut.suggest(SOME_ARGS), sut.suggest(SOME_ARGS)]
+
+    assert got[0] == got[1]
+    assert got[0][:4] == ["docker", "run", "-it", "--rm"]
+    assert suggest_spy.call_count == 1
+    counters = recorder.report()["counters"]
+    assert counters["suggest_memo.hit_rate"] == 0.5
+
+
+@pytest.mark.parametrize(
+    "given_args,given_options,given_cwd,given_version",
+    [
+        pytest.param(SOME_ARGS[:-1] + ["/other"], {}, None, None, id="args"),
+        pytest.param(SOME_ARGS, {"container_abs": "/abs"}, None, None, id="options"),
+        pytest.param(SOME_ARGS, {}, "elsewhere", None, id="cwd"),
+        pytest.param(SOME_ARGS, {}, None, "99.0", id="version"),
+    ],
+)
+def test_key_covers(
+    tmp_path,
+    monkeypatch,
+    given_args,
+    given_options,
+    given_cwd,
+    given_version,
+):
+    monkeypatch.chdir(tmp_path)
+    want = memo.memo_key(SOME_ARGS, {})
+    if given_cwd is not None:
+        (tmp_path / given_cwd).mkdir()
+        monkeypatch.chdir(tmp_path / given_cwd)
+    if given_version is not None:
+        monkeypatch.setattr(memo, "__version__", given_version)
+
+    assert memo.memo_key(given_args, given_options) != want
+
+
+def test_evicts_least_recently_used(sut):
+    sut.max_entries = 2
+    sut.evict_every = 1
+    for i in range(3):
+        sut.put(str(i), [str(i)])
+        os.utime(sut.path(str(i)), (1000 + i, 1000 + i))
+    sut.get("1")
+
+    sut.put("3", ["3"])
+
+    assert sorted(os.listdir(sut.root)) == ["1.json", "3.json"]
+
+
+def test_evicts_on_one_put_in_evict_every(sut, mocker):
+    sut.max_entries = 0
+    sut.evict_every = 4
+    evict = mocker.spy(sut, "evict")
+
+    for i in range(400):
+        sut.put(str(i), [str(i)])
+
+    assert 50 < evict.call_count < 150
+    assert len(os.listdir(sut.root)) < 400
+
+
+@pytest.mark.parametrize(
+    "given_content",
+    [pytest.param(None, id="missing"), pytest.param("[not json", id="corrupt")],
+)
+def test_unreadable_entry_misses(sut, given_content):
+    if given_content is not None:
+        os.makedirs(sut.root)
+        with open(sut.path("k"), "w") as f:
+            f.write(given_content)
+
+    assert sut.get("k") is None
+
+
+def test_unwritable_memo_still_suggests(tmp_path):
+    (tmp_path / "file").write_text("")
+    sut = memo.SuggestMemo(str(tmp_path / "file" / "memo"))
+
+    assert sut.suggest(SOME_ARGS)[:2] == ["docker", "run"]
+    assert os.listdir(str(tmp_path)) == ["file"]
+
+
+def test_default_memo_dir(monkeypatch):
+    monkeypatch.delenv(memo.CONST.DIR_ENV, raising=False)
+    monkeypatch.setenv("XDG_CACHE_HOME", "/cache")
+
+    assert memo.default_memo_dir() == os.path.join("/cache", memo.CONST.DIR_NAME)
+
+    monkeypatch.setenv(memo.CONST.DIR_ENV, "/memo")
+    assert memo.default_memo_dir() == "/memo"
@@ -0,0 +1,106 @@
+import random
+
+import pytest
+from docker_cookiecutter import suggest
+
+token_pool = [
+    "-o",
+    "out",
+    "--output-dir",
+    "--output-dir=out",
+    "--out",
+    "--out=out",
+    "-ox",
+    "-o-x",
+    "-fs",
+    "-fo",
+    "-fq",
+    "-vV",
+    "-f",
+    "-s",
+    "-c",
+    "--checkout",
+    "--checkout=",
+    "--co",
+    "--c",
+    "--d",
+    "--default",
+    "--replay",
+    "--replay-file",
+    "--rep",
+    "--no-input",
+    "--no-input=1",
+    "-f=x",
+    "-o=x",
+    "--foo",
+    "--foo=bar",
+    "-x",
+    "-h",
+    "--he",
+    "--",
+    "-",
+    "-1",
+    "",
+    "-o x",
+    "tmpl",
+    "gh:some/template",
+    "key=value",
+]
+
+
+def parse_with(parse, args):
+    try:
+        ns, extras = parse(list(args))
+    except SystemExit as e:
+        return "exit", e.code
+    return vars(ns), extras
+
+
+def generate_args(seed):
+    rng = random.Random(seed)
+    return [rng.choice(token_pool) for _ in range(rng.randint(0, 6))]
+
+
+@pytest.mark.parametrize(
+    "given",
+    [
+        pytest.param([], id="empty"),
+        pytest.param(["tmpl"], id="template only"),
+        pytest.param(["-o", "out", "-f", "tmpl", "a=b"], id="typical"),
+        pytest.param(["tmpl", "-o", "out"], id="options after template"),
+        pytest.param(["-o", "x", "-o", "y"], id="repeated option"),
+        pytest.param(["--output-dir=out", "tmpl"], id="long with ="),
+        pytest.param(["--out", "out", "tmpl"], id="abbreviated long"),
+        pytest.param(["-fo", "out", "tmpl"], id="short cluster with value"),
+        pytest.param(["-oout", "tmpl"], id="short with attached value"),
+        pytest.param(["-c", "", "tmpl"], id="empty value"),
+        pytest.param(["-o", "out", "--", "tmpl"], id="double dash"),
+        pytest.param(["--foo", "bar", "tmpl"], id="unknown option"),
+    ]
+    + [
+        pytest.param(generate_args(seed), id="generated - " + str(seed))
+        for seed in range(300)
+    ],
+)
+def test_compiled_parser_matches_argparse(given, capsys):
+    argparse_parser = suggest.prepare_cookiecutter_option_parser()
+
+    want = parse_with(argparse_parser.parse_known_args, given)
+    got = parse_with(suggest.cookiecutter_option_parser.parse_known_args, given)
+
+    assert got == want
+
+
+@pytest.mark.parametrize(
+    "given",
+    [
+        pytest.param(["tmpl"], id="template only"),
+        pytest.param(["-o", "out", "-f", "-s", "tmpl", "a=b", "-x"], id="typical"),
+        pytest.param(["--output-dir=out", "--no-input", "tmpl"], id="long options"),
+        pytest.param(["--out", "out", "--default", "tmpl"], id="abbreviated"),
+        pytest.param(["-fsoout", "-c", "v1", "tmpl"], id="short clusters"),
+    ],
+)
+def test_compiled_parser_fast_path(given):
+    parsed = suggest.cookiecutter_option_parser.parse_fast(given)
+    assert parsed is not None
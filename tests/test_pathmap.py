@@ -1,5 +1,7 @@
+import random
+
 import pytest
-from docker_cookiecutter import pathmap
+from docker_cookiecutter import instrumentation, pathmap
 
 
 @pytest.mark.parametrize(
@@ -38,6 +40,57 @@ def test_reduce_mounts(given, want):
     assert set(result) == set(want)
 
 
+def test_reduce_mounts_drops_duplicates():
+    result = pathmap.reduce_mounts(["a", "./a", "a/"])
+    assert result == ["./a"]
+
+
+def generate_paths(seed, count):
+    rng = random.Random(seed)
+    prefixes = ["", "/", "./", "../", "../../", "c:\\", "D:/"]
+    names = ["a", "b", "c", "a b", "a-b", "ab", ".", ".."]
+    return [
+        rng.choice(prefixes)
+        + "/".join(rng.choice(names) for _ in range(rng.randint(0, 5)))
+        for _ in range(count)
+    ]
+
+
+def test_reduce_mounts_root_covers_absolute_paths():
+    result = pathmap.reduce_mounts(["/a/b", "/", "/a"])
+    assert result == ["/"]
+
+
+def reduced_by_reference(given):
+    want = set(pathmap.reduce_mounts_reference(given))
+    # the reference memoizes a root ("/" or a drive's) as unmounted while checking the root
+    # itself, so it goes on to mount the root's children as well
+    for root in [
+        m for m in want if m == "/" or (m.endswith(":/") and m.count("/") == 1)
+    ]:
+        want = {m for m in want if not m.startswith(root)} | {root}
+    return want
+
+
+@pytest.mark.parametrize(
+    "given",
+    [
+        pytest.param(["/", "/a", "/a/b"], id="root and children"),
+        pytest.param(["c:\\", "c:\\a"], id="root and child - win"),
+        pytest.param(["a b", "a/b", "a", "ab/c"], id="sibling prefixes"),
+        pytest.param(["..", "../a", "../../b", "."], id="relative parents"),
+    ]
+    + [
+        pytest.param(generate_paths(seed, 500), id="generated - " + str(seed))
+        for seed in range(10)
+    ],
+)
+def test_reduce_mounts_matches_reference(given):
+    result = pathmap.reduce_mounts(given)
+    assert set(result) == reduced_by_reference(given)
+    assert result == sorted(result)
+
+
 @pytest.mark.parametrize(
     "given,want",
     [
@@ -144,3 +197,267 @@ def test_map_host_to_container(given_paths, want_mappings):
         ), "reduced mount should be mapped to container path"
 
     assert result_mappings == want_mappings
+
+
+@pytest.mark.parametrize(
+    "given_paths,given_host_path,want",
+    [
+        pytest.param(["/a"], "/a/b/c", "/h/abs/a/b/c", id="absolute - descendant"),
+        pytest.param(["/"], "/x/y", "/h/abs/x/y", id="absolute - under root"),
+        pytest.param(["D:\\a"], "D:\\a\\b", "/h/abs/a/b", id="absolute - win"),
+        pytest.param(["."], "sub/file.txt", "/h/rel/sub/file.txt", id="relative - cwd"),
+        pytest.param(
+            ["../a", "d"], "../a/x//y/", "/h/rel/a/x/y", id="relative - parent"
+        ),
+        pytest.param(["/a", "/a/b"], "/a/b/c", "/h/abs/a/b/c", id="via reduced mount"),
+    ],
+)
+def test_get_container_path_descendant(given_paths, given_host_path, want):
+    sut = pathmap.PathMap(given_paths, container_abs="/h/abs", container_rel="/h/rel")
+    assert sut.get_container_path(given_host_path) == want
+
+
+@pytest.mark.parametrize(
+    "given_paths,given_host_path",
+    [
+        pytest.param(["/a/b"], "/a", id="ancestor of mount"),
+        pytest.param(["/a"], "/ab/c", id="sibling with shared prefix"),
+        pytest.param(["./a"], "/a/x", id="absolute vs relative"),
+    ],
+)
+def test_get_container_path_unmapped(given_paths, given_host_path):
+    sut = pathmap.PathMap(given_paths)
+    with pytest.raises(KeyError):
+        sut.get_container_path(given_host_path)
+
+
+SIBLINGS = ["/data/templates/t" + str(i) for i in range(20)]
+
+
+@pytest.mark.parametrize(
+    "given_mounts,given_max,given_min_depth,want",
+    [
+        pytest.param(
+            SIBLINGS + ["/other/x", "/other/y", "/z"],
+            3,
+            1,
+            ["/data/templates", "/other", "/z"],
+            id="siblings into parents",
+        ),
+        pytest.param(
+            ["/a/b/c", "/a/b/d", "/a/e"],
+            2,
+            1,
+            ["/a/b", "/a/e"],
+            id="deepest merge first",
+        ),
+        pytest.param(
+            ["/a/b/c", "/a/b/d", "/a/e"],
+            1,
+            1,
+            ["/a"],
+            id="merge again to fit",
+        ),
+        pytest.param(["/a", "/b"], 1, 1, ["/a", "/b"], id="never root by default"),
+        pytest.param(["/a", "/b"], 1, 0, ["/"], id="root when allowed"),
+        pytest.param(
+            ["/data/t/a", "/data/t/b"],
+            1,
+            3,
+            ["/data/t/a", "/data/t/b"],
+            id="depth guard",
+        ),
+        pytest.param(
+            ["./a", "./b", "../c", "../d"], 1, 0, [".", "../c", "../d"], id="relative"
+        ),
+        pytest.param(["/a", "/b"], 2, 0, ["/a", "/b"], id="within budget"),
+    ],
+)
+def test_coalesce_mounts(given_mounts, given_max, given_min_depth, want):
+    assert pathmap.coalesce_mounts(given_mounts, given_max, given_min_depth) == want
+
+
+def test_path_map_max_mounts():
+    sut = pathmap.PathMap(SIBLINGS + ["./out"], max_mounts=2)
+
+    assert sut.get_mounts() == ["./out", "/data/templates"]
+    assert sut.get_container_path("/data/templates") == "/h/abs/data/templates"
+    assert sut.get_container_path(SIBLINGS[3]) == "/h/abs" + SIBLINGS[3]
+    assert sut.get_container_path("./out") == "/h/rel/out"
+
+
+@pytest.mark.parametrize(
+    "path_map_type",
+    [
+        pytest.param(pathmap.PathMap, id="PathMap"),
+        pytest.param(pathmap.CompactPathMap, id="CompactPathMap"),
+    ],
+)
+def test_path_map_takes_any_iterable(path_map_type):
+    sut = path_map_type(path for path in ["/data/a", "./out"])
+
+    assert sut.get_mounts() == ["./out", "/data/a"]
+    assert sut.get_container_path("/data/a") == "/h/abs/data/a"
+
+
+def test_path_map_existing_mounts():
+    sut = pathmap.PathMap(
+        ["/data/t/a", "/data/t/b", "/x"], existing_mounts={"/data/": "/mnt/data"}
+    )
+
+    assert sut.get_mounts() == ["/x"]
+    assert sut.get_container_path("/data/t/a") == "/mnt/data/t/a"
+    assert sut.get_container_path("/data/other") == "/mnt/data/other"
+    assert sut.get_container_path("/x") == "/h/abs/x"
+
+
+def test_normalize_paths_once_each():
+    given = ["a", "a", "c:\\a", "/x//y/", "a"]
+
+    with instrumentation.recording() as recorder:
+        got = pathmap.normalize_paths(given)
+
+    assert got == {"a": "./a", "c:\\a": "c:/a", "/x//y/": "/x/y"}
+    assert recorder.report()["counters"]["paths_normalized"] == 3
+    assert got["a"] is pathmap.normalize_paths(["./a"])["./a"], "interned"
+
+
+@pytest.mark.parametrize(
+    "given",
+    [
+        pytest.param("/a//b/", id="absolute"),
+        pytest.param("a\\b", id="relative - win"),
+        pytest.param("../../a", id="parent"),
+        pytest.param("c:\\a\\..\\b", id="drive"),
+        pytest.param("/", id="root"),
+    ],
+)
+def test_transform_normalized_to_nix_path(given, mocker):
+    normalized = pathmap.normalize_path(given)
+    normpath_spy = mocker.spy(pathmap.posixpath, "normpath")
+
+    got = pathmap.transform_to_nix_path(normalized, normalized=True)
+
+    assert normpath_spy.call_count == 0
+    assert got == pathmap.transform_to_nix_path(normalized)
+
+
+def test_path_map_normalizes_each_path_once():
+    given = ["/a/b", "/a/b", "/a", "../c", "../c", "./d"]
+
+    with instrumentation.recording() as recorder:
+        pathmap.PathMap(given, existing_mounts={"/m": "/mnt"})
+
+    # the 4 distinct host paths, 1 existing mount and 2 relative container paths
+    assert recorder.report()["counters"]["paths_normalized"] == 7
+
+
+def test_coalesce_mounts_normalizes_nothing_again(mocker):
+    mounts = ["/data/t/a", "/data/t/b", "./x/y/1", "./x/y/2", "../p/q/1", "../p/q/2"]
+    normalize_spy = mocker.spy(pathmap, "normalize_path")
+
+    got = pathmap.coalesce_mounts(mounts, 3, 1)
+
+    assert got == ["../p/q", "./x/y", "/data/t"]
+    assert got == [pathmap.normalize_path(m) for m in got]
+    assert normalize_spy.call_count == len(got), "only by the check above"
+
+
+def test_path_map_lookup_memo_is_bounded(mocker):
+    mocker.patch.object(pathmap, "LOOKUP_MEMO_SIZE", 2)
+    sut = pathmap.PathMap(["/a"])
+    normalize_spy = mocker.spy(pathmap, "normalize_path")
+
+    got = [sut.get_container_path(p) for p in ["/a/1", "/a/2", "/a/1", "/a/3", "/a/2"]]
+
+    assert got == ["/h/abs/a/1", "/h/abs/a/2", "/h/abs/a/1", "/h/abs/a/3", "/h/abs/a/2"]
+    # the memo was full (of /a/1 and /a/2) when /a/3 was looked up, so starts over
+    assert [c[0][0] for c in normalize_spy.call_args_list] == [
+        "/a/1",
+        "/a/2",
+        "/a/3",
+        "/a/2",
+    ]
+    assert sut.lookups == {"/a/3": "/h/abs/a/3", "/a/2": "/h/abs/a/2"}
+
+
+def container_paths(path_map, host_paths):
+    got = []
+    for host_path in host_paths:
+        try:
+            got.append(path_map.get_container_path(host_path))
+        except KeyError:
+            got.append(None)
+    return got
+
+
+@pytest.mark.parametrize(
+    "given_paths,given_options",
+    [
+        pytest.param(["/", "/a", "c:\\", "c:\\a", "."], {}, id="roots"),
+        pytest.param(SIBLINGS + ["./out"], {"max_mounts": 2}, id="max mounts"),
+        pytest.param(
+            ["/data/t/a", "/x", "../y"],
+            {"existing_mounts": {"/data/": "/mnt/data"}},
+            id="existing mounts",
+        ),
+    ]
+    + [
+        pytest.param(generate_paths(seed, 500), {}, id="generated - " + str(seed))
+        for seed in range(5)
+    ],
+)
+def test_compact_path_map_matches_path_map(given_paths, given_options):
+    lookups = (
+        given_paths
+        + [p + "/below" for p in given_paths]
+        + ["/nope", "../../../nope", "c:\\a\\b"]
+    )
+    want = pathmap.PathMap(given_paths, **given_options)
+
+    sut = pathmap.CompactPathMap(given_paths, **given_options)
+
+    assert sut.get_mounts() == want.get_mounts()
+    assert container_paths(sut, lookups) == container_paths(want, lookups)
+
+
+@pytest.mark.parametrize(
+    "path_map_type",
+    [
+        pytest.param(pathmap.PathMap, id="path map"),
+        pytest.param(pathmap.CompactPathMap, id="compact"),
+    ],
+)
+def test_windows_drive_root_mount(path_map_type):
+    sut = path_map_type(["c:\\"])
+
+    assert sut.get_mounts() == ["c:/"]
+    assert sut.get_container_path("c:\\x") == "/h/abs/x"
+    assert sut.get_container_path("c:\\x\\y") == "/h/abs/x/y"
+
+
+def test_compact_path_map_shares_components():
+    sut = pathmap.CompactPathMap(["/data/t" + str(i) for i in range(100)])
+
+    # "/", "data", the t<i>, and the container's "h" and "abs"
+    assert len(sut.components) == 104
+    # the same, plus the root node, with every container path under one "/h/abs" base
+    assert len(sut.parents) == 105
+    assert sut.get_container_path("/data/t7") == "/h/abs/data/t7"
+
+
+@pytest.mark.parametrize(
+    "given_compact,want",
+    [
+        pytest.param(False, pathmap.PathMap, id="default"),
+        pytest.param(True, pathmap.CompactPathMap, id="compact"),
+    ],
+)
+def test_builder_compact(given_compact, want):
+    builder = pathmap.PathMapBuilder()
+    builder.add_path("/a")
+
+    got = builder.build("/h/abs", "/h/rel", "dd", compact=given_compact)
+
+    assert type(got) is want
+    assert got.get_container_path("/a/b") == "/h/abs/a/b"
@@ -0,0 +1,239 @@
+import json
+import shutil
+import subprocess
+import threading
+import time
+from collections import namedtuple
+
+import pytest
+from docker_cookiecutter import pipeline
+from docker_cookiecutter.cache import TemplateCache
+from docker_cookiecutter.cookiecutters import CookiecuttersError, cookiecutters
+from docker_cookiecutter.pipeline import generate_pipelined
+from tests.conftest import read_tree
+
+Source = namedtuple("Source", "template")
+
+
+def sources(*templates):
+    return [Source(t) for t in templates]
+
+
+def test_generates_in_order_with_bounded_window():
+    read = []
+    fetched = []
+    generated = []
+
+    def fetch_key(source):
+        read.append(source.template)
+        return source.template
+
+    def fetch(source):
+        fetched.append(source.template)
+        return "/fetched/" + source.template
+
+    def generate(source, local):
+        # the window: this template, and up to 2 after it
+        generated.append((local, len(read)))
+        return source.template + "-project"
+
+    got = generate_pipelined(sources("a", "b", "c", "d"), fetch_key, fetch, generate, 2)
+
+    assert got == (["a-project", "b-project", "c-project", "d-project"], [])
+    assert generated == [
+        ("/fetched/a", 3),
+        ("/fetched/b", 4),
+        ("/fetched/c", 4),
+        ("/fetched/d", 4),
+    ]
+    assert sorted(fetched) == ["a", "b", "c", "d"]
+
+
+def test_fetches_while_generating():
+    generating = threading.Event()
+    overlapped = []
+
+    def fetch(source):
+        if source.template == "b":
+            # only set once "a" is being generated, so this fetch must run meanwhile
+            overlapped.append(generating.wait(timeout=5))
+        return source.template
+
+    def generate(source, local):
+        generating.set()
+        if source.template == "a":
+            time.sleep(0.1)
+        return local
+
+    got = generate_pipelined(
+        sources("a", "b"), lambda s: s.template, fetch, generate, 1
+    )
+
+    assert got == (["a", "b"], [])
+    assert overlapped == [True]
+
+
+def test_shared_fetch_and_local_sources():
+    fetched = []
+
+    def fetch(source):
+        fetched.append(source.template)
+        return "/fetched"
+
+    got = generate_pipelined(
+        sources("remote", "local", "remote"),
+        lambda s: None if s.template == "local" else s.template,
+        fetch,
+        lambda source, local: local,
+        2,
+    )
+
+    assert got == (["/fetched", None, "/fetched"], [])
+    assert fetched == ["remote"]
+
+
+def test_keeps_only_the_latest_fetches(monkeypatch):
+    monkeypatch.setattr(pipeline, "FETCHED_MEMO_SIZE", 2)
+    fetched = []
+
+    def fetch(source):
+        fetched.append(source.template)
+        return "/fetched/" + source.template
+
+    got = generate_pipelined(
+        sources("a", "b", "a", "c", "d", "e", "a"),
+        lambda s: s.template,
+        fetch,
+        lambda source, local: local,
+        1,
+    )
+
+    assert got[0] == ["/fetched/" + t for t in "abacdea"]
+    assert fetched == ["a", "b", "c", "d", "e", "a"], "a again, once forgotten"
+
+
+@pytest.mark.parametrize(
+    "fail_fast,want_generated,want_read",
+    [
+        pytest.param(False, ["a", "c", "d"], ["a", "b", "c", "d"], id="every template"),
+        pytest.param(True, ["a"], ["a", "b", "c"], id="fail fast"),
+    ],
+)
+def test_generate_failures(fail_fast, want_generated, want_read):
+    read = []
+    error = ValueError("boom")
+
+    def generate(source, local):
+        if source.template == "b":
+            raise error
+        return source.template
+
+    got = generate_pipelined(
+        sources("a", "b", "c", "d"),
+        lambda s: read.append(s.template),
+        None,
+        generate,
+        1,
+        fail_fast,
+    )
+
+    assert got == (want_generated, [(Source("b"), error)])
+    assert read == want_read
+
+
+def test_fail_fast_stops_reading_at_fetch_failure():
+    read = []
+    failing = threading.Event()
+    error = ValueError("boom")
+
+    def fetch_key(source):
+        read.append(source.template)
+        return source.template
+
+    def fetch(source):
+        if source.template == "b":
+            failing.set()
+            raise error
+        if source.template == "a":
+            failing.wait(timeout=5)
+            # long enough for the loop to hear of the failure before "a" is done
+            time.sleep(0.2)
+        return source.template
+
+    got = generate_pipelined(
+        sources("a", "b", "c", "d"), fetch_key, fetch, lambda s, local: local, 1, True
+    )
+
+    assert got == (["a"], [(Source("b"), error)])
+    assert read == ["a", "b"], "nothing after the failure is read, let alone fetched"
+
+
+needs_git = pytest.mark.skipif(shutil.which("git") is None, reason="needs git")
+
+
+def git(*args, cwd=None):
+    subprocess.run(("git",) + args, cwd=cwd, check=True, stdout=subprocess.PIPE)
+
+
+def make_remote(root, name, files) -> str:
+    """A local bare repository of a template, returning its file:// url."""
+    work = root / name
+    (work / "{{cookiecutter.project}}").mkdir(parents=True)
+    (work / "cookiecutter.json").write_text(json.dumps({"project": "proj"}))
+    for relative, content in files.items():
+        (work / "{{cookiecutter.project}}" / relative).write_text(content)
+    git("init", "--quiet", str(work))
+    git("add", "-A", cwd=str(work))
+    git(
+        "-c",
+        "user.email=test@example.com",
+        "-c",
+        "user.name=test",
+        "commit",
+        "--quiet",
+        "-m",
+        "template",
+        cwd=str(work),
+    )
+    bare = str(root / (name + ".git"))
+    git("clone", "--quiet", "--bare", str(work), bare)
+    return "file://" + bare
+
+
+@needs_git
+@pytest.mark.parametrize(
+    "fail_fast,want_tree",
+    [
+        pytest.param(False, {"proj/a.txt", "proj/c.txt"}, id="every template"),
+        pytest.param(True, {"proj/a.txt"}, id="fail fast"),
+    ],
+)
+def test_cookiecutters_prefetch_file_repositories(
+    tmp_path, monkeypatch, fail_fast, want_tree
+):
+    templates = ",,".join(
+        [
+            make_remote(tmp_path, "a", {"a.txt": "a"}),
+            "file://" + str(tmp_path / "nowhere.git"),
+            make_remote(tmp_path, "c", {"c.txt": "c"}),
+        ]
+    )
+    # fetching into a relative folder, while cookiecutter works within others
+    monkeypatch.chdir(tmp_path)
+
+    with pytest.raises(CookiecuttersError) as e:
+        cookiecutters(
+            templates,
+            template_cache=TemplateCache("cache"),
+            prefetch=2,
+            fail_fast=fail_fast,
+            no_input=True,
+            default_config=True,
+            overwrite_if_exists=True,
+            output_dir=str(tmp_path / "out"),
+        )
+
+    assert [source.template for source, _ in e.value.failures] == [
+        "file://" + str(tmp_path / "nowhere.git")
+    ]
+    assert set(read_tree(tmp_path / "out")) == want_tree
@@ -0,0 +1,237 @@
+import os
+import threading
+from functools import partial
+
+import pytest
+from cookiecutter.exceptions import UndefinedVariableInTemplate
+from docker_cookiecutter.cookiecutters import cookiecutter, cookiecutters
+from docker_cookiecutter.render import rendering_concurrently
+from jinja2.exceptions import TemplateSyntaxError
+from tests import conftest
+
+# lists the project's files (as the hook sees them) into a file of its own
+POST_GEN_HOOK = """
+import os
+listing = sorted(
+    os.path.relpath(os.path.join(root, name), ".")
+    for root, _, files in os.walk(".")
+    for name in files
+)
+with open("post_gen_listing.txt", "w") as f:
+    f.write("\\n".join(listing))
+"""
+
+# a template whose hook lists its files, and whose raw/* and *.copied files aren't rendered
+make_template = partial(
+    conftest.make_template,
+    context={"a": "1", "b": "1", "_copy_without_render": ["raw/*", "*.copied"]},
+    hooks={"post_gen_project.py": POST_GEN_HOOK},
+)
+read_tree = partial(
+    conftest.read_tree, read=lambda path: (path.read_bytes(), os.stat(path).st_mode)
+)
+
+
+many_files = dict(
+    {
+        "sub{{cookiecutter.a}}/f"
+        + str(i)
+        + ".txt": "{{cookiecutter.project}} "
+        + str(i)
+        for i in range(40)
+    },
+    **{
+        "raw/kept.txt": "{{not rendered}}",
+        "sub{{cookiecutter.a}}/x.copied": "{{not rendered either}}",
+        "logo.bin": b"\x00\x01{{cookiecutter.project}}\xff",
+        # both render to same.txt, the later (in walk order) wins
+        "same{{cookiecutter.a}}.txt": "from a",
+        "same{{ cookiecutter.b }}.txt": "from b",
+        "{% if false %}empty{% endif %}": "no file name",
+    }
+)
+
+
+def generate(tmp_path, template, out, render_jobs, processes=True):
+    with rendering_concurrently(render_jobs, processes):
+        return cookiecutter(
+            template,
+            no_input=True,
+            default_config=True,
+            output_dir=str(tmp_path / out),
+        )
+
+
+@pytest.mark.parametrize(
+    "processes",
+    [pytest.param(True, id="processes"), pytest.param(False, id="threads")],
+)
+def test_same_output_as_serial(tmp_path, processes):
+    template = make_template(tmp_path, many_files)
+    os.chmod(os.path.join(template, "{{cookiecutter.project}}", "logo.bin"), 0o755)
+
+    serial = generate(tmp_path, template, "serial", 1)
+    concurrent = generate(tmp_path, template, "concurrent", 4, processes)
+
+    got = read_tree(tmp_path / "concurrent" / "proj")
+    assert got == read_tree(tmp_path / "serial" / "proj")
+    assert concurrent.endswith(os.path.join("concurrent", "proj"))
+    assert serial.endswith(os.path.join("serial", "proj"))
+    assert got["raw/kept.txt"][0] == b"{{not rendered}}"
+    listing = got["post_gen_listing.txt"][0].decode().split("\n")
+    assert "sub1/f39.txt" in listing, "post_gen_project runs once files are rendered"
+
+
+def test_threads_render_with_patched_generate_file(tmp_path, mocker):
+    import cookiecutter.generate
+
+    threads = set()
+    generate_file = cookiecutter.generate.generate_file
+
+    def recording_generate_file(*args):
+        threads.add(threading.current_thread().name)
+        return generate_file(*args)
+
+    mocker.patch("cookiecutter.generate.generate_file", recording_generate_file)
+    template = make_template(tmp_path, many_files)
+
+    generate(tmp_path, template, "out", 4, processes=False)
+
+    assert threading.current_thread().name not in threads
+    assert len(threads) > 1
+
+
+@pytest.mark.parametrize(
+    "processes",
+    [pytest.param(True, id="processes"), pytest.param(False, id="threads")],
+)
+def test_undefined_variable_raised(tmp_path, processes):
+    template = make_template(
+        tmp_path,
+        {"a.txt": "fine", "b.txt": "{{cookiecutter.nope}}", "c.txt": "also fine"},
+    )
+
+    with pytest.raises(UndefinedVariableInTemplate) as e:
+        generate(tmp_path, template, "out", 4, processes)
+
+    assert "b.txt" in e.value.message
+    assert not (tmp_path / "out" / "proj").exists(), "the failed project is removed"
+
+
+@pytest.mark.parametrize(
+    "processes",
+    [pytest.param(True, id="processes"), pytest.param(False, id="threads")],
+)
+def test_failure_leaves_existing_project_as_serial(tmp_path, processes):
+    files = {"f" + str(i) + ".txt": "fine " + str(i) for i in range(20)}
+    files["f7.txt"] = "{{cookiecutter.nope}}"
+    template = make_template(tmp_path, files)
+    trees = []
+    for out, render_jobs in (("serial", 1), ("concurrent", 4)):
+        (tmp_path / out / "proj").mkdir(parents=True)
+        (tmp_path / out / "proj" / "kept.txt").write_text("was there")
+        with pytest.raises(UndefinedVariableInTemplate):
+            with rendering_concurrently(render_jobs, processes):
+                cookiecutter(
+                    template,
+                    no_input=True,
+                    default_config=True,
+                    overwrite_if_exists=True,
+                    output_dir=str(tmp_path / out),
+                )
+        trees.append(read_tree(tmp_path / out / "proj"))
+
+    serial, concurrent = trees
+    assert concurrent == serial
+    assert "kept.txt" in concurrent
+
+
+@pytest.mark.parametrize(
+    "processes",
+    [pytest.param(True, id="processes"), pytest.param(False, id="threads")],
+)
+def test_syntax_error_leaves_fresh_project_as_serial(tmp_path, processes):
+    files = {"f" + str(i) + ".txt": "fine " + str(i) for i in range(20)}
+    files["f7.txt"] = "{% if %}"
+    template = make_template(tmp_path, files)
+    trees = []
+    for out, render_jobs in (("serial", 1), ("concurrent", 4)):
+        with pytest.raises(TemplateSyntaxError):
+            with rendering_concurrently(render_jobs, processes):
+                cookiecutter(
+                    template,
+                    no_input=True,
+                    default_config=True,
+                    output_dir=str(tmp_path / out),
+                )
+        trees.append(read_tree(tmp_path / out / "proj"))
+
+    serial, concurrent = trees
+    assert concurrent == serial
+
+
+def test_worker_environment_per_extensions(tmp_path):
+    from docker_cookiecutter.render import render_in_worker
+
+    template = tmp_path / "t"
+    template.mkdir()
+    (template / "a.txt").write_text("{% set x = [] %}{% do x.append(1) %}{{ x }}")
+    plain = {"cookiecutter": {"project": "p"}}
+    with_do = {"cookiecutter": {"project": "p", "_extensions": ["jinja2.ext.do"]}}
+
+    def render(context, out):
+        (tmp_path / out).mkdir()
+        return render_in_worker(
+            str(template), context, None, [[(0, str(tmp_path / out), "a.txt", False)]]
+        )
+
+    assert len(render(plain, "plain")) == 1, "do is not a tag without the extension"
+    assert render(with_do, "with_do") == []
+    assert (tmp_path / "with_do" / "a.txt").read_text() == "[1]"
+
+
+def test_cookiecutters_render_jobs(tmp_path):
+    template = make_template(tmp_path, many_files)
+
+    got = cookiecutters(
+        template,
+        render_jobs=4,
+        no_input=True,
+        default_config=True,
+        output_dir=str(tmp_path / "out"),
+    )
+
+    assert got == [str(tmp_path / "out" / "proj")]
+    assert (tmp_path / "out" / "proj" / "sub1" / "f39.txt").read_text() == "proj 39"
+
+
+def test_cookiecutters_render_jobs_incremental(tmp_path):
+    template = make_template(tmp_path, many_files)
+    options = dict(
+        render_jobs=4,
+        incremental=True,
+        # the hook's listing is written on every run
+        overwrite_if_exists=True,
+        no_input=True,
+        default_config=True,
+        output_dir=str(tmp_path / "out"),
+    )
+    cookiecutters(template, **options)
+    before = read_tree(tmp_path / "out" / "proj")
+
+    cookiecutters(template, **options)
+
+    got = read_tree(tmp_path / "out" / "proj")
+    # the hook only sees the files that were rendered again, ie. none
+    assert got.pop("post_gen_listing.txt")[0] == b"raw/kept.txt\nsub1/x.copied"
+    before.pop("post_gen_listing.txt")
+    assert got == before
+
+
+def test_single_job_leaves_cookiecutter_alone():
+    import cookiecutter.generate
+
+    generate_file = cookiecutter.generate.generate_file
+
+    with rendering_concurrently(1):
+        assert cookiecutter.generate.generate_file is generate_file
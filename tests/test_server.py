@@ -0,0 +1,95 @@
+import os
+import socket
+import threading
+
+import pytest
+
+if not hasattr(socket, "AF_UNIX"):
+    pytest.skip("unix domain sockets are not available", allow_module_level=True)
+
+from docker_cookiecutter import server
+from docker_cookiecutter.suggest import cookiecutter_to_docker_args
+
+some_args = "docker run some:image cookiecutter -o /out /some/template".split()
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    # keep it short, unix socket paths are limited to ~100 characters
+    path = os.path.join(str(tmp_path), "s.sock")
+    if len(path) > 100:
+        pytest.skip("temporary path is too long for a unix socket")
+    return path
+
+
+@pytest.fixture
+def running_server(socket_path):
+    sut = server.SuggestServer(socket_path)
+    thread = threading.Thread(target=sut.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield sut
+    sut.shutdown()
+    sut.server_close()
+    thread.join()
+
+
+def test_client_gets_same_result_as_in_process(running_server):
+    with server.SuggestClient(running_server.socket_path) as client:
+        got = [client.suggest(some_args) for _ in range(3)]
+
+    assert got == [cookiecutter_to_docker_args(some_args)] * 3
+
+
+def test_client_error_does_not_end_connection(running_server):
+    with server.SuggestClient(running_server.socket_path) as client:
+        with pytest.raises(server.ServerError):
+            client.suggest(["docker", "run", "img", "cookiecutter", "--checkout"])
+        got = client.suggest(some_args)
+
+    assert got == cookiecutter_to_docker_args(some_args)
+
+
+def test_concurrent_clients(running_server):
+    results = []
+
+    def request():
+        with server.SuggestClient(running_server.socket_path) as client:
+            results.append(client.suggest(some_args))
+
+    threads = [threading.Thread(target=request) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == [cookiecutter_to_docker_args(some_args)] * 8
+
+
+def test_suggest_falls_back_to_in_process(socket_path):
+    got = server.suggest(some_args, socket_path)
+    assert got == cookiecutter_to_docker_args(some_args)
+
+
+def test_suggest_uses_server(running_server, mocker):
+    spy = mocker.spy(server, "handle_request")
+
+    got = server.suggest(some_args, running_server.socket_path)
+
+    assert got == cookiecutter_to_docker_args(some_args)
+    assert spy.call_count == 1
+
+
+def test_stale_socket_is_replaced(socket_path):
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(socket_path)
+    stale.close()
+
+    sut = server.SuggestServer(socket_path)
+    sut.server_close()
+
+    assert not os.path.exists(socket_path)
+
+
+def test_refuses_to_replace_live_server(running_server):
+    with pytest.raises(server.ServerError):
+        server.SuggestServer(running_server.socket_path)
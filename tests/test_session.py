@@ -0,0 +1,213 @@
+import io
+import json
+import os
+import socket
+import subprocess
+import threading
+
+import pytest
+
+if not hasattr(socket, "AF_UNIX"):
+    pytest.skip("unix domain sockets are not available", allow_module_level=True)
+
+from docker_cookiecutter import session
+
+
+def commandline(cookiecutter: str) -> "list[str]":
+    return ("docker run some:image cookiecutter " + cookiecutter).split()
+
+
+@pytest.fixture
+def started(tmp_path, monkeypatch, mocker):
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    mocked_run = mocker.patch(
+        "docker_cookiecutter.session.subprocess.run",
+        return_value=subprocess.CompletedProcess([], 0, stdout="abc123\n"),
+    )
+    got = session.start_session(
+        [
+            commandline("--no-input -o out /templates/a"),
+            commandline("--no-input -o out/b /templates/b,,../shared"),
+        ],
+        idle_timeout=30,
+        cwd="/work/here",
+    )
+    return got, mocked_run.call_args[0][0]
+
+
+def test_start_session_mounts_union_of_paths(started):
+    got, argv = started
+
+    assert got == "abc123"
+    assert argv[:4] == ["docker", "run", "-d", "--rm"]
+    mounts = [argv[i + 1] for i, arg in enumerate(argv) if arg == "--mount"]
+    assert sorted(mounts) == [
+        "type=bind,source=/templates/a,target=/h/abs/templates/a",
+        "type=bind,source=/templates/b,target=/h/abs/templates/b",
+        "type=bind,source=/work/here/out,target=/h/abs/work/here/out",
+        "type=bind,source=/work/shared,target=/h/abs/work/shared",
+    ]
+    assert argv[-6:] == [
+        "some:image",
+        "docker_cookiecutter",
+        "session",
+        "serve",
+        "--idle-timeout",
+        "30",
+    ]
+
+
+def test_session_exec_args_maps_into_session_mounts(started):
+    got, _ = started
+
+    argv = session.session_exec_args(
+        got, commandline("--no-input -o ../here/out/c /templates/a k=v"), "/work/x"
+    )
+
+    assert argv == [
+        "docker",
+        "exec",
+        "abc123",
+        "docker_cookiecutter",
+        "session",
+        "run",
+        "cookiecutter",
+        "-o",
+        "/h/abs/work/here/out/c",
+        "--no-input",
+        "/h/abs/templates/a",
+        "k=v",
+    ]
+
+
+@pytest.mark.parametrize(
+    "given",
+    [
+        pytest.param("--no-input -o /elsewhere /templates/a", id="outside mounts"),
+        pytest.param("-o out /templates/a", id="needs no-input"),
+    ],
+)
+def test_session_exec_args_rejects(started, given):
+    got, _ = started
+
+    with pytest.raises(session.SessionError):
+        session.session_exec_args(got, commandline(given), "/work/here")
+
+
+def test_unknown_session(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+
+    with pytest.raises(session.SessionError):
+        session.session_exec_args("nope", commandline("--no-input /t"))
+
+
+def test_start_requires_shared_docker_options():
+    with pytest.raises(session.SessionError):
+        session.start_session(
+            [
+                commandline("/templates/a"),
+                "docker run other:image cookiecutter /templates/b".split(),
+            ]
+        )
+
+
+def test_stop_session_removes_container_and_state(started, mocker):
+    got, _ = started
+    mocked_call = mocker.patch("docker_cookiecutter.session.subprocess.call")
+
+    session.stop_session(got)
+
+    assert mocked_call.call_args[0][0] == ["docker", "rm", "-f", "abc123"]
+    assert not os.path.exists(session.state_path(got))
+
+
+def mock_exec_failing(mocker, inspected: subprocess.CompletedProcess) -> None:
+    mocker.patch("docker_cookiecutter.session.subprocess.call", return_value=1)
+    mocker.patch("docker_cookiecutter.session.subprocess.run", return_value=inspected)
+
+
+def test_exec_in_session_failed_generation(started, mocker):
+    got, _ = started
+    mock_exec_failing(mocker, subprocess.CompletedProcess([], 0, stdout="true\n"))
+
+    exit_code = session.exec_in_session(
+        got, commandline("--no-input -o out /templates/a"), cwd="/work/here"
+    )
+
+    assert exit_code == 1
+    assert os.path.exists(session.state_path(got))
+
+
+@pytest.mark.parametrize(
+    "given_inspected",
+    [
+        pytest.param(
+            subprocess.CompletedProcess([], 0, stdout="false\n"), id="stopped once idle"
+        ),
+        pytest.param(subprocess.CompletedProcess([], 1, stdout=""), id="removed"),
+    ],
+)
+def test_exec_in_session_expired(started, mocker, given_inspected):
+    got, _ = started
+    mock_exec_failing(mocker, given_inspected)
+
+    with pytest.raises(session.SessionError, match="has expired"):
+        session.exec_in_session(
+            got, commandline("--no-input -o out /templates/a"), cwd="/work/here"
+        )
+
+    assert not os.path.exists(session.state_path(got)), "its state is dropped"
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    # keep it short, unix socket paths are limited to ~100 characters
+    path = os.path.join(str(tmp_path), "s.sock")
+    if len(path) > 100:
+        pytest.skip("temporary path is too long for a unix socket")
+    return path
+
+
+def test_warm_process_runs_generations_until_idle(socket_path, mocker):
+    def fake_main(args):
+        print("generated " + args[-1])
+        if args[-1] == "bad":
+            raise SystemExit("it failed")
+
+    mocked_main = mocker.patch(
+        "docker_cookiecutter.cookiecutters.main", side_effect=fake_main
+    )
+    serving = threading.Thread(
+        target=session.serve_session, args=(0.5, socket_path), daemon=True
+    )
+    serving.start()
+    while not os.path.exists(socket_path):
+        serving.join(0.01)
+
+    out = io.StringIO()
+    got = [
+        session.run_in_session(["cookiecutter", "--no-input", t], socket_path, out)
+        for t in ("/a", "bad")
+    ]
+
+    assert got == [0, 1]
+    assert out.getvalue() == "generated /a\ngenerated bad\nit failed\n"
+    assert mocked_main.call_args_list[0][0][0] == ["--no-input", "/a"]
+    serving.join(5)
+    assert not serving.is_alive(), "stops once idle"
+    assert not os.path.exists(socket_path)
+
+
+def test_run_in_session_bad_request(socket_path):
+    server = session.SessionServer(socket_path, 5)
+    handling = threading.Thread(target=server.handle_request, daemon=True)
+    handling.start()
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall(b"not json\n")
+        response = json.loads(sock.makefile("rb").readline())
+
+    handling.join()
+    server.server_close()
+    assert response["exit_code"] == 1
@@ -233,3 +233,204 @@ def get_mounts_as_strings(args: "list[str]") -> "list[str]":
     return [
         " ".join(args[i : i + 2]) for i, x in enumerate(args) if x.startswith("--mount")
     ]
+
+
+@pytest.mark.parametrize(
+    "given_cookiecutter,given_template_cache,want_cookiecutter,want_cache_mount",
+    [
+        pytest.param(
+            "cookiecutter " + some_gh_template,
+            "cc-cache",
+            "cookiecutters -o /h/rel --template-cache /.cookiecutter_cache "
+            + some_gh_template,
+            "--mount type=volume,source=cc-cache,target=/.cookiecutter_cache",
+            id="remote - volume",
+        ),
+        pytest.param(
+            "cookiecutter " + some_gh_template,
+            "/var/cache/cc",
+            "cookiecutters -o /h/rel --template-cache /.cookiecutter_cache "
+            + some_gh_template,
+            "--mount type=bind,source=/var/cache/cc,target=/.cookiecutter_cache",
+            id="remote - host folder",
+        ),
+        pytest.param(
+            "cookiecutter /some/template",
+            "cc-cache",
+            "cookiecutter -o /h/rel /h/abs/some/template",
+            None,
+            id="local only - cache not used",
+        ),
+    ],
+)
+def test_cookiecutter_to_docker_args_template_cache(
+    given_cookiecutter, given_template_cache, want_cookiecutter, want_cache_mount
+):
+    given_args = ("docker run some:image " + given_cookiecutter).split()
+
+    got = suggest.cookiecutter_to_docker_args(
+        given_args, template_cache=given_template_cache
+    )
+    cc_index = get_cookiecutter_index(got)
+
+    assert " ".join(got[cc_index:]) == want_cookiecutter
+    cache_mounts = [m for m in get_mounts_as_strings(got) if "cookiecutter_cache" in m]
+    assert cache_mounts == ([want_cache_mount] if want_cache_mount else [])
+
+
+def test_cookiecutter_to_docker_args_bytecode_cache_for_local_templates():
+    given_args = "docker run some:image cookiecutter /some/template".split()
+
+    got = suggest.cookiecutter_to_docker_args(
+        given_args, template_cache="cc-cache", bytecode_cache=True
+    )
+    cc_index = get_cookiecutter_index(got)
+
+    assert " ".join(got[cc_index:]) == (
+        "cookiecutters -o /h/rel --template-cache /.cookiecutter_cache "
+        "/h/abs/some/template"
+    )
+    assert (
+        "--mount type=volume,source=cc-cache,target=/.cookiecutter_cache"
+        in get_mounts_as_strings(got)
+    )
+
+
+@pytest.mark.parametrize(
+    "given_host,want_source",
+    [
+        pytest.param("/some/path", "/some/path", id="absolute"),
+        pytest.param(".", "/work", id="cwd"),
+        pytest.param("./relative/my path", "/work/relative/my path", id="relative"),
+        pytest.param("../up", "/up", id="upward relative"),
+    ],
+)
+def test_docker_mount_args_resolved_against_cwd(given_host, want_source):
+    got = suggest.docker_mount_args(given_host, "/in dir", cwd="/work")
+    assert got == ["--mount", "type=bind,source=" + want_source + ",target=/in dir"]
+
+
+def test_cookiecutter_to_docker_args_argv(mocker):
+    mocker.patch("os.getuid", return_value=1000, create=True)
+    mocker.patch("os.getgid", return_value=100, create=True)
+    given_args = [
+        "docker",
+        "run",
+        "some:image",
+        "cookiecutter",
+        "-o",
+        "my out",
+        "/some/template",
+        "name=$(pwd)",
+    ]
+
+    got = suggest.cookiecutter_to_docker_args(given_args, argv=True, cwd="/work")
+
+    assert got == [
+        "docker",
+        "run",
+        "-it",
+        "--rm",
+        "--user",
+        "1000:100",
+        "--mount",
+        "type=bind,source=/work/my out,target=/h/rel/my out",
+        "--mount",
+        "type=bind,source=/some/template,target=/h/abs/some/template",
+        "some:image",
+        "cookiecutter",
+        "-o",
+        "/h/rel/my out",
+        "/h/abs/some/template",
+        "name=$(pwd)",
+    ]
+
+
+@pytest.mark.parametrize(
+    "given,want",
+    [
+        pytest.param(["-v", "/a:/in:ro"], {"/a": "/in"}, id="volume"),
+        pytest.param(["--volume=/a:/in"], {"/a": "/in"}, id="volume with ="),
+        pytest.param(
+            ["--mount", "type=bind,src=/a,dst=/in,readonly"], {"/a": "/in"}, id="mount"
+        ),
+        pytest.param(["--mount", "type=volume,src=v,dst=/in"], {}, id="named volume"),
+        pytest.param(["-v", "rel:/in", "-e", "A=/b:/c"], {}, id="not absolute"),
+    ],
+)
+def test_docker_bind_mounts(given, want):
+    assert suggest.docker_bind_mounts(given) == want
+
+
+def test_cookiecutter_to_docker_args_reuses_user_mounts():
+    given_args = (
+        "docker run -v /data:/data some:image cookiecutter -o /data/out /data/templates/t"
+    ).split()
+
+    got = suggest.cookiecutter_to_docker_args(given_args)
+
+    assert get_mounts_as_strings(got) == []
+    assert got[4:6] == ["-v", "/data:/data"], "passed through untouched"
+    assert " ".join(got[get_cookiecutter_index(got) :]) == (
+        "cookiecutter -o /data/out /data/templates/t"
+    )
+
+
+def test_cookiecutter_to_docker_args_max_mounts():
+    templates = ",,".join("/data/templates/t" + str(i) for i in range(20))
+    given_args = ("docker run some:image cookiecutter -o /out " + templates).split()
+
+    got = suggest.cookiecutter_to_docker_args(given_args, max_mounts=2)
+
+    assert sorted(get_mounts_as_strings(got)) == [
+        "--mount type=bind,source=/data/templates,target=/h/abs/data/templates",
+        "--mount type=bind,source=/out,target=/h/abs/out",
+    ]
+    assert "/h/abs/data/templates/t7" in got[-1]
+
+
+def test_cookiecutter_to_docker_args_manifest(tmp_path):
+    folder = tmp_path / "with space"
+    folder.mkdir()
+    (folder / "templates.jsonl").write_text(
+        '"gh:org/repo"\n"t1"\n{"template": "sub/t2", "directory": "a,b"}\n'
+    )
+    given_args = "docker run some:image cookiecutter -o /out".split() + [
+        "@" + str(folder / "templates.jsonl")
+    ]
+
+    got = suggest.cookiecutter_to_docker_args(given_args, template_cache="cc")
+    cc_index = get_cookiecutter_index(got)
+
+    container_folder = "/h/abs" + str(folder)
+    assert got[cc_index:] == [
+        "cookiecutters",
+        "-o",
+        "/h/abs/out",
+        "--template-cache",
+        "/.cookiecutter_cache",
+        "'@" + container_folder + "/templates.jsonl'",
+    ]
+    mounts = get_mounts_as_strings(got)
+    assert any(
+        container_folder in m for m in mounts
+    ), "the manifest's folder is mounted"
+
+
+@pytest.mark.parametrize(
+    "given_template",
+    [
+        pytest.param("../outside", id="parent"),
+        pytest.param("/elsewhere", id="absolute"),
+    ],
+)
+def test_cookiecutter_to_docker_args_manifest_templates_within_folder(
+    tmp_path, given_template
+):
+    (tmp_path / "templates.jsonl").write_text('"t"\n"' + given_template + '"\n')
+    given_args = "docker run some:image cookiecutter".split() + [
+        "@" + str(tmp_path / "templates.jsonl")
+    ]
+
+    with pytest.raises(ValueError):
+        suggest.cookiecutter_to_docker_args(given_args)
@@ -48,3 +48,106 @@ from docker_cookiecutter import templates
 def test_decode_template_sources(given, want):
     got = templates.decode_template_sources(given)
     assert got == want
+
+
+@pytest.mark.parametrize(
+    "given_lines,given_base,want",
+    [
+        pytest.param(
+            ['"gh:org/repo"\n', "\n", '{"template": "a,b", "directory": "x,y"}\n'],
+            None,
+            [
+                templates.TemplateSourceInfo("gh:org/repo"),
+                templates.TemplateSourceInfo("a,b", directory="x,y"),
+            ],
+            id="commas",
+        ),
+        pytest.param(
+            ['{"template": "t", "checkout": "v1"}', '"/abs"', '"gh:org/repo"'],
+            "/base",
+            [
+                templates.TemplateSourceInfo("/base/t", checkout="v1"),
+                templates.TemplateSourceInfo("/abs"),
+                templates.TemplateSourceInfo("gh:org/repo"),
+            ],
+            id="relative to base",
+        ),
+    ],
+)
+def test_decode_template_manifest(given_lines, given_base, want):
+    got = list(templates.decode_template_manifest(given_lines, given_base))
+    assert got == want
+
+
+@pytest.mark.parametrize(
+    "given",
+    [
+        pytest.param("[not json", id="not json"),
+        pytest.param('{"checkout": "v1"}', id="no template"),
+        pytest.param('{"template": "t", "other": 1}', id="unknown field"),
+        pytest.param('""', id="empty template"),
+        pytest.param("1", id="not a source"),
+    ],
+)
+def test_decode_template_manifest_rejects(given):
+    lines = templates.decode_template_manifest(['"fine"', given])
+
+    assert next(lines) == templates.TemplateSourceInfo("fine")
+    with pytest.raises(ValueError) as e:
+        next(lines)
+    assert "line 2" in str(e.value)
+
+
+def test_template_manifest_round_trip(tmp_path):
+    sources = [
+        templates.TemplateSourceInfo("/t,1", "v,1", "d,1"),
+        templates.TemplateSourceInfo("gh:org/repo"),
+    ]
+    path = tmp_path / "templates.jsonl"
+    path.write_text("".join(templates.encode_template_manifest(sources)))
+
+    got = templates.template_sources("@" + str(path))
+
+    assert isinstance(got, templates.TemplateManifest)
+    assert list(got) == sources
+    assert list(got) == sources, "each iteration reads the file again"
+
+
+@pytest.mark.parametrize(
+    "given,want",
+    [
+        pytest.param(
+            "gh:org/repo", "https://github.com/org/repo", id="gh abbreviation"
+        ),
+        pytest.param(
+            "https://GitHub.com/org/Repo.git/", "https://github.com/org/Repo", id="url"
+        ),
+        pytest.param(
+            "git+https://github.com/org/repo", "https://github.com/org/repo", id="git+"
+        ),
+    ],
+)
+def test_normalize_template_uri(given, want):
+    assert templates.normalize_template_uri(given) == want
+
+
+@pytest.mark.parametrize(
+    "given,want",
+    [
+        pytest.param("gh:org/repo", True, id="gh"),
+        pytest.param("https://github.com/org/repo.git", True, id="https"),
+        pytest.param("git@github.com:org/repo.git", True, id="ssh"),
+        pytest.param("file:///some/repo.git", True, id="file url"),
+        pytest.param("/some/folder", False, id="local folder"),
+        pytest.param("hg+https://example.com/repo", False, id="mercurial"),
+        pytest.param("bb:org/repo", False, id="bitbucket, cloned with mercurial"),
+        pytest.param("https://bitbucket.org/org/repo.git", True, id="bitbucket git"),
+        pytest.param("git+https://bitbucket.org/org/repo", True, id="bitbucket git+"),
+        pytest.param(
+            "https://example.com/bitbucket-mirror.git", True, id="mentions it"
+        ),
+        pytest.param("https://example.com/template.zip", False, id="zip"),
+    ],
+)
+def test_is_cacheable(given, want):
+    assert templates.is_cacheable(given) == want